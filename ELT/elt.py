@@ -1,118 +1,247 @@
 # Secrets
 import os
 
-# Time
+# Command line and checkpoints
+import argparse
+import pickle
+
+# Time and memory instrumentation
+import sys
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:
+    resource = None
 from datetime import datetime
 
 # Geocoding
 import googlemaps
-
-# United States
-import us
+from geocoding import GeocodeCache, geocode_many, make_google_geocoder, normalize_location
 
 # Web Scraping
 import requests
-from bs4 import BeautifulSoup
+from scraper import fetch_page, iter_accident_rows, ensure_scrape_state_table, load_scrape_state, save_scrape_state
 
 # Data Manipulation
 import pandas as pd
+from transforms import transform_silver, ERROR_COLUMN
+
+# Change Detection
+import hashlib
 
 # Database Interaction
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, bindparam, inspect
+from loaders import upsert_dataframe
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.automap import automap_base 
 
 
-# Database credentials and connection setup
-DATABASE_URL = os.environ.get('PROD_DATABASE_URL')
-engine = create_engine(DATABASE_URL)
+# URL to scrape from (permitted for research purposes: https://avalanche.state.co.us/accidents/statistics-and-reporting)
+URL = "https://classic.avalanche.state.co.us/caic/acc/acc_us.php"
 
-Session = sessionmaker(bind=engine)
+FAST_API_INVALIDATE_ENDPOINT = 'https://avalanchebackend.onrender.com/api/invalidate-cache/'
 
-# Reflect existing db tables into SQLAlchemy
-Base = automap_base()
-Base.prepare(autoload_with=engine)
+# Generated as a time stamp in seconds since 1970 for a unique reference (only if no others were created this day) 
+ELT_JOB_ID = '1705574460'
 
-# Selecting Postgres Tables as Python Objects via SQLAlchemy
-accidents_bronze = Base.classes.accidents_bronze
-accidents_silver = Base.classes.accidents_silver
-log = Base.classes.log
+# Each stage's outputs are pickled here so a later run can resume with --from-stage
+CHECKPOINT_DIR = os.environ.get('ELT_CHECKPOINT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoints'))
 
-google_maps_api_key = os.environ.get('GOOGLE_MAPS_API_KEY')
-gmaps = googlemaps.Client(key=google_maps_api_key)
+# Per-stage allocation peaks from tracemalloc, off by default as tracing slows every stage
+PROFILE_MEMORY = os.environ.get('ELT_PROFILE_MEMORY', 'false').lower() == 'true'
 
-# Generated as a time stamp in seconds since 1970 for a unique reference (only if no others were created this day) 
-elt_job_id = '1705574460'
-
-# Assume failure unless proven otherwise
-success = False
-
-# Used for tracking errors if any 
-error_message = None
- 
-# For tracking date of run and calculating duration
-start_time = datetime.now()
-
-
-def scrape_and_parse(url):
-    with requests.Session() as session:
-        session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        })
-        try:
-            response = session.get(url)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                tables = soup.find_all('table', {'class': 'us_acc_table'})
-                all_data = []
-
-                for table in tables:
-                    season_header = table.find_previous_sibling('h2')
-                    season = season_header.text.split(' SEASON')[0] if season_header else 'Season Unknown'
-
-                    for row in table.find_all('tr')[1:]:
-                        cells = row.find_all('td')
-                        if len(cells) >= 5:
-                            accident_data = {
-                                'season': season,
-                                'date': cells[0].text.strip(),
-                                'state': cells[1].text.strip(),
-                                'location': cells[2].text.strip(),
-                                'description': cells[3].text.strip(),
-                                'fatalities': cells[4].text.strip()
-                            }
-                            all_data.append(accident_data)
-                return all_data, None  # Return the data and indicate no error
-            else:
-                # If status_code is not 200, construct an error message
-                error_message = f"Failed to fetch the webpage. Status code: {response.status_code}"
-                return None, error_message  # Return no data and the error message
-        except Exception as e:
-            # Handle any other exceptions that may occur and construct an error message
-            error_message = f"An error occurred while trying to scrape and parse {url}: {str(e)}"
-            return None, error_message  # Return no data and the error message
-        
-        
-# Returns full date from season and partial date
-def transform_date(row):
-    date_text = row['date']
-    season = row['season']
-    
+
+def scrape_and_parse(url, previous_state):
+    # Returns (rows, new_state, error_message); rows is None when the page is unchanged or on error
     try:
-        month, day = map(int, date_text.split('/'))
-        year = int(season.split('-')[0]) if month > 6 else int(season.split('-')[1])
-        return datetime(year, month, day).strftime('%Y-%m-%d')
+        content, new_state = fetch_page(url, previous_state)
+        if content is None:
+            return None, new_state, None  # Unchanged since the last successful run
+        return list(iter_accident_rows(content)), new_state, None
     except Exception as e:
-        error_message = f"An error occurred while trying to transform date {row}: {str(e)}"
-        return None, error_message
-    
-
-def append_to_sql(df, table_name, engine):
-    df.to_sql(table_name, con=engine, if_exists='append', index=False)
-
-
-# This will run at the end of the script regardless of success or failure
-def insert_log(db_session, elt_job_id, start_time, end_time, duration, status, data_count, error_message=None):
+        # Handle any exceptions that may occur and construct an error message
+        error_message = f"An error occurred while trying to scrape and parse {url}: {str(e)}"
+        return None, None, error_message  # Return no data and the error message
+
+
+# Columns scraped from the source page, in bronze order
+SOURCE_COLUMNS = ['season', 'date', 'state', 'location', 'description', 'fatalities']
+
+# Fields identifying an accident independently of edits to its description or fatality count
+NATURAL_KEY_COLUMNS = ['season', 'date', 'state', 'location']
+
+
+def hash_columns(df, columns):
+    if df.empty:
+        return pd.Series(index=df.index, dtype=object)
+    joined = df[columns].astype(str).agg('\x1f'.join, axis=1)
+    return joined.map(lambda value: hashlib.sha256(value.encode('utf-8')).hexdigest())
+
+
+# Adds a stable natural key and a content hash to each scraped row
+def add_row_keys(df):
+    df = df.copy()
+    identity = hash_columns(df, NATURAL_KEY_COLUMNS)
+    # Rows sharing the same identity fields are told apart by their order of appearance
+    occurrence = identity.groupby(identity).cumcount().astype(str)
+    df['natural_key'] = (identity + ':' + occurrence).map(lambda value: hashlib.sha256(value.encode('utf-8')).hexdigest())
+    df['content_hash'] = hash_columns(df, SOURCE_COLUMNS)
+    return df
+
+
+# PostgreSQL only, SQLite has no ADD COLUMN IF NOT EXISTS
+def ensure_row_key_columns(engine):
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE accidents_bronze ADD COLUMN IF NOT EXISTS natural_key VARCHAR(64)"))
+        connection.execute(text("ALTER TABLE accidents_bronze ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)"))
+        connection.execute(text("ALTER TABLE accidents_silver ADD COLUMN IF NOT EXISTS natural_key VARCHAR(64)"))
+        connection.execute(text("ALTER TABLE accidents_silver ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)"))
+        connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_accidents_bronze_natural_key ON accidents_bronze (natural_key)"))
+        connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_accidents_silver_natural_key ON accidents_silver (natural_key)"))
+
+
+# A dry run changes no schema, so tables and columns a real run would add may not exist yet
+def has_columns(engine, table_name, columns):
+    inspector = inspect(engine)
+    if not inspector.has_table(table_name):
+        return False
+    return set(columns) <= {column['name'] for column in inspector.get_columns(table_name)}
+
+
+# Returns the scraped rows that are new or whose content changed since the last run.
+# Compared against silver, the last table written, so rows whose silver load failed are picked up again.
+def find_changed_rows(scraped_df, engine):
+    existing = pd.read_sql("SELECT natural_key, content_hash FROM accidents_silver WHERE natural_key IS NOT NULL", con=engine)
+    known_hashes = dict(zip(existing['natural_key'], existing['content_hash']))
+    unchanged = scraped_df['natural_key'].map(known_hashes) == scraped_df['content_hash']
+    return scraped_df[~unchanged]
+
+
+# Natural keys loaded by earlier runs that the current scrape no longer has. An edit to the season,
+# date, state or location gives an accident a new key, so its old row has to go rather than linger.
+def find_removed_keys(scraped_df, engine):
+    if scraped_df.empty:
+        # An empty page is far more likely a parsing failure than every accident being withdrawn
+        return []
+    existing = pd.read_sql("""
+        SELECT natural_key FROM accidents_bronze WHERE natural_key IS NOT NULL
+        UNION
+        SELECT natural_key FROM accidents_silver WHERE natural_key IS NOT NULL
+        """, con=engine)
+    return sorted(set(existing['natural_key']).difference(scraped_df['natural_key']))
+
+
+def delete_removed_rows(connection, table_name, natural_keys):
+    if natural_keys:
+        connection.execute(
+            text(f"DELETE FROM {table_name} WHERE natural_key IN :natural_keys").bindparams(bindparam('natural_keys', expanding=True)),
+            {'natural_keys': natural_keys},
+        )
+
+
+# Silver rows about to be deleted, read first so their summary groups and cache keys are known
+def find_removed_silver_rows(connection, natural_keys):
+    if not natural_keys:
+        return pd.DataFrame(columns=['id', 'season', 'date', 'state'])
+    return pd.read_sql(
+        text("SELECT id, season, date, state FROM accidents_silver WHERE natural_key IN :natural_keys").bindparams(bindparam('natural_keys', expanding=True)),
+        con=connection,
+        params={'natural_keys': natural_keys},
+    )
+
+
+# Rows loaded before keys existed cannot be matched, so they are reloaded once from the scrape
+def has_unkeyed_rows(engine):
+    return any(
+        pd.read_sql(f"SELECT COUNT(*) FROM {table_name} WHERE natural_key IS NULL", con=engine).iloc[0, 0] > 0
+        for table_name in ('accidents_bronze', 'accidents_silver')
+    )
+
+
+def clear_unkeyed_rows(connection, table_name):
+    connection.execute(text(f"DELETE FROM {table_name} WHERE natural_key IS NULL"))
+
+
+# Composite indexes backing the filtered/paginated /api/accidents/ queries (mirrors webserver/models.py)
+def ensure_silver_indexes(engine):
+    with engine.begin() as connection:
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_accidents_silver_state_id ON accidents_silver (state, id)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_accidents_silver_season_id ON accidents_silver (season, id)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_accidents_silver_date_id ON accidents_silver (date, id)"))
+        # A fatalities range cannot serve ORDER BY id, see webserver/models.py
+        connection.execute(text("DROP INDEX IF EXISTS ix_accidents_silver_fatalities_id"))
+
+
+# Rollup tables served by the /api/stats/ endpoints, one row per season, state and month
+SUMMARY_TABLES = {
+    'accidents_summary_season': ('season', "season"),
+    'accidents_summary_state': ('state', "state"),
+    'accidents_summary_month': ('month', "substr(date, 1, 7)"),
+}
+
+
+def ensure_summary_tables(engine):
+    with engine.begin() as connection:
+        for table_name, (key_column, _) in SUMMARY_TABLES.items():
+            connection.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {table_name} (
+                    {key_column} VARCHAR(50) PRIMARY KEY,
+                    accident_count INTEGER NOT NULL,
+                    fatalities INTEGER NOT NULL,
+                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+                """))
+
+
+# Recomputes only the groups touched by this run's silver rows from accidents_silver.
+# silver_df also carries the deleted rows, so groups they leave empty are dropped.
+# A table that still does not add up to accidents_silver afterwards (just created, or left
+# behind by earlier runs) is rebuilt from every group. Returns the tables rebuilt that way.
+def refresh_summary_tables(silver_df, engine):
+    affected = {
+        'accidents_summary_season': silver_df['season'].dropna().unique().tolist(),
+        'accidents_summary_state': silver_df['state'].dropna().unique().tolist(),
+        'accidents_summary_month': silver_df['date'].dropna().astype(str).str[:7].unique().tolist(),
+    }
+    rebuilt = []
+    with engine.begin() as connection:
+        for table_name, (key_column, key_expression) in SUMMARY_TABLES.items():
+            keys = affected[table_name]
+            if keys:
+                connection.execute(text(f"DELETE FROM {table_name} WHERE {key_column} IN :keys").bindparams(bindparam('keys', expanding=True)), {'keys': keys})
+                connection.execute(text(f"""
+                    INSERT INTO {table_name} ({key_column}, accident_count, fatalities, updated_at)
+                    SELECT {key_expression}, COUNT(*), COALESCE(SUM(fatalities), 0), CURRENT_TIMESTAMP
+                    FROM accidents_silver
+                    WHERE {key_expression} IN :keys
+                    GROUP BY {key_expression}
+                    """).bindparams(bindparam('keys', expanding=True)), {'keys': keys})
+            summarized = connection.execute(text(f"SELECT COALESCE(SUM(accident_count), 0) FROM {table_name}")).scalar()
+            expected = connection.execute(text(f"SELECT COUNT(*) FROM accidents_silver WHERE {key_expression} IS NOT NULL")).scalar()
+            if summarized == expected:
+                continue
+            connection.execute(text(f"DELETE FROM {table_name}"))
+            connection.execute(text(f"""
+                INSERT INTO {table_name} ({key_column}, accident_count, fatalities, updated_at)
+                SELECT {key_expression}, COUNT(*), COALESCE(SUM(fatalities), 0), CURRENT_TIMESTAMP
+                FROM accidents_silver
+                WHERE {key_expression} IS NOT NULL
+                GROUP BY {key_expression}
+                """))
+            rebuilt.append(table_name)
+    return rebuilt
+
+
+# Per-stage rows share the job's elt_job_id; the whole-run row keeps stage NULL as before
+# PostgreSQL only, like ensure_row_key_columns
+def ensure_log_columns(engine):
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE log ADD COLUMN IF NOT EXISTS stage VARCHAR(32)"))
+        connection.execute(text("ALTER TABLE log ADD COLUMN IF NOT EXISTS peak_memory_kb INTEGER"))
+
+
+# Written once per stage and once at the end of the run regardless of success or failure
+def insert_log(db_session, elt_job_id, start_time, end_time, duration, status, data_count, error_message=None, stage=None, peak_memory_kb=None):
     # Defining the log entry
     log_entry = {
         "elt_job_id": elt_job_id,
@@ -121,164 +250,316 @@ def insert_log(db_session, elt_job_id, start_time, end_time, duration, status, d
         "duration": duration,
         "status": status,
         "data_count": data_count,
-        "error_message": error_message
+        "error_message": error_message,
+        "stage": stage,
+        "peak_memory_kb": peak_memory_kb,
     }
     # Inserting log entry into the database
     db_session.execute(text("""
-        INSERT INTO log (elt_job_id, start_time, end_time, duration, status, data_count, error_message)
-        VALUES (:elt_job_id, :start_time, :end_time, :duration, :status, :data_count, :error_message)
+        INSERT INTO log (elt_job_id, start_time, end_time, duration, status, data_count, error_message, stage, peak_memory_kb)
+        VALUES (:elt_job_id, :start_time, :end_time, :duration, :status, :data_count, :error_message, :stage, :peak_memory_kb)
         """), log_entry)
     db_session.commit()
     
     
-def convert_state_abbreviation(abbreviation):
-    state = us.states.lookup(abbreviation)
-    return state.name if state else abbreviation
-
-
-def refine_location(state, location):
-    try:
-        if ',' in location:
-            # Use the part after the last comma
-            last_comma_part = location.split(',')[-1].strip()
-            if ' of ' in last_comma_part:
-                # If 'of' is present in the last segment, use the part after 'of'
-                refined_location = last_comma_part.split(' of ', 1)[1]
-            else:
-                # If 'of' is not in the last segment, use this segment directly
-                refined_location = last_comma_part
-        elif ' of ' in location:
-            # If there are no commas but 'of' is present, use the part after 'of'
-            refined_location = location.split(' of ', 1)[1]
-        else:
-            # If neither 'of' nor commas are present, use the location as is
-            refined_location = location
-
-        return f"{refined_location.strip()}, {state}"
-    except Exception:
-        error_message = f"An error occurred while trying to refine location: {location}, {state}"
-        return None, error_message
-
+# Per-accident cache keys of the silver rows this run inserted or updated
+def affected_cache_keys(silver_df, engine):
+    with engine.connect() as connection:
+        ids = connection.execute(
+            text("SELECT id FROM accidents_silver WHERE natural_key IN :natural_keys").bindparams(bindparam('natural_keys', expanding=True)),
+            {'natural_keys': silver_df['natural_key'].tolist()},
+        ).scalars().all()
+    return [f"accident_{accident_id}" for accident_id in ids]
 
-def geocode_location(location_text):
-    try:
-        # Use Google Maps to geocode the location
-        geocode_result = gmaps.geocode(location_text)
-        # Check if the geocode call returned results
-        if geocode_result:
-            # Extract latitude and longitude
-            latitude = geocode_result[0]['geometry']['location']['lat']
-            longitude = geocode_result[0]['geometry']['location']['lng']
-            return latitude, longitude
-        else:
-            return None, None
-    except Exception:
-        error_message = "An error occurred during geocoding"
-        return error_message
 
-
-def invalidate_cache(api_endpoint, api_key):
+def invalidate_cache(api_endpoint, api_key, keys):
     headers = {'access_token': api_key}
-    # Assuming no specific cache keys are provided to clear the entire cache
-    response = requests.post(api_endpoint, headers=headers, json={"keys": []})
+    # Version-scoped bodies (all_accidents, pages, stats) follow the version switch, and prewarm has the
+    # new all_accidents and stats ready before it. keys only name the per-accident bodies that changed,
+    # an empty list (full reload) drops all of them.
+    response = requests.post(api_endpoint, headers=headers, json={"keys": keys, "prewarm": True})
     if response.status_code == 200:
         print("Cache invalidated successfully.")
     else:
         print(f"Failed to invalidate cache: {response.text}")
     
 
-# URL to scrape from (permitted for research purposes: https://avalanche.state.co.us/accidents/statistics-and-reporting)
-url = "https://classic.avalanche.state.co.us/caic/acc/acc_us.php"
-
-# Scrape new data
-new_data, error_message = scrape_and_parse(url)
-
-# Get count of new_data
-new_data_count = len(new_data)
-
-# Get count of current SQL bronze
-current_bronze_count_query = "SELECT COUNT(*) FROM accidents_bronze"
-current_bronze_count = pd.read_sql(current_bronze_count_query, engine).iloc[0, 0]
 
-# Calculate difference in counts
-difference = new_data_count - current_bronze_count
 
-# If New Records to Add - Save New Records as DF - Else - Save DF as Empty
-if new_data is not None and difference > 0:
-    # There are new records to add
-    new_df = pd.DataFrame(new_data[-difference:])  # Fetches only the new records
-else:
-    # No new records to add or the counts are identical
-    new_df = pd.DataFrame()  # Empty DataFrame if no new data
-
-db_session = Session()
-data_count = 0
-
-try:
-    
-    db_session.begin()
-    
-    if not new_df.empty:  # If there are records to add
-        # Step 1: Insert Raw Data into Bronze Table
-        append_to_sql(new_df, 'accidents_bronze', engine)
-
-        # Step 2: Select the Updated Bronze Table Containing All Records Including Recently Inserted
-        df_bronze = pd.read_sql("SELECT * FROM accidents_bronze", con=engine)
-        
-        print("starting data transformation")
-        
-        # Step 3: Remove cross symbols if they exist
-        df_bronze['date'] = df_bronze['date'].astype(str).str.replace("†", "", regex=False)
-        
-        print("crosses successfully removed")
-        
-        # Step 4: Transform 'date' column based on 'season' 
-        df_bronze['date'] = df_bronze.apply(transform_date, axis=1)
-        
-        # Step 5: Create a Silver DataFrame for Transformations
-        # Remove summary tables and apply transformations
-        headers_to_look_for = {'date', 'state', 'location', 'description', 'fatalities', 'season'}
-        silver_df = df_bronze[df_bronze.columns.intersection(headers_to_look_for)]
-              
-        # Step 6: Convert state abbreviations to full names
-        silver_df.loc[:, 'state'] = silver_df['state'].apply(lambda x: us.states.lookup(x).name if us.states.lookup(x) else x)
-                      
-        # Step 7: Refine Location for Geocoding purposes
-        silver_df['refined_location'] = silver_df.apply(lambda x: refine_location(x['state'], x['location']), axis=1)
-         
-        # Step 8: Geocode each refined location to obtain latitude and longitude directly
-        silver_df[['latitude', 'longitude']] = silver_df.apply(lambda x: pd.Series(geocode_location(x['refined_location'])), axis=1)
-              
-        # Step 9: Inserting Transformed Data into Silver Table
-        append_to_sql(silver_df, 'accidents_silver', engine)
-        
-        db_session.commit()
-
-        # Set count of records
-        data_count = len(new_df)
-        success = True
+# Stages read and write a shared context dict and return the number of rows they produced
+
+def stage_scrape(context):
+    # Scrape new data, sending the validators from the last successful run
+    engine = context['engine']
+    if not context['dry_run']:
+        ensure_scrape_state_table(engine)
+    previous_state = load_scrape_state(engine, context['url']) if inspect(engine).has_table('scrape_state') else {}
+    new_data, scrape_state, error_message = scrape_and_parse(context['url'], previous_state)
+    if error_message is not None:
+        raise RuntimeError(error_message)
+    if new_data is None:
+        # 304 or identical body hash, nothing downstream can change
+        print("Source page unchanged since the last successful run")
+    context['scrape_state'] = scrape_state
+    context['scraped_df'] = None if new_data is None else pd.DataFrame(new_data, columns=SOURCE_COLUMNS)
+    return len(new_data or [])
+
+
+def stage_diff(context):
+    # Key every scraped row, then keep only rows that are new or changed since the last run
+    engine = context['engine']
+    context['full_reload'] = False
+    context['removed_keys'] = []
+    if context['scraped_df'] is None:
+        context['changed_df'] = pd.DataFrame(columns=SOURCE_COLUMNS + ['natural_key', 'content_hash'])
+        return 0
+    scraped_df = add_row_keys(context['scraped_df'])
+    if context['dry_run'] and not all(has_columns(engine, table_name, ['natural_key', 'content_hash']) for table_name in ('accidents_bronze', 'accidents_silver')):
+        # Before the first keyed run every row would be reloaded
+        context['changed_df'] = scraped_df
+        context['full_reload'] = True
+        print(f"{len(scraped_df)} records would be reloaded")
+        return len(scraped_df)
+    if not context['dry_run']:
+        ensure_row_key_columns(engine)
+    context['full_reload'] = has_unkeyed_rows(engine)
+    context['changed_df'] = scraped_df if context['full_reload'] else find_changed_rows(scraped_df, engine)
+    context['removed_keys'] = find_removed_keys(scraped_df, engine)
+    print(f"{len(context['changed_df'])} new or changed records, {len(context['removed_keys'])} no longer on the page")
+    return len(context['changed_df'])
+
+
+def stage_bronze_load(context):
+    # Step 1: Upsert the changed raw rows into bronze, streamed through COPY into a staging table,
+    # and delete the rows whose natural key is gone from the page
+    changed_df = context['changed_df']
+    removed_keys = context.get('removed_keys', [])
+    if context['dry_run'] or (changed_df.empty and not removed_keys):
+        return 0
+    with context['engine'].begin() as connection:
+        if context['full_reload']:
+            clear_unkeyed_rows(connection, 'accidents_bronze')
+        delete_removed_rows(connection, 'accidents_bronze', removed_keys)
+        upsert_dataframe(changed_df, 'accidents_bronze', SOURCE_COLUMNS + ['natural_key', 'content_hash'], connection)
+    return len(changed_df)
+
+
+def stage_transform(context):
+    # Steps 3 to 7: Remove cross symbols, build full dates, expand state names and refine
+    # locations for geocoding, as column operations with per-row errors collected separately
+    silver_df = transform_silver(context['changed_df'])
+    failed_rows = silver_df[ERROR_COLUMN].notna()
+    if failed_rows.any():
+        print(f"{failed_rows.sum()} records with transformation errors: {silver_df.loc[failed_rows, ERROR_COLUMN].value_counts().to_dict()}")
+    context['silver_df'] = silver_df
+    return len(silver_df)
+
+
+def stage_geocode(context):
+    # Step 8: Geocode each distinct refined location, served from the geocode cache where possible
+    silver_df = context['silver_df']
+    if silver_df.empty:
+        silver_df['latitude'] = pd.Series(dtype=float)
+        silver_df['longitude'] = pd.Series(dtype=float)
+        return 0
+    geocode_cache = GeocodeCache(context['engine'])
+    if context['dry_run']:
+        # Cache hits only, a dry run spends no API quota
+        locations = silver_df['refined_location'].dropna().unique()
+        has_cache = inspect(context['engine']).has_table('geocode_cache')
+        hits = geocode_cache.get_many({normalize_location(location) for location in locations}) if has_cache else {}
+        coordinates = {location: hits.get(normalize_location(location), (None, None)) for location in locations}
+        print(f"{len(locations) - sum(normalize_location(location) in hits for location in locations)} locations would be geocoded")
+    else:
+        geocode_cache.ensure_table()
+        coordinates = geocode_many(silver_df['refined_location'], context['geocoder'](), geocode_cache)
+    silver_df['latitude'] = silver_df['refined_location'].map(lambda x: coordinates.get(x, (None, None))[0])
+    silver_df['longitude'] = silver_df['refined_location'].map(lambda x: coordinates.get(x, (None, None))[1])
+    return int(silver_df['latitude'].notna().sum())
+
+
+def stage_silver_load(context):
+    # Step 9: Upsert the transformed rows into silver, then Step 10: refresh the rollups they touch
+    engine = context['engine']
+    silver_df = context['silver_df']
+    removed_keys = context.get('removed_keys', [])
+    context['loaded_rows'] = 0
+    if context['dry_run']:
+        return 0
+    removed_df = pd.DataFrame(columns=['id', 'season', 'date', 'state'])
+    if not silver_df.empty or removed_keys:
+        with engine.begin() as connection:
+            if context['full_reload']:
+                clear_unkeyed_rows(connection, 'accidents_silver')
+            removed_df = find_removed_silver_rows(connection, removed_keys)
+            delete_removed_rows(connection, 'accidents_silver', removed_keys)
+            upsert_dataframe(silver_df, 'accidents_silver', SOURCE_COLUMNS + ['latitude', 'longitude', 'natural_key', 'content_hash'], connection)
+        # A full reload replaced every id, so every per-accident body is stale
+        if context['full_reload']:
+            context['invalidate_keys'] = []
+        else:
+            context['invalidate_keys'] = affected_cache_keys(silver_df, engine) + [f"accident_{accident_id}" for accident_id in removed_df['id']]
+        context['loaded_rows'] = len(silver_df) + len(removed_df)
+    # Indexes and rollups are checked on every run, so a missing or out-of-step summary
+    # table is backfilled even when the page itself has not changed
+    ensure_silver_indexes(engine)
+    ensure_summary_tables(engine)
+    changed_groups = pd.concat([silver_df.reindex(columns=['season', 'date', 'state']), removed_df[['season', 'date', 'state']]])
+    context['rebuilt_summaries'] = refresh_summary_tables(changed_groups, engine)
+
+    # Remember the page version only once its rows are safely loaded
+    save_scrape_state(engine, context['url'], context['scrape_state'])
+    return context['loaded_rows']
+
+
+def stage_invalidate(context):
+    # Served data only changes when rows were inserted, updated or deleted, or a rollup was rebuilt
+    if context['dry_run'] or not (context.get('loaded_rows') or context.get('rebuilt_summaries')):
+        return 0
+    invalidate_cache(FAST_API_INVALIDATE_ENDPOINT, os.environ.get('PROD_FAST_API_KEY'), context.get('invalidate_keys', []))
+    return context['loaded_rows']
+
+
+STAGES = {
+    'scrape': stage_scrape,
+    'diff': stage_diff,
+    'bronze_load': stage_bronze_load,
+    'transform': stage_transform,
+    'geocode': stage_geocode,
+    'silver_load': stage_silver_load,
+    'invalidate': stage_invalidate,
+}
+
+# Context entries carried between stages, and so through checkpoints
+CHECKPOINT_KEYS = ('scrape_state', 'scraped_df', 'changed_df', 'full_reload', 'removed_keys', 'silver_df', 'loaded_rows', 'invalidate_keys')
+
+
+def checkpoint_path(stage, checkpoint_dir=CHECKPOINT_DIR):
+    return os.path.join(checkpoint_dir, f'{stage}.pkl')
+
+
+def save_checkpoint(context, stage, checkpoint_dir=CHECKPOINT_DIR):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    path = checkpoint_path(stage, checkpoint_dir)
+    with open(path + '.tmp', 'wb') as file:
+        pickle.dump({key: context[key] for key in CHECKPOINT_KEYS if key in context}, file)
+    os.replace(path + '.tmp', path)
+
+
+def load_checkpoint(stage, checkpoint_dir=CHECKPOINT_DIR):
+    path = checkpoint_path(stage, checkpoint_dir)
+    if not os.path.exists(path):
+        raise RuntimeError(f"No checkpoint for stage '{stage}' in {checkpoint_dir}, run from an earlier stage")
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+def max_rss_kb():
+    # Process high-water mark so far; Linux reports KiB, macOS bytes, Windows has no resource module
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss // 1024 if sys.platform == 'darwin' else max_rss
+
+
+def run_stage(name, context, profile_memory=False):
+    # Returns (rows, peak_memory_kb) for one stage. With profile_memory the peak is the stage's own
+    # Python and NumPy allocations from tracemalloc, which slows every allocation; otherwise it is
+    # the process's maximum RSS, which is free to read but only grows across stages.
+    if profile_memory:
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    rows = STAGES[name](context)
+    elapsed = time.perf_counter() - started
+    if profile_memory:
+        peak_memory_kb, label = tracemalloc.get_traced_memory()[1] // 1024, 'KiB peak'
     else:
-        # Can still be a successful run with no data to bring in
+        peak_memory_kb, label = max_rss_kb(), 'KiB max RSS'
+    print(f"{name:<12} {elapsed:8.2f}s {rows:>8} rows {peak_memory_kb if peak_memory_kb is not None else '-':>10} {label}")
+    return rows, peak_memory_kb
+
+
+def run_pipeline(engine, db_session, geocoder, url=URL, elt_job_id=ELT_JOB_ID, from_stage=None, dry_run=False, checkpoint_dir=CHECKPOINT_DIR, profile_memory=PROFILE_MEMORY):
+    # Runs the stages in order, each logged to the log table and checkpointed.
+    # A dry run changes no schema and writes no rows, state, logs, checkpoints or invalidations.
+    # geocoder is a callable returning the geocoding function, so runs that never geocode need no API client.
+    stage_names = list(STAGES)
+    first = stage_names.index(from_stage) if from_stage else 0
+    context = {'engine': engine, 'url': url, 'dry_run': dry_run, 'geocoder': geocoder}
+    if first > 0:
+        context.update(load_checkpoint(stage_names[first - 1], checkpoint_dir))
+
+    # Assume failure unless proven otherwise
+    success = False
+    error_message = None
+    start_time = datetime.now()
+
+    if not dry_run:
+        ensure_log_columns(engine)
+    if profile_memory:
+        tracemalloc.start()
+    stage = None
+    stage_start = start_time
+    try:
+        for stage in stage_names[first:]:
+            stage_start = datetime.now()
+            rows, peak_memory_kb = run_stage(stage, context, profile_memory)
+            if not dry_run:
+                # A dry run's outputs (uncached geocodes left empty, say) must never be resumed from
+                save_checkpoint(context, stage, checkpoint_dir)
+                stage_end = datetime.now()
+                insert_log(db_session, elt_job_id, stage_start, stage_end, stage_end - stage_start, 'Success', rows, stage=stage, peak_memory_kb=peak_memory_kb)
         success = True
 
-except Exception as e:
-    print(f"An Error has occurred during the transformation stage: {e}")
-    db_session.rollback()  # Rollback any pending transactions
-
-finally:
-    # This block executes whether there was an error or not
-    status = 'Success' if success else 'Failure'
-    end_time = datetime.now()
-    duration = end_time - start_time
-
-    if success:
-        fast_api_endpoint = 'https://avalanchebackend.onrender.com/api/invalidate-cache/'
-        api_key = os.environ.get('PROD_FAST_API_KEY')
-        invalidate_cache(fast_api_endpoint, api_key)
-        # Log Success
-        insert_log(db_session, elt_job_id, start_time, end_time, duration, status, data_count)
-    else:
-        # Log Failure  
-        insert_log(db_session, elt_job_id, start_time, end_time, duration, status, data_count, error_message)
-    
-    db_session.close()  # Always close the session
+    except Exception as e:
+        error_message = str(e)
+        print(f"An Error has occurred during the {stage} stage: {e}")
+        db_session.rollback()  # Rollback any pending transactions
+        if not dry_run:
+            stage_end = datetime.now()
+            insert_log(db_session, elt_job_id, stage_start, stage_end, stage_end - stage_start, 'Failure', 0, error_message, stage=stage)
+
+    finally:
+        # The whole-run entry, written whether there was an error or not
+        if profile_memory:
+            tracemalloc.stop()
+        end_time = datetime.now()
+        if not dry_run:
+            status = 'Success' if success else 'Failure'
+            insert_log(db_session, elt_job_id, start_time, end_time, end_time - start_time, status, context.get('loaded_rows', 0), error_message)
+
+    return success
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape, transform and load the US avalanche accident records")
+    parser.add_argument('--dry-run', action='store_true', help="run every stage without schema changes or writing rows, scrape state, logs, checkpoints or cache invalidations")
+    parser.add_argument('--from-stage', choices=list(STAGES), help="resume from this stage using the previous stage's checkpoint")
+    parser.add_argument('--profile-memory', action='store_true', default=PROFILE_MEMORY, help="measure each stage's peak allocations with tracemalloc instead of the process's maximum RSS (slower)")
+    parser.add_argument('--url', default=URL)
+    parser.add_argument('--job-id', default=ELT_JOB_ID)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Database credentials and connection setup
+    engine = create_engine(os.environ.get('PROD_DATABASE_URL'))
+    Session = sessionmaker(bind=engine)
+
+    def google_geocoder():
+        # Created on first use, so runs resuming past the geocode stage need no key
+        gmaps = googlemaps.Client(key=os.environ.get('GOOGLE_MAPS_API_KEY'))
+        return make_google_geocoder(gmaps)
+
+    db_session = Session()
+    try:
+        success = run_pipeline(engine, db_session, google_geocoder, url=args.url, elt_job_id=args.job_id, from_stage=args.from_stage, dry_run=args.dry_run, profile_memory=args.profile_memory)
+    finally:
+        db_session.close()  # Always close the session
+    return 0 if success else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
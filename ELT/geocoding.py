@@ -0,0 +1,154 @@
+# Persistent geocode cache and concurrent, rate-limited geocoding for Step 8 of the ELT
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import text, bindparam
+
+
+# Worker pool size and overall request budget shared by all workers
+GEOCODE_MAX_WORKERS = int(os.environ.get('GEOCODE_MAX_WORKERS', 4))
+GEOCODE_REQUESTS_PER_SECOND = float(os.environ.get('GEOCODE_REQUESTS_PER_SECOND', 10))
+
+# Found coordinates rarely move, misses are retried sooner in case the provider learns the place
+GEOCODE_CACHE_TTL_DAYS = int(os.environ.get('GEOCODE_CACHE_TTL_DAYS', 180))
+GEOCODE_NEGATIVE_TTL_DAYS = int(os.environ.get('GEOCODE_NEGATIVE_TTL_DAYS', 14))
+
+
+def normalize_location(location_text):
+    # Cache key for a refined location, insensitive to case and spacing
+    return re.sub(r'\s+', ' ', str(location_text)).strip().lower()
+
+
+def make_google_geocoder(gmaps):
+    # Returns (latitude, longitude), or (None, None) when the place is unknown; API errors propagate
+    def geocode(location_text):
+        geocode_result = gmaps.geocode(location_text)
+        if geocode_result:
+            location = geocode_result[0]['geometry']['location']
+            return location['lat'], location['lng']
+        return None, None
+    return geocode
+
+
+class RateLimiter:
+    # Thread-safe token bucket spacing out calls to at most rate per second
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class GeocodeCache:
+    # Geocode results keyed by normalized refined_location, including negative results
+
+    def __init__(self, engine, ttl_days=GEOCODE_CACHE_TTL_DAYS, negative_ttl_days=GEOCODE_NEGATIVE_TTL_DAYS):
+        self.engine = engine
+        self.ttl = timedelta(days=ttl_days)
+        self.negative_ttl = timedelta(days=negative_ttl_days)
+
+    def ensure_table(self):
+        with self.engine.begin() as connection:
+            connection.execute(text("""
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    location_key VARCHAR PRIMARY KEY,
+                    latitude FLOAT,
+                    longitude FLOAT,
+                    found BOOLEAN NOT NULL,
+                    geocoded_at TIMESTAMP NOT NULL
+                )
+                """))
+
+    def get_many(self, location_keys):
+        # Returns {location_key: (latitude, longitude)} for entries still within their TTL
+        if not location_keys:
+            return {}
+        now = datetime.now()
+        with self.engine.connect() as connection:
+            rows = connection.execute(text("""
+                SELECT location_key, latitude, longitude, found, geocoded_at
+                FROM geocode_cache
+                WHERE location_key IN :location_keys
+                """).bindparams(bindparam('location_keys', expanding=True)), {'location_keys': list(location_keys)})
+            cached = {}
+            for location_key, latitude, longitude, found, geocoded_at in rows:
+                if isinstance(geocoded_at, str):
+                    geocoded_at = datetime.fromisoformat(geocoded_at)
+                ttl = self.ttl if found else self.negative_ttl
+                if geocoded_at + ttl > now:
+                    cached[location_key] = (latitude, longitude)
+            return cached
+
+    def put_many(self, results):
+        if not results:
+            return
+        now = datetime.now()
+        records = [
+            {
+                'location_key': location_key,
+                'latitude': latitude,
+                'longitude': longitude,
+                'found': latitude is not None and longitude is not None,
+                'geocoded_at': now,
+            }
+            for location_key, (latitude, longitude) in results.items()
+        ]
+        with self.engine.begin() as connection:
+            connection.execute(text("""
+                INSERT INTO geocode_cache (location_key, latitude, longitude, found, geocoded_at)
+                VALUES (:location_key, :latitude, :longitude, :found, :geocoded_at)
+                ON CONFLICT (location_key) DO UPDATE SET
+                    latitude = EXCLUDED.latitude,
+                    longitude = EXCLUDED.longitude,
+                    found = EXCLUDED.found,
+                    geocoded_at = EXCLUDED.geocoded_at
+                """), records)
+
+
+def geocode_many(locations, geocoder, cache, max_workers=GEOCODE_MAX_WORKERS, requests_per_second=GEOCODE_REQUESTS_PER_SECOND):
+    # Resolves each distinct location once: cache hits first, then misses through the rate-limited pool.
+    # Returns {location: (latitude, longitude)}; lookups that raised map to (None, None) and are not cached.
+    keys_by_location = {location: normalize_location(location) for location in set(locations) if location}
+    distinct_keys = set(keys_by_location.values())
+    # The key is only for caching; the provider gets one of the original strings, case and all
+    location_by_key = {}
+    for location in sorted(keys_by_location):
+        location_by_key.setdefault(keys_by_location[location], location)
+
+    resolved = cache.get_many(distinct_keys)
+    missing_keys = sorted(distinct_keys - resolved.keys())
+
+    if missing_keys:
+        limiter = RateLimiter(requests_per_second)
+
+        def lookup(location_key):
+            limiter.wait()
+            try:
+                return location_key, geocoder(location_by_key[location_key])
+            except Exception as e:
+                print(f"An error occurred during geocoding {location_by_key[location_key]}: {e}")
+                return location_key, None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            looked_up = dict(pool.map(lookup, missing_keys))
+
+        fresh = {location_key: result for location_key, result in looked_up.items() if result is not None}
+        cache.put_many(fresh)
+        resolved.update(fresh)
+
+    return {
+        location: resolved.get(location_key, (None, None))
+        for location, location_key in keys_by_location.items()
+    }
@@ -0,0 +1,75 @@
+# Bulk loading of DataFrames into the bronze and silver tables
+import csv
+import io
+import os
+
+from sqlalchemy import text
+
+
+# Rows written per COPY buffer, bounding memory for large loads
+COPY_CHUNK_ROWS = int(os.environ.get('COPY_CHUNK_ROWS', 50000))
+
+# Marker for NULL in the CSV stream, so empty strings survive the copy
+COPY_NULL = '\\N'
+
+
+def iter_chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def copy_dataframe(df, table_name, columns, connection, chunk_rows=COPY_CHUNK_ROWS):
+    # Streams rows through COPY FROM STDIN on PostgreSQL, one in-memory CSV buffer per chunk.
+    # Other dialects (SQLite in local runs) fall back to a single executemany INSERT per chunk.
+    if df.empty:
+        return
+    column_list = ', '.join(columns)
+
+    if connection.dialect.name != 'postgresql':
+        value_list = ', '.join(f':{column}' for column in columns)
+        statement = text(f"INSERT INTO {table_name} ({column_list}) VALUES ({value_list})")
+        for chunk in iter_chunks(df[columns], chunk_rows):
+            connection.execute(statement, chunk.astype(object).where(chunk.notna(), None).to_dict('records'))
+        return
+
+    # The raw psycopg2 cursor shares the SQLAlchemy connection, and so its transaction
+    cursor = connection.connection.cursor()
+    try:
+        for chunk in iter_chunks(df[columns], chunk_rows):
+            buffer = io.StringIO()
+            chunk.to_csv(buffer, index=False, header=False, na_rep=COPY_NULL, quoting=csv.QUOTE_MINIMAL)
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                buffer,
+            )
+    finally:
+        cursor.close()
+
+
+def upsert_dataframe(df, table_name, columns, connection, chunk_rows=COPY_CHUNK_ROWS):
+    # COPY into a temporary staging table, then merge it with one INSERT ... ON CONFLICT (natural_key)
+    if df.empty:
+        return
+    column_list = ', '.join(columns)
+    update_list = ', '.join(f'{column} = EXCLUDED.{column}' for column in columns if column != 'natural_key')
+    staging_table = f"{table_name}_staging"
+
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(f"""
+            CREATE TEMP TABLE {staging_table} ON COMMIT DROP AS
+            SELECT {column_list} FROM {table_name} WITH NO DATA
+            """))
+    else:
+        connection.execute(text(f"DROP TABLE IF EXISTS temp.{staging_table}"))
+        connection.execute(text(f"CREATE TEMP TABLE {staging_table} AS SELECT {column_list} FROM {table_name} WHERE 0"))
+
+    copy_dataframe(df, staging_table, columns, connection, chunk_rows)
+
+    # WHERE true keeps SQLite's parser from reading ON CONFLICT as a join constraint
+    connection.execute(text(f"""
+        INSERT INTO {table_name} ({column_list})
+        SELECT {column_list} FROM {staging_table} WHERE true
+        ON CONFLICT (natural_key) DO UPDATE SET {update_list}
+        """))
+    connection.execute(text(f"DROP TABLE {staging_table}"))
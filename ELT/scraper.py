@@ -0,0 +1,144 @@
+# Conditional fetching and streaming parsing of the CAIC US accidents page
+import hashlib
+import io
+import os
+from datetime import datetime
+
+import requests
+from bs4 import BeautifulSoup
+from sqlalchemy import text
+
+# lxml is in requirements.txt, without it parsing falls back to BeautifulSoup's html.parser
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+
+# (connect, read) timeouts in seconds for the page download
+SCRAPE_TIMEOUT = (float(os.environ.get('SCRAPE_CONNECT_TIMEOUT', 10)), float(os.environ.get('SCRAPE_READ_TIMEOUT', 60)))
+
+ACCIDENT_TABLE_CLASS = 'us_acc_table'
+
+
+def ensure_scrape_state_table(engine):
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS scrape_state (
+                url VARCHAR PRIMARY KEY,
+                etag VARCHAR,
+                last_modified VARCHAR,
+                body_hash VARCHAR(64),
+                fetched_at TIMESTAMP NOT NULL
+            )
+            """))
+
+
+def load_scrape_state(engine, url):
+    with engine.connect() as connection:
+        row = connection.execute(
+            text("SELECT etag, last_modified, body_hash FROM scrape_state WHERE url = :url"), {'url': url}
+        ).first()
+    if row is None:
+        return {}
+    return {'etag': row[0], 'last_modified': row[1], 'body_hash': row[2]}
+
+
+def save_scrape_state(engine, url, state):
+    # Only saved after a successful load, so a failed run fetches and processes the page again
+    with engine.begin() as connection:
+        connection.execute(text("""
+            INSERT INTO scrape_state (url, etag, last_modified, body_hash, fetched_at)
+            VALUES (:url, :etag, :last_modified, :body_hash, :fetched_at)
+            ON CONFLICT (url) DO UPDATE SET
+                etag = EXCLUDED.etag,
+                last_modified = EXCLUDED.last_modified,
+                body_hash = EXCLUDED.body_hash,
+                fetched_at = EXCLUDED.fetched_at
+            """), {**state, 'url': url, 'fetched_at': datetime.now()})
+
+
+def fetch_page(url, previous_state, timeout=SCRAPE_TIMEOUT):
+    # Returns (content, new_state); content is None when the page is unchanged since previous_state
+    headers = {'User-Agent': USER_AGENT}
+    if previous_state.get('etag'):
+        headers['If-None-Match'] = previous_state['etag']
+    if previous_state.get('last_modified'):
+        headers['If-Modified-Since'] = previous_state['last_modified']
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return None, previous_state
+    if response.status_code != 200:
+        raise requests.HTTPError(f"Failed to fetch the webpage. Status code: {response.status_code}")
+
+    # Servers without validators still let us stop early on an identical body
+    content = response.content
+    new_state = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'body_hash': hashlib.sha256(content).hexdigest(),
+    }
+    if new_state['body_hash'] == previous_state.get('body_hash'):
+        return None, new_state
+    return content, new_state
+
+
+def cell_text(element):
+    return ''.join(element.itertext()).strip()
+
+
+def season_from_header(header_text):
+    return header_text.split(' SEASON')[0] if header_text is not None else 'Season Unknown'
+
+
+def iter_accident_rows(content):
+    # Yields one dict per accident row as each table finishes parsing
+    if etree is None:
+        yield from iter_accident_rows_bs4(content)
+        return
+
+    for _, table in etree.iterparse(io.BytesIO(content), events=('end',), tag='table', html=True, recover=True):
+        if ACCIDENT_TABLE_CLASS not in (table.get('class') or '').split():
+            continue
+
+        # Nearest preceding <h2> sibling names the season, as find_previous_sibling('h2') did
+        season_header = next(table.itersiblings('h2', preceding=True), None)
+        season = season_from_header(''.join(season_header.itertext()) if season_header is not None else None)
+
+        for row in list(table.iter('tr'))[1:]:
+            cells = list(row.iter('td'))
+            if len(cells) >= 5:
+                yield {
+                    'season': season,
+                    'date': cell_text(cells[0]),
+                    'state': cell_text(cells[1]),
+                    'location': cell_text(cells[2]),
+                    'description': cell_text(cells[3]),
+                    'fatalities': cell_text(cells[4]),
+                }
+
+        # Parsed rows are no longer needed, keep the tree from growing with the page
+        table.clear(keep_tail=True)
+
+
+def iter_accident_rows_bs4(content):
+    # Original BeautifulSoup parser, used when lxml is unavailable and as the benchmark baseline
+    soup = BeautifulSoup(content, 'html.parser')
+    for table in soup.find_all('table', {'class': ACCIDENT_TABLE_CLASS}):
+        season_header = table.find_previous_sibling('h2')
+        season = season_from_header(season_header.text if season_header else None)
+
+        for row in table.find_all('tr')[1:]:
+            cells = row.find_all('td')
+            if len(cells) >= 5:
+                yield {
+                    'season': season,
+                    'date': cells[0].text.strip(),
+                    'state': cells[1].text.strip(),
+                    'location': cells[2].text.strip(),
+                    'description': cells[3].text.strip(),
+                    'fatalities': cells[4].text.strip(),
+                }
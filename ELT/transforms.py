@@ -0,0 +1,168 @@
+# Silver stage transformations (Steps 3 to 7 of the ELT), as vectorized column operations
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import us
+
+
+# Column collecting per-row transformation errors instead of (None, message) tuples in data cells
+ERROR_COLUMN = 'transform_error'
+
+SILVER_COLUMNS = ['season', 'date', 'state', 'location', 'description', 'fatalities', 'natural_key', 'content_hash']
+
+
+@lru_cache(maxsize=None)
+def convert_state_abbreviation(abbreviation):
+    state = us.states.lookup(abbreviation)
+    return state.name if state else abbreviation
+
+
+def add_error(errors, mask, message):
+    # Appends message to the error column for every row where mask is set
+    mask = mask.fillna(False).astype(bool)
+    if not mask.any():
+        return errors
+    errors.loc[mask] = errors[mask].map(lambda existing: message if pd.isna(existing) else f"{existing}; {message}")
+    return errors
+
+
+def factorized(series):
+    # Integer codes into the distinct values; the scraped columns repeat heavily, so string work
+    # only runs once per distinct value and is broadcast back with a NumPy take
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    return codes, pd.Series(uniques, dtype=object)
+
+
+def remove_cross_symbols(dates):
+    # Step 3: the source marks some dates with a dagger
+    codes, uniques = factorized(dates.astype(str))
+    cleaned = uniques.str.replace("†", "", regex=False).to_numpy()
+    return pd.Series(cleaned[codes], index=dates.index)
+
+
+def transform_dates(dates, seasons, errors):
+    # Step 4: full ISO date from 'month/day' and the 'YYYY-YYYY' season
+    date_codes, date_uniques = factorized(dates)
+    # Integer components only, as int() required in the row-wise version ('1.5/3' is not a date)
+    date_text = date_uniques.str.strip()
+    well_formed = date_text.str.fullmatch(r'\d{1,2}/\d{1,2}').fillna(False).astype(bool)
+    parts = date_text.where(well_formed).str.split('/', n=1, expand=True).reindex(columns=[0, 1])
+    month = pd.to_numeric(parts[0], errors='coerce').to_numpy(dtype=float)[date_codes]
+    day = pd.to_numeric(parts[1], errors='coerce').to_numpy(dtype=float)[date_codes]
+    well_formed = well_formed.to_numpy()[date_codes]
+
+    season_codes, season_uniques = factorized(seasons.astype(str))
+    season_parts = season_uniques.str.split('-', n=2, expand=True).reindex(columns=[0, 1])
+    start_year = pd.to_numeric(season_parts[0], errors='coerce').to_numpy(dtype=float)[season_codes]
+    end_year = pd.to_numeric(season_parts[1], errors='coerce').to_numpy(dtype=float)[season_codes]
+
+    # Months after June belong to the first year of the season
+    year = np.where(month > 6, start_year, end_year)
+    valid = well_formed & ~np.isnan(year) & (month >= 1) & (month <= 12) & (day >= 1)
+
+    # Compose dates with datetime64 arithmetic, rejecting impossible days such as 2/30
+    month_start = (year[valid].astype(np.int64) - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month[valid].astype(np.int64) - 1)
+    first_day = month_start.astype('datetime64[D]')
+    days_in_month = ((month_start + 1).astype('datetime64[D]') - first_day).astype(np.int64)
+    in_month = day[valid] <= days_in_month
+    valid[valid] = in_month
+
+    result = np.full(len(dates), None, dtype=object)
+    result[valid] = np.datetime_as_string(first_day[in_month] + (day[valid].astype(np.int64) - 1), unit='D')
+    result = pd.Series(result, index=dates.index)
+
+    errors = add_error(errors, pd.Series(~valid, index=dates.index), 'invalid date for season')
+    return result, errors
+
+
+def convert_states(states):
+    # Step 6: each distinct abbreviation is looked up once
+    codes, uniques = factorized(states)
+    names = np.array([convert_state_abbreviation(value) if isinstance(value, str) else value for value in uniques], dtype=object)
+    return pd.Series(names[codes], index=states.index)
+
+
+def refine_locations(states, locations, errors):
+    # Step 7: the place after the last comma and after ' of ', suffixed with the state
+    codes, uniques = factorized(locations)
+    is_text = uniques.map(lambda value: isinstance(value, str))
+    text = uniques.where(is_text, '')
+
+    last_segment = text.str.rsplit(',', n=1).str[-1].str.strip()
+    base = text.where(~text.str.contains(',', regex=False), last_segment)
+    after_of = base.str.split(' of ', n=1).str[1]
+    refined = after_of.where(base.str.contains(' of ', regex=False), base).str.strip() + ', '
+
+    is_text = is_text.to_numpy(dtype=bool)[codes]
+    result = refined.to_numpy()[codes] + states.astype(str).to_numpy(dtype=object)
+    result[~is_text] = None
+    result = pd.Series(result, index=locations.index)
+
+    errors = add_error(errors, pd.Series(~is_text, index=locations.index), 'location is not text')
+    return result, errors
+
+
+def transform_silver(df_bronze):
+    # Steps 3 to 7 on bronze rows, returning silver rows with refined_location and the error column
+    silver_df = df_bronze[df_bronze.columns.intersection(SILVER_COLUMNS)].copy()
+    errors = pd.Series(None, index=silver_df.index, dtype=object)
+
+    dates = remove_cross_symbols(silver_df['date'])
+    silver_df['date'], errors = transform_dates(dates, silver_df['season'], errors)
+    silver_df['state'] = convert_states(silver_df['state'])
+    silver_df['refined_location'], errors = refine_locations(silver_df['state'], silver_df['location'], errors)
+    silver_df[ERROR_COLUMN] = errors
+    return silver_df
+
+
+# Row-wise reference implementations, kept for comparison in benchmarks/bench_transforms.py
+
+# Returns full date from season and partial date
+def transform_date(row):
+    date_text = row['date']
+    season = row['season']
+
+    try:
+        month, day = map(int, date_text.split('/'))
+        year = int(season.split('-')[0]) if month > 6 else int(season.split('-')[1])
+        return datetime(year, month, day).strftime('%Y-%m-%d')
+    except Exception as e:
+        error_message = f"An error occurred while trying to transform date {row}: {str(e)}"
+        return None, error_message
+
+
+def refine_location(state, location):
+    try:
+        if ',' in location:
+            # Use the part after the last comma
+            last_comma_part = location.split(',')[-1].strip()
+            if ' of ' in last_comma_part:
+                # If 'of' is present in the last segment, use the part after 'of'
+                refined_location = last_comma_part.split(' of ', 1)[1]
+            else:
+                # If 'of' is not in the last segment, use this segment directly
+                refined_location = last_comma_part
+        elif ' of ' in location:
+            # If there are no commas but 'of' is present, use the part after 'of'
+            refined_location = location.split(' of ', 1)[1]
+        else:
+            # If neither 'of' nor commas are present, use the location as is
+            refined_location = location
+
+        return f"{refined_location.strip()}, {state}"
+    except Exception:
+        error_message = f"An error occurred while trying to refine location: {location}, {state}"
+        return None, error_message
+
+
+def transform_silver_rowwise(df_bronze):
+    # Steps 3 to 7 as the ELT ran them before vectorization
+    df_bronze = df_bronze.copy()
+    df_bronze['date'] = df_bronze['date'].astype(str).str.replace("†", "", regex=False)
+    df_bronze['date'] = df_bronze.apply(transform_date, axis=1)
+    silver_df = df_bronze[df_bronze.columns.intersection(SILVER_COLUMNS)].copy()
+    silver_df.loc[:, 'state'] = silver_df['state'].apply(lambda x: us.states.lookup(x).name if us.states.lookup(x) else x)
+    silver_df['refined_location'] = silver_df.apply(lambda x: refine_location(x['state'], x['location']), axis=1)
+    return silver_df
@@ -0,0 +1,384 @@
+# End-to-end API benchmark: the FastAPI app in process against a seeded SQLite database and Redis
+#
+#   pip install aiosqlite fakeredis httpx   (plus lupa for the Redis Lua scripts under fakeredis)
+#   python benchmarks/bench_api.py --rows 100000 --output results/base.json
+#   python benchmarks/bench_api.py --rows 100000 --compare results/base.json
+#
+# Requests go through httpx's ASGI transport, so the numbers cover routing, middlewares, cache
+# tiers and database reads but no sockets. Redis is an in-process fakeredis server by default;
+# --redis local uses REDIS_HOST/REDIS_PORT instead and FLUSHES that database, point it at a
+# throwaway instance. Without lupa, fakeredis cannot run the Lua scripts: the rate limiter then
+# falls back to its per-worker bucket and loader locks are left to expire, as when Redis errors.
+#
+# Scenarios:
+#   cold_cache   each request after a flush and a new dataset version, so bodies and indexes are rebuilt
+#   warm_cache   the full list and summaries from a primed cache, plus 304 revalidations
+#   stampede     a concurrent burst right after an invalidation without prewarm; reports database loads
+#   single_id    random /accidents/{id} lookups
+#   routes       filtered pages, spatial, clusters, search and batch
+#   rate_limit   one client far over the /accidents/{id} limit, the rejection path
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+API_KEY = "bench"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="End-to-end API throughput and latency")
+    parser.add_argument('--rows', type=int, default=10_000, help='synthetic accidents, 1000 to 1000000')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=500, help='requests per route in the warm scenarios')
+    parser.add_argument('--cold-requests', type=int, default=10, help='requests per route in cold_cache')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--stampede-rounds', type=int, default=5)
+    parser.add_argument('--redis', choices=['fake', 'local'], default='fake')
+    parser.add_argument('--scenarios', default='cold_cache,warm_cache,stampede,single_id,routes,rate_limit')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare', help='JSON from an earlier run to compare against')
+    return parser.parse_args()
+
+
+def configure_environment(args, workdir):
+    # Must run before the webserver modules are imported, they read their settings at import time
+    os.environ['ASYNC_DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(workdir, 'accidents.db')}"
+    os.environ['PROD_FAST_API_KEY'] = API_KEY
+    os.environ['REDIS_BACKEND'] = 'fake' if args.redis == 'fake' else 'redis'
+    os.environ.setdefault('REDIS_HOST', 'localhost')
+    os.environ.setdefault('REDIS_PORT', '6379')
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+    os.environ['SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshot')
+    sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..', 'webserver'))
+    sys.path.insert(0, BENCHMARKS_DIR)
+    # app.log is written to the working directory
+    os.chdir(workdir)
+
+
+def seed_database(database_path, rows, seed):
+    from sqlalchemy import create_engine, insert
+    from database import Base
+    from models import Accident, SeasonSummary, StateSummary, MonthSummary
+    from synthetic import generate_accidents, summary_rows
+
+    accidents = generate_accidents(rows, seed)
+    summaries = summary_rows(accidents)
+    engine = create_engine(f"sqlite:///{database_path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Accident), accidents)
+        for model, key in ((SeasonSummary, 'season'), (StateSummary, 'state'), (MonthSummary, 'month')):
+            connection.execute(insert(model), [
+                {key: group, 'accident_count': count, 'fatalities': fatalities}
+                for group, count, fatalities in summaries[key]
+            ])
+    engine.dispose()
+    return accidents
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize_timings(timings, statuses, elapsed):
+    timings = sorted(timings)
+    status_counts = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    return {
+        'requests': len(timings),
+        'statuses': status_counts,
+        'throughput_rps': len(timings) / elapsed if elapsed else None,
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+    }
+
+
+class Runner:
+
+    def __init__(self, client, concurrency):
+        self.client = client
+        self.concurrency = concurrency
+
+    async def timed_request(self, request, timings, statuses):
+        method, url, options = request
+        started = time.perf_counter()
+        response = await self.client.request(method, url, **options)
+        timings.append(time.perf_counter() - started)
+        statuses.append(response.status_code)
+        return response
+
+    async def burst(self, requests, concurrency=None):
+        # Runs requests with at most concurrency in flight, returns the route summary
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+        timings, statuses = [], []
+
+        async def one(request):
+            async with semaphore:
+                await self.timed_request(request, timings, statuses)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(request) for request in requests))
+        return summarize_timings(timings, statuses, time.perf_counter() - started)
+
+    async def sequence(self, requests, before_each):
+        # One request at a time with setup excluded from the timings, for the cold paths
+        timings, statuses = [], []
+        total = 0.0
+        for request in requests:
+            await before_each()
+            started = time.perf_counter()
+            await self.timed_request(request, timings, statuses)
+            total += time.perf_counter() - started
+        return summarize_timings(timings, statuses, total)
+
+
+def get(url, **options):
+    return ('GET', url, options)
+
+
+def random_bbox(rng, size):
+    lat = rng.uniform(35.0, 49.0 - size)
+    lon = rng.uniform(-124.0, -104.0 - size)
+    return {'min_lat': lat, 'min_lon': lon, 'max_lat': lat + size, 'max_lon': lon + size}
+
+
+async def reset_caches():
+    import dataset
+    from cache import redis_client, local_cache
+
+    await redis_client.flushdb()
+    local_cache.clear()
+    await dataset.bump_dataset_version()
+
+
+async def scenario_cold_cache(runner, args, rng):
+    routes = {
+        '/api/accidents/': get('/api/accidents/'),
+        '/api/stats/seasons': get('/api/stats/seasons'),
+        '/api/accidents/within-bbox': get('/api/accidents/within-bbox', params=random_bbox(rng, 2.0)),
+    }
+    return {name: await runner.sequence([request] * args.cold_requests, reset_caches) for name, request in routes.items()}
+
+
+async def scenario_warm_cache(runner, args, rng):
+    await reset_caches()
+    primed = await runner.client.get('/api/accidents/')
+    for url in ('/api/stats/seasons', '/api/stats/states', '/api/stats/months'):
+        await runner.client.get(url)
+
+    conditional = {'If-None-Match': primed.headers.get('etag', '')}
+    routes = {
+        '/api/accidents/ (gzip)': get('/api/accidents/', headers={'Accept-Encoding': 'gzip'}),
+        '/api/accidents/ (identity)': get('/api/accidents/', headers={'Accept-Encoding': 'identity'}),
+        '/api/accidents/ (304)': get('/api/accidents/', headers=conditional),
+        '/api/stats/seasons': get('/api/stats/seasons'),
+        '/api/stats/states': get('/api/stats/states'),
+        '/api/stats/months': get('/api/stats/months'),
+    }
+    return {name: await runner.burst([request] * args.requests) for name, request in routes.items()}
+
+
+async def scenario_stampede(runner, args, rng):
+    from metrics import db_rows_loaded
+
+    label = ('all_accidents',)
+    results = []
+    loads = 0
+    for _ in range(args.stampede_rounds):
+        await reset_caches()
+        await runner.client.get('/api/accidents/')
+        # Moves the version without prewarming, every reader of the burst misses
+        await runner.client.post(
+            '/api/invalidate-cache/', json={'keys': ['accident_1'], 'prewarm': False}, headers={'access_token': API_KEY}
+        )
+        rows_before = db_rows_loaded._values.get(label, 0)
+        results.append(await runner.burst([get('/api/accidents/')] * args.concurrency))
+        loads += (db_rows_loaded._values.get(label, 0) - rows_before) / args.rows
+
+    summary = merge_summaries(results)
+    # 1.0 means the burst was coalesced into a single database load per round
+    summary['database_loads_per_round'] = loads / args.stampede_rounds
+    return {'/api/accidents/': summary}
+
+
+def merge_summaries(results):
+    # Averages the per-round latency summaries, sums the counts
+    merged = {'requests': sum(result['requests'] for result in results), 'statuses': {}}
+    for result in results:
+        for status, count in result['statuses'].items():
+            merged['statuses'][status] = merged['statuses'].get(status, 0) + count
+    for field in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+        merged[field] = sum(result[field] for result in results) / len(results)
+    return merged
+
+
+async def scenario_single_id(runner, args, rng):
+    await reset_caches()
+    ids = [rng.randint(1, args.rows) for _ in range(args.requests)]
+    cold = await runner.burst([get(f'/api/accidents/{accident_id}') for accident_id in ids])
+    warm = await runner.burst([get(f'/api/accidents/{accident_id}') for accident_id in ids])
+    missing = await runner.burst([get(f'/api/accidents/{args.rows + accident_id}') for accident_id in ids])
+    return {
+        '/api/accidents/{id} (first)': cold,
+        '/api/accidents/{id} (repeat)': warm,
+        '/api/accidents/{id} (missing)': missing,
+    }
+
+
+async def scenario_routes(runner, args, rng):
+    from synthetic import STATES
+
+    await reset_caches()
+    count = args.requests
+
+    def repeat(make):
+        return [make() for _ in range(count)]
+
+    routes = {
+        '/api/accidents/?state&limit': repeat(lambda: get('/api/accidents/', params={'state': rng.choice(STATES), 'limit': 100})),
+        '/api/accidents/within-bbox': repeat(lambda: get('/api/accidents/within-bbox', params=random_bbox(rng, 1.0))),
+        '/api/accidents/within-radius': repeat(lambda: get('/api/accidents/within-radius', params={
+            'lat': rng.uniform(35.0, 49.0), 'lon': rng.uniform(-124.0, -104.0), 'radius_km': 50})),
+        '/api/accidents/nearest': repeat(lambda: get('/api/accidents/nearest', params={
+            'lat': rng.uniform(35.0, 49.0), 'lon': rng.uniform(-124.0, -104.0), 'k': 10})),
+        '/api/accidents/clusters': repeat(lambda: get('/api/accidents/clusters', params={
+            'zoom': rng.randint(3, 10), **random_bbox(rng, 5.0)})),
+        '/api/accidents/search': repeat(lambda: get('/api/accidents/search', params={
+            'q': rng.choice(['skier buried', 'snowmobiler', 'pass', 'trees'])})),
+        '/api/accidents/batch': repeat(lambda: ('POST', '/api/accidents/batch', {
+            'json': {'ids': [rng.randint(1, args.rows) for _ in range(50)]}})),
+    }
+    return {name: await runner.burst(requests) for name, requests in routes.items()}
+
+
+async def scenario_rate_limit(runner, args, rng):
+    from utils import limiter
+
+    await reset_caches()
+    limiter.enabled = True
+    try:
+        result = await runner.burst([get('/api/accidents/1')] * args.requests)
+    finally:
+        limiter.enabled = False
+    return {'/api/accidents/{id} (over limit)': result}
+
+
+SCENARIOS = {
+    'cold_cache': scenario_cold_cache,
+    'warm_cache': scenario_warm_cache,
+    'stampede': scenario_stampede,
+    'single_id': scenario_single_id,
+    'routes': scenario_routes,
+    'rate_limit': scenario_rate_limit,
+}
+
+
+async def run(args, names):
+    import httpx
+    import main
+
+    rng = random.Random(args.seed)
+    results = {}
+    async with httpx.AsyncClient(app=main.app, base_url='http://bench', timeout=None) as client:
+        runner = Runner(client, args.concurrency)
+        for name in names:
+            print(f"running {name}...", file=sys.stderr)
+            results[name] = await SCENARIOS[name](runner, args, rng)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARKS_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'scenario':<12} {'route':<34} {'requests':>8} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for scenario, routes in results.items():
+        for route, summary in routes.items():
+            statuses = " ".join(f"{status}:{count}" for status, count in sorted(summary['statuses'].items()))
+            print(
+                f"{scenario:<12} {route:<34} {summary['requests']:>8} {summary['throughput_rps']:>9.1f} "
+                f"{summary['p50_ms']:>8.2f} {summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f}  {statuses}"
+            )
+            if 'database_loads_per_round' in summary:
+                print(f"{'':<12} {'database loads per burst':<34} {summary['database_loads_per_round']:>8.2f}")
+
+
+def print_comparison(results, baseline):
+    # Ratios against the baseline: above 1.0 is more throughput or more latency
+    print(f"\ncompared with {baseline['metadata'].get('commit')} ({baseline['metadata'].get('rows')} rows)")
+    print(f"{'scenario':<12} {'route':<34} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for scenario, routes in results.items():
+        for route, summary in routes.items():
+            before = baseline['results'].get(scenario, {}).get(route)
+            if before is None:
+                continue
+            ratios = [
+                summary[field] / before[field] if before[field] else float('nan')
+                for field in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms')
+            ]
+            print(f"{scenario:<12} {route:<34} " + " ".join(f"{ratio:>7.2f}x" for ratio in ratios))
+
+
+def main():
+    args = parse_args()
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(unknown)}")
+
+    # Resolved before the chdir into the work directory
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    with tempfile.TemporaryDirectory(prefix='bench_api_') as workdir:
+        configure_environment(args, workdir)
+        started = time.perf_counter()
+        seed_database(os.path.join(workdir, 'accidents.db'), args.rows, args.seed)
+        print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        results = asyncio.run(run(args, names))
+
+    report = {
+        'metadata': {
+            'commit': git_commit(),
+            'rows': args.rows,
+            'seed': args.seed,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'redis': args.redis,
+            'database': 'sqlite+aiosqlite',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    print_results(results)
+    if baseline:
+        print_comparison(results, baseline)
+    if output:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Benchmarks the streaming lxml parser against the BeautifulSoup parser on a saved copy of the CAIC page
+#
+#   python benchmarks/bench_scraper.py --fixture benchmarks/fixtures/acc_us_sample.html --repeat 20
+#
+# The bundled fixture is synthetic but follows the live page layout (an <h2> season header before each
+# us_acc_table). Save the live page with curl to benchmark against real content.
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ELT'))
+
+from scraper import iter_accident_rows, iter_accident_rows_bs4  # noqa: E402
+
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'acc_us_sample.html')
+
+
+def best_of(parser, content, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = list(parser(content))
+        timings.append(time.perf_counter() - started)
+    return rows, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--fixture', default=DEFAULT_FIXTURE)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with open(args.fixture, 'rb') as fixture:
+        content = fixture.read()
+
+    streaming_rows, streaming_seconds = best_of(iter_accident_rows, content, args.repeat)
+    baseline_rows, baseline_seconds = best_of(iter_accident_rows_bs4, content, args.repeat)
+
+    if streaming_rows != baseline_rows:
+        raise SystemExit("streaming and BeautifulSoup parsers returned different rows")
+
+    print(f"fixture          {args.fixture} ({len(content) / 1024:,.0f} KiB, {len(streaming_rows):,} rows)")
+    print(f"streaming (lxml) {streaming_seconds * 1000:>9.1f} ms")
+    print(f"BeautifulSoup    {baseline_seconds * 1000:>9.1f} ms")
+    print(f"speedup          {baseline_seconds / streaming_seconds:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# Benchmarks the vectorized silver transforms against the row-wise versions on a synthetic bronze frame
+#
+#   python benchmarks/bench_transforms.py --rows 1000000 --rowwise-rows 50000
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ELT'))
+
+from transforms import transform_silver, transform_silver_rowwise  # noqa: E402
+
+
+STATES = ['CO', 'UT', 'WA', 'MT', 'WY', 'ID', 'AK', 'CA', 'OR', 'NH', 'NM', 'NV']
+PLACES = [
+    'Berthoud Pass', 'Little Cottonwood Canyon, near Alta', 'Sheep Creek, 5 mi S of Leadville',
+    'North of Crested Butte', 'Turnagain Pass', 'Mount Washington, Tuckerman Ravine',
+]
+
+
+def synthetic_bronze(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    start_years = rng.integers(1950, 2024, rows)
+    months = rng.choice([10, 11, 12, 1, 2, 3, 4, 5, 6], rows)
+    days = rng.integers(1, 29, rows)
+    # A small share of dates carry the source's dagger marker
+    daggers = np.where(rng.random(rows) < 0.05, '†', '')
+    return pd.DataFrame({
+        'season': [f"{year}-{year + 1}" for year in start_years],
+        'date': [f"{month}/{day}{dagger}" for month, day, dagger in zip(months, days, daggers)],
+        'state': rng.choice(STATES, rows),
+        'location': rng.choice(PLACES, rows),
+        'description': 'Skier caught and buried',
+        'fatalities': rng.integers(1, 4, rows).astype(str),
+        'natural_key': [f"{index:064x}" for index in range(rows)],
+    })
+
+
+def timed(function, frame):
+    started = time.perf_counter()
+    result = function(frame)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows for the vectorized run')
+    parser.add_argument('--rowwise-rows', type=int, default=50_000, help='rows for the row-wise run, extrapolated to --rows')
+    args = parser.parse_args()
+
+    bronze = synthetic_bronze(args.rows)
+
+    vectorized, vectorized_seconds = timed(transform_silver, bronze)
+    sample = bronze.head(args.rowwise_rows)
+    rowwise, rowwise_seconds = timed(transform_silver_rowwise, sample)
+
+    # Both versions must agree on the shared sample
+    for column in ('date', 'state', 'refined_location'):
+        if not vectorized[column].head(len(sample)).equals(rowwise[column]):
+            raise SystemExit(f"vectorized and row-wise results differ in column {column}")
+
+    rowwise_extrapolated = rowwise_seconds * args.rows / len(sample)
+    print(f"rows                 {args.rows:>12,}")
+    print(f"vectorized           {vectorized_seconds:>11.2f}s  ({args.rows / vectorized_seconds:,.0f} rows/s)")
+    print(f"row-wise ({len(sample):,} rows) {rowwise_seconds:>7.2f}s  ({len(sample) / rowwise_seconds:,.0f} rows/s)")
+    print(f"row-wise extrapolated {rowwise_extrapolated:>10.2f}s")
+    print(f"speedup              {rowwise_extrapolated / vectorized_seconds:>11.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Synthetic accidents shaped like accidents_silver, plus the rollups the ELT job derives from them
+#
+# Seeded, so the same --rows and --seed give the same rows on every machine and commit.
+import numpy as np
+
+STATES = [
+    'Colorado', 'Utah', 'Washington', 'Montana', 'Wyoming', 'Idaho',
+    'Alaska', 'California', 'Oregon', 'New Hampshire', 'New Mexico', 'Nevada',
+]
+PLACES = [
+    'Berthoud Pass', 'Little Cottonwood Canyon, near Alta', 'Sheep Creek, 5 mi S of Leadville',
+    'North of Crested Butte', 'Turnagain Pass', 'Mount Washington, Tuckerman Ravine',
+]
+ACTIVITIES = ['Skier', 'Snowboarder', 'Snowmobiler', 'Climber', 'Snowshoer', 'Hiker']
+OUTCOMES = ['caught and buried', 'caught and carried into trees', 'buried in a terrain trap', 'caught in a slide']
+
+# Rough bounding box of the western states, where most of the points fall
+LATITUDE_RANGE = (35.0, 49.0)
+LONGITUDE_RANGE = (-124.0, -104.0)
+
+SEASON_MONTHS = [10, 11, 12, 1, 2, 3, 4, 5, 6]
+
+
+def generate_accidents(rows, seed=0):
+    # List of dicts with the Accident model's columns, ids 1..rows
+    rng = np.random.default_rng(seed)
+    start_years = rng.integers(1950, 2024, rows)
+    months = rng.choice(SEASON_MONTHS, rows)
+    days = rng.integers(1, 29, rows)
+    # Months after June belong to the first year of the season
+    years = np.where(months > 6, start_years, start_years + 1)
+    states = rng.choice(STATES, rows)
+    places = rng.choice(PLACES, rows)
+    activities = rng.choice(ACTIVITIES, rows)
+    outcomes = rng.choice(OUTCOMES, rows)
+    fatalities = rng.integers(1, 4, rows)
+    latitudes = rng.uniform(*LATITUDE_RANGE, rows).round(6)
+    longitudes = rng.uniform(*LONGITUDE_RANGE, rows).round(6)
+
+    return [
+        {
+            'id': index + 1,
+            'season': f"{start_years[index]}-{start_years[index] + 1}",
+            'date': f"{years[index]}-{months[index]:02d}-{days[index]:02d}",
+            'state': states[index],
+            'location': places[index],
+            'description': f"{activities[index]} {outcomes[index]}",
+            'fatalities': int(fatalities[index]),
+            'latitude': float(latitudes[index]),
+            'longitude': float(longitudes[index]),
+        }
+        for index in range(rows)
+    ]
+
+
+def summarize(accidents, key):
+    # Rollup rows as refresh_summary_tables builds them, grouped by key(accident)
+    totals = {}
+    for accident in accidents:
+        group = key(accident)
+        count, fatalities = totals.get(group, (0, 0))
+        totals[group] = (count + 1, fatalities + accident['fatalities'])
+    return [(group, count, fatalities) for group, (count, fatalities) in sorted(totals.items())]
+
+
+def summary_rows(accidents):
+    # Rows for accidents_summary_season, _state and _month
+    return {
+        'season': summarize(accidents, lambda accident: accident['season']),
+        'state': summarize(accidents, lambda accident: accident['state']),
+        'month': summarize(accidents, lambda accident: accident['date'][:7]),
+    }
@@ -142,33 +142,41 @@ function calculateNextUpdateTimestamp() {
 async function fetchAccidentsData() {
   const cachedData = localStorage.getItem("accidentsData");
   let accidents;
+  let cached;
 
   if (cachedData) {
-    const { data, expiry } = JSON.parse(cachedData);
+    cached = JSON.parse(cachedData);
 
-    if (expiry > Date.now()) {
+    if (cached.expiry > Date.now()) {
       // Use cached data if it's not expired
-      accidents = data;
+      accidents = cached.data;
     }
   }
 
-  // If there's no valid cached data, fetch new data
+  // If there's no valid cached data, revalidate or fetch new data
   if (!accidents) {
     try {
+      // With the ETag of the cached copy the server answers 304 when the data has not changed
+      const headers = cached && cached.etag ? { "If-None-Match": cached.etag } : {};
       const response = await fetch(
-        "https://avalanchebackend.onrender.com/api/accidents/"
+        "https://avalanchebackend.onrender.com/api/accidents/",
+        { headers }
       );
-      if (!response.ok) {
+      if (response.status === 304) {
+        accidents = cached.data;
+      } else if (!response.ok) {
         handleError(new FetchAccidentsError());
         return;
+      } else {
+        accidents = await response.json();
       }
-      accidents = await response.json();
 
-      // Cache the new data with an expiry timestamp
+      // Cache the data with an expiry timestamp and its version
       localStorage.setItem(
         "accidentsData",
         JSON.stringify({
           data: accidents,
+          etag: response.headers.get("ETag") || (cached && cached.etag),
           expiry: calculateNextUpdateTimestamp(),
         })
       );
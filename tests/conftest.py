@@ -0,0 +1,110 @@
+# Shared setup: the FastAPI app in process against a throwaway SQLite database and an
+# in-process fakeredis server, the same stand-ins benchmarks/bench_api.py uses
+#
+#   pip install pytest aiosqlite fakeredis lupa httpx
+#   python -m pytest tests
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+WORKDIR = tempfile.mkdtemp(prefix='avalanche_tests_')
+DATABASE_PATH = os.path.join(WORKDIR, 'accidents.db')
+API_KEY = 'test'
+
+# Must run before the webserver modules are imported, they read their settings at import time
+os.environ['ASYNC_DATABASE_URL'] = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+os.environ['PROD_FAST_API_KEY'] = API_KEY
+os.environ['REDIS_BACKEND'] = 'fake'
+os.environ['RATE_LIMIT_ENABLED'] = 'false'
+os.environ['SNAPSHOT_DIR'] = os.path.join(WORKDIR, 'snapshot')
+for directory in ('webserver', 'ELT', 'benchmarks'):
+    sys.path.insert(0, os.path.join(REPO_DIR, directory))
+# app.log is written to the working directory
+os.chdir(WORKDIR)
+
+ACCIDENT_ROWS = 200
+
+
+def seed_database(accidents):
+    from sqlalchemy import create_engine, insert
+    from database import Base
+    from models import Accident, SeasonSummary, StateSummary, MonthSummary
+    from synthetic import summary_rows
+
+    summaries = summary_rows(accidents)
+    engine = create_engine(f"sqlite:///{DATABASE_PATH}")
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Accident), accidents)
+        for model, key in ((SeasonSummary, 'season'), (StateSummary, 'state'), (MonthSummary, 'month')):
+            connection.execute(insert(model), [
+                {key: group, 'accident_count': count, 'fatalities': fatalities}
+                for group, count, fatalities in summaries[key]
+            ])
+    engine.dispose()
+
+
+def execute_sql(statement, parameters=None):
+    # Changes rows behind the API's back, as an ELT run would
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(f"sqlite:///{DATABASE_PATH}")
+    with engine.begin() as connection:
+        connection.execute(text(statement), parameters or {})
+    engine.dispose()
+
+
+async def invalidate(client, keys, prewarm=True):
+    # What the ELT job posts after loading
+    response = await client.post('/api/invalidate-cache/', headers={'access_token': API_KEY}, json={'keys': keys, 'prewarm': prewarm})
+    assert response.status_code == 200
+
+
+@pytest.fixture(scope='session')
+def run():
+    # One event loop for the whole session, the engine's pooled connections and the Redis clients belong to it
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    import database
+    loop.run_until_complete(database.engine.dispose())
+    loop.close()
+
+
+@pytest.fixture
+def app_state(tmp_path, monkeypatch):
+    # Fresh rows, an empty cache and closed breakers for every test
+    import cache
+    import dataset
+    import snapshot
+    from circuit_breaker import breakers, CLOSED
+    from synthetic import generate_accidents
+
+    seed_database(generate_accidents(ACCIDENT_ROWS))
+    cache.local_cache.clear()
+    cache._inflight.clear()
+    monkeypatch.setattr(dataset, '_current_version', None)
+    monkeypatch.setattr(snapshot, 'accident_snapshot', snapshot.SnapshotStore(str(tmp_path / 'snapshot')))
+    for breaker in breakers:
+        breaker.state = CLOSED
+        breaker.failures = 0
+        breaker._trial_in_flight = False
+    yield
+    cache.local_cache.clear()
+
+
+@pytest.fixture
+def client(run, app_state):
+    import cache
+    import httpx
+    import main
+
+    run(cache.redis_client.flushdb())
+    client = httpx.AsyncClient(app=main.app, base_url='http://test')
+    yield client
+    run(client.aclose())
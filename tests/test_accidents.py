@@ -0,0 +1,88 @@
+import pytest
+
+import snapshot
+from conftest import ACCIDENT_ROWS
+from synthetic import generate_accidents
+from models import Accident
+
+ACCIDENTS = generate_accidents(ACCIDENT_ROWS)
+
+
+def matching_ids(state=None, season=None, date_from=None, date_to=None, min_fatalities=None):
+    return [
+        accident['id'] for accident in ACCIDENTS
+        if (state is None or accident['state'] == state)
+        and (season is None or accident['season'] == season)
+        and (date_from is None or accident['date'] >= date_from)
+        and (date_to is None or accident['date'] <= date_to)
+        and (min_fatalities is None or accident['fatalities'] >= min_fatalities)
+    ]
+
+
+async def all_pages(client, params):
+    # Follows next_cursor to the end, returning the ids of every page
+    pages = []
+    cursor = None
+    while True:
+        response = await client.get('/api/accidents/', params={**params, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.json()
+        pages.append([item['id'] for item in body['items']])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return pages
+
+
+@pytest.fixture(params=['snapshot', 'database'])
+def source(request, monkeypatch):
+    # Pages are built from the columnar snapshot when it is enabled, otherwise with the keyset SQL query
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_ENABLED', request.param == 'snapshot')
+    return request.param
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'state': 'Utah'},
+    {'season': ACCIDENTS[0]['season'], 'min_fatalities': 2},
+    {'date_from': '1990-01-01', 'date_to': '2005-12-31'},
+    {'state': 'Colorado', 'min_fatalities': 3},
+])
+def test_cursor_walks_every_matching_row_once_in_id_order(run, client, source, filters):
+    async def scenario():
+        pages = await all_pages(client, {**filters, 'limit': 7})
+        assert all(len(page) == 7 for page in pages[:-1])
+        assert [accident_id for page in pages for accident_id in page] == matching_ids(**filters)
+
+    run(scenario())
+
+
+def test_no_parameters_returns_the_full_list(run, client, source):
+    async def scenario():
+        response = await client.get('/api/accidents/')
+        assert sorted(accident['id'] for accident in response.json()) == matching_ids()
+
+    run(scenario())
+
+
+def test_unknown_filter_value_gives_an_empty_page(run, client, source):
+    async def scenario():
+        response = await client.get('/api/accidents/', params={'state': 'Atlantis'})
+        assert response.json() == {'items': [], 'next_cursor': None}
+
+    run(scenario())
+
+
+def test_invalid_cursor_and_limit_are_rejected(run, client):
+    async def scenario():
+        assert (await client.get('/api/accidents/', params={'cursor': '!!'})).status_code == 422
+        assert (await client.get('/api/accidents/', params={'limit': 0})).status_code == 422
+        assert (await client.get('/api/accidents/', params={'limit': 1001})).status_code == 422
+
+    run(scenario())
+
+
+def test_filter_indexes_end_in_id():
+    indexes = {index.name: [column.name for column in index.columns] for index in Accident.__table__.indexes}
+    assert indexes['ix_accidents_silver_state_id'] == ['state', 'id']
+    assert indexes['ix_accidents_silver_season_id'] == ['season', 'id']
+    assert 'ix_accidents_silver_fatalities_id' not in indexes
@@ -0,0 +1,42 @@
+import cache
+from conftest import ACCIDENT_ROWS
+from metrics import db_rows_loaded
+
+
+def batch_rows_loaded():
+    return db_rows_loaded._values.get(('accidents_batch',), 0)
+
+
+def test_items_follow_request_order_with_missing_ids(run, client):
+    async def scenario():
+        response = await client.post('/api/accidents/batch', json={'ids': [5, 3, ACCIDENT_ROWS + 10, 5, 1]})
+        assert response.status_code == 200
+        body = response.json()
+        assert [item['id'] for item in body['items']] == [5, 3, 1]
+        assert body['missing'] == [ACCIDENT_ROWS + 10]
+
+    run(scenario())
+
+
+def test_only_cache_misses_are_read_from_the_database(run, client):
+    async def scenario():
+        await client.post('/api/accidents/batch', json={'ids': [2]})
+        before = batch_rows_loaded()
+        body = (await client.post('/api/accidents/batch', json={'ids': [2, 3, 4]})).json()
+        assert body['items'][0] == (await client.get('/api/accidents/2')).json()
+        assert batch_rows_loaded() - before == 2
+
+        # Now all three are cached, under the per-id keys /accidents/{id} reads first
+        await client.post('/api/accidents/batch', json={'ids': [2, 3, 4]})
+        assert batch_rows_loaded() - before == 2
+        assert await cache.get_cached_body('accident_4') is not None
+
+    run(scenario())
+
+
+def test_request_bounds(run, client):
+    async def scenario():
+        assert (await client.post('/api/accidents/batch', json={'ids': []})).status_code == 422
+        assert (await client.post('/api/accidents/batch', json={'ids': list(range(1, 502))})).status_code == 422
+
+    run(scenario())
@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+import cache
+import database
+import snapshot
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN
+from database import SessionLocal
+
+
+class DependencyDown(Exception):
+    pass
+
+
+class BreakerOpen(Exception):
+    pass
+
+
+def make_breaker(reset_timeout=60):
+    return CircuitBreaker("test", (DependencyDown,), BreakerOpen, failure_threshold=2, reset_timeout=reset_timeout)
+
+
+async def call(breaker, error=None):
+    async with breaker.guard():
+        if error is not None:
+            raise error
+
+
+def test_opens_after_consecutive_failures_and_rejects(run):
+    breaker = make_breaker()
+    for _ in range(2):
+        with pytest.raises(DependencyDown):
+            run(call(breaker, DependencyDown()))
+    assert breaker.state == OPEN
+
+    with pytest.raises(BreakerOpen):
+        run(call(breaker))
+    assert breaker.stats == {"failures": 2, "rejections": 1, "opened": 1}
+
+
+def test_other_errors_do_not_count(run):
+    breaker = make_breaker()
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            run(call(breaker, ValueError()))
+    assert breaker.state == CLOSED
+
+
+def test_half_open_trial_decides(run):
+    breaker = make_breaker(reset_timeout=0)
+    for _ in range(2):
+        with pytest.raises(DependencyDown):
+            run(call(breaker, DependencyDown()))
+
+    # A failed trial opens it again at once, a successful one closes it
+    with pytest.raises(DependencyDown):
+        run(call(breaker, DependencyDown()))
+    assert breaker.state == OPEN
+    run(call(breaker))
+    assert breaker.state == CLOSED
+
+
+def open_breaker(monkeypatch, breaker):
+    monkeypatch.setattr(breaker, 'state', OPEN)
+    monkeypatch.setattr(breaker, 'opened_at', time.monotonic())
+    monkeypatch.setattr(breaker, 'reset_timeout', 60)
+
+
+def test_database_outage_is_served_from_the_last_snapshot(run, client, monkeypatch):
+    async def scenario():
+        built = await snapshot.get_snapshot(SessionLocal())
+        open_breaker(monkeypatch, database.database_breaker)
+
+        response = await client.get('/api/accidents/')
+        assert response.status_code == 200
+        assert len(response.json()) == len(built)
+        assert response.headers['etag'] == f'W/"{built.version}"'
+
+        page = await client.get('/api/accidents/', params={'state': 'Utah', 'limit': 5})
+        assert page.status_code == 200
+        assert all(item['state'] == 'Utah' for item in page.json()['items'])
+
+        assert (await client.get('/api/accidents/1')).json()['id'] == 1
+
+    run(scenario())
+
+
+def test_database_outage_without_snapshot_is_an_error(run, client, monkeypatch):
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_ENABLED', False)
+    open_breaker(monkeypatch, database.database_breaker)
+
+    async def scenario():
+        assert (await client.get('/api/accidents/')).status_code == 500
+
+    run(scenario())
+
+
+def test_redis_outage_reads_through_to_the_database(run, client, monkeypatch):
+    async def scenario():
+        assert (await client.get('/api/accidents/1')).status_code == 200
+        cache.local_cache.clear()
+        open_breaker(monkeypatch, cache.redis_breaker)
+
+        assert (await client.get('/api/accidents/2')).json()['id'] == 2
+        assert (await client.get('/api/accidents/')).status_code == 200
+        assert cache.redis_breaker.stats["rejections"] > 0
+        assert database.database_breaker.state == CLOSED
+
+    run(scenario())
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from clustering import MAX_CLUSTER_ZOOM, build_clusters, clusters_for_zoom
+from conftest import ACCIDENT_ROWS
+from synthetic import generate_accidents
+
+ACCIDENTS = generate_accidents(ACCIDENT_ROWS)
+
+
+@pytest.fixture(scope='module')
+def zoom_indexes():
+    return build_clusters(ACCIDENTS + [{**ACCIDENTS[0], 'id': ACCIDENT_ROWS + 1, 'latitude': None}])
+
+
+def clusters(index):
+    return [json.loads(payload) for payload in index.payloads]
+
+
+@pytest.mark.parametrize('zoom', [0, 5, 10, MAX_CLUSTER_ZOOM])
+def test_every_geocoded_accident_is_in_one_cluster_per_zoom(zoom_indexes, zoom):
+    found = clusters(zoom_indexes[zoom])
+    assert sum(cluster['count'] for cluster in found) == ACCIDENT_ROWS
+    assert sum(cluster['fatalities'] for cluster in found) == sum(accident['fatalities'] for accident in ACCIDENTS)
+
+
+def test_clusters_merge_as_the_map_zooms_out(zoom_indexes):
+    sizes = [len(zoom_indexes[zoom]) for zoom in range(MAX_CLUSTER_ZOOM + 1)]
+    assert sizes == sorted(sizes)
+    assert sizes[0] < 10
+
+
+def test_only_single_accidents_keep_their_id(zoom_indexes):
+    for cluster in clusters(zoom_indexes[0]) + clusters(zoom_indexes[MAX_CLUSTER_ZOOM]):
+        assert (cluster['accident_id'] is not None) == (cluster['count'] == 1)
+
+
+def test_zoom_is_clamped_to_the_precomputed_levels(zoom_indexes):
+    assert clusters_for_zoom(zoom_indexes, MAX_CLUSTER_ZOOM + 5) is zoom_indexes[MAX_CLUSTER_ZOOM]
+
+
+def test_route(run, client):
+    async def scenario():
+        world = {'min_lat': -90, 'min_lon': -180, 'max_lat': 90, 'max_lon': 180}
+        response = await client.get('/api/accidents/clusters', params={**world, 'zoom': 3})
+        assert response.status_code == 200
+        assert sum(cluster['count'] for cluster in response.json()) == ACCIDENT_ROWS
+
+        bad_zoom = await client.get('/api/accidents/clusters', params={**world, 'zoom': 25})
+        assert bad_zoom.status_code == 422
+
+    run(scenario())
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.util import greenlet_spawn
+
+import database
+import routers
+from conftest import API_KEY
+from database import InstrumentedPool
+
+
+class Connection:
+    # Enough of a DB-API connection for the pool to check it in and out
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def slow_connect():
+    time.sleep(0.2)
+    return Connection()
+
+
+def test_pool_wait_excludes_opening_connections(run):
+    # The async pool's queue only runs inside SQLAlchemy's greenlet bridge
+    def scenario():
+        pool = InstrumentedPool(slow_connect, pool_size=1, max_overflow=0, timeout=0.1)
+        first = pool.connect()
+        assert pool.stats['checkouts'] == 1 and pool.stats['wait_seconds_max'] < 0.1
+
+        with pytest.raises(PoolTimeoutError):
+            pool.connect()
+        assert pool.stats['timeouts'] == 1
+        assert 0.1 <= pool.stats['wait_seconds_max'] < 0.2
+
+        first.close()
+        pool.connect().close()
+        assert pool.stats['checkouts'] == 3
+        pool.dispose()
+
+    run(greenlet_spawn(scenario))
+
+
+def test_db_stats(run, client):
+    async def scenario():
+        response = await client.get('/api/db-stats/', headers={'access_token': API_KEY})
+        assert response.status_code == 200
+        # SQLite keeps SQLAlchemy's own pool, and no replica is configured
+        assert set(response.json()) == {'primary'}
+        assert 'pool' in response.json()['primary']
+
+    run(scenario())
+
+
+def test_stream_reads_through_the_replica_sessions(run, client, monkeypatch):
+    opened = []
+
+    def read_session():
+        opened.append(1)
+        return database.ReadSessionLocal()
+
+    monkeypatch.setattr(routers, 'ReadSessionLocal', read_session)
+
+    async def scenario():
+        assert (await client.get('/api/accidents/stream')).status_code == 200
+        assert opened == [1]
+
+    run(scenario())
@@ -0,0 +1,240 @@
+import hashlib
+import os
+import sqlite3
+from datetime import timedelta
+from html import escape
+
+import pytest
+
+pytest.importorskip('googlemaps')
+import elt
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+# SQLite stores the log table's durations as text
+sqlite3.register_adapter(timedelta, str)
+
+# (season, date, state, location, description, killed), as on the CAIC page
+ACCIDENTS = [
+    ('2022-2023', '1/10', 'CO', 'Berthoud Pass', 'Skier caught & buried', '1'),
+    ('2022-2023', '2/3', 'UT', 'Little Cottonwood Canyon', 'Snowboarder caught', '2'),
+    ('2023-2024', '12/13', 'CO', 'Loveland Pass', 'Climber caught', '1'),
+    ('2023-2024', '3/2', 'WA', 'Snoqualmie Pass', 'Snowshoer caught', '1'),
+]
+
+
+def accident_page(accidents):
+    sections = []
+    for season in dict.fromkeys(accident[0] for accident in accidents):
+        rows = ''.join(
+            '<tr>' + ''.join(f'<td>{escape(cell)}</td>' for cell in accident[1:]) + '</tr>'
+            for accident in accidents if accident[0] == season
+        )
+        sections.append(
+            f'<h2>{season} SEASON</h2><table class="us_acc_table">'
+            '<tr><th>Date</th><th>State</th><th>Location</th><th>Description</th><th>Killed</th></tr>'
+            f'{rows}</table>'
+        )
+    return f"<html><body>{''.join(sections)}</body></html>".encode('utf-8')
+
+
+class Pipeline:
+    # run_pipeline against a SQLite copy of the bronze, silver and log tables, with the
+    # page download, geocoding API and cache invalidation replaced by local stand-ins
+
+    def __init__(self, tmp_path, monkeypatch):
+        self.engine = create_engine(f"sqlite:///{tmp_path / 'elt.db'}")
+        self.checkpoint_dir = str(tmp_path / 'checkpoints')
+        self.page = accident_page(ACCIDENTS)
+        self.geocoded = []
+        self.invalidated = []
+        with self.engine.begin() as connection:
+            connection.execute(text("CREATE TABLE accidents_bronze (id INTEGER PRIMARY KEY, season TEXT, date TEXT, state TEXT, location TEXT, description TEXT, fatalities TEXT, natural_key TEXT UNIQUE, content_hash TEXT)"))
+            connection.execute(text("CREATE TABLE accidents_silver (id INTEGER PRIMARY KEY, season TEXT, date TEXT, state TEXT, location TEXT, description TEXT, fatalities INTEGER, latitude REAL, longitude REAL, natural_key TEXT UNIQUE, content_hash TEXT)"))
+            connection.execute(text("CREATE TABLE log (id INTEGER PRIMARY KEY, elt_job_id TEXT, start_time TEXT, end_time TEXT, duration TEXT, status TEXT, data_count INTEGER, error_message TEXT, stage TEXT, peak_memory_kb INTEGER)"))
+        # The key and log columns above are what these PostgreSQL-only migrations add
+        monkeypatch.setattr(elt, 'ensure_row_key_columns', lambda engine: None)
+        monkeypatch.setattr(elt, 'ensure_log_columns', lambda engine: None)
+        monkeypatch.setattr(elt, 'fetch_page', self.fetch_page)
+        monkeypatch.setattr(elt, 'invalidate_cache', lambda endpoint, api_key, keys: self.invalidated.append(keys))
+
+    def fetch_page(self, url, previous_state):
+        body_hash = hashlib.sha256(self.page).hexdigest()
+        if previous_state.get('body_hash') == body_hash:
+            return None, previous_state
+        return self.page, {'etag': None, 'last_modified': None, 'body_hash': body_hash}
+
+    def geocoder(self):
+        def geocode(location):
+            self.geocoded.append(location)
+            return 40.0, -105.0
+        return geocode
+
+    def run(self, **options):
+        session = sessionmaker(bind=self.engine)()
+        try:
+            return elt.run_pipeline(self.engine, session, self.geocoder, checkpoint_dir=self.checkpoint_dir, **options)
+        finally:
+            session.close()
+
+    def query(self, statement):
+        with self.engine.connect() as connection:
+            return connection.execute(text(statement)).all()
+
+    def silver(self):
+        return {row[1]: row for row in self.query("SELECT id, location, state, fatalities, latitude FROM accidents_silver")}
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    return Pipeline(tmp_path, monkeypatch)
+
+
+def test_first_run_fills_the_summary_tables(pipeline):
+    assert pipeline.run()
+    assert pipeline.query("SELECT state, accident_count, fatalities FROM accidents_summary_state ORDER BY state") == [
+        ('Colorado', 2, 2), ('Utah', 1, 2), ('Washington', 1, 1),
+    ]
+    assert pipeline.query("SELECT month, accident_count FROM accidents_summary_month ORDER BY month") == [
+        ('2023-01', 1), ('2023-02', 1), ('2023-12', 1), ('2024-03', 1),
+    ]
+
+
+def test_missing_summary_table_is_backfilled_on_an_unchanged_page(pipeline):
+    pipeline.run()
+    with pipeline.engine.begin() as connection:
+        connection.execute(text("DROP TABLE accidents_summary_season"))
+    pipeline.invalidated.clear()
+
+    assert pipeline.run()
+    assert pipeline.query("SELECT season, accident_count, fatalities FROM accidents_summary_season ORDER BY season") == [
+        ('2022-2023', 2, 3), ('2023-2024', 2, 2),
+    ]
+    # No row changed, so the rebuilt rollups are published with a version switch alone
+    assert pipeline.invalidated == [[]]
+
+
+def test_partial_summary_table_is_rebuilt_in_full(pipeline):
+    pipeline.run()
+    with pipeline.engine.begin() as connection:
+        connection.execute(text("DELETE FROM accidents_summary_state WHERE state = 'Utah'"))
+    edited = list(ACCIDENTS)
+    edited[0] = edited[0][:4] + ('Skier caught & fully buried', '1')
+    pipeline.page = accident_page(edited)
+
+    # The run only touches Colorado, Utah comes back from the full backfill
+    assert pipeline.run()
+    assert pipeline.query("SELECT state, accident_count FROM accidents_summary_state ORDER BY state") == [
+        ('Colorado', 2), ('Utah', 1), ('Washington', 1),
+    ]
+
+
+def test_unchanged_page_leaves_the_summary_tables_alone(pipeline):
+    pipeline.run()
+    before = pipeline.query("SELECT state, updated_at FROM accidents_summary_state ORDER BY state")
+    pipeline.invalidated.clear()
+    assert pipeline.run()
+    assert pipeline.query("SELECT state, updated_at FROM accidents_summary_state ORDER BY state") == before
+    assert pipeline.invalidated == []
+
+
+def test_first_run_loads_every_row(pipeline):
+    assert pipeline.run()
+    silver = pipeline.silver()
+    assert set(silver) == {accident[3] for accident in ACCIDENTS}
+    assert silver['Little Cottonwood Canyon'][2] == 'Utah'
+    assert pipeline.query("SELECT COUNT(*) FROM accidents_bronze")[0][0] == len(ACCIDENTS)
+    assert len(pipeline.invalidated[0]) == len(ACCIDENTS)
+
+
+def test_unchanged_page_loads_nothing(pipeline):
+    pipeline.run()
+    pipeline.invalidated.clear()
+    assert pipeline.run()
+    assert pipeline.invalidated == []
+    assert pipeline.query("SELECT data_count FROM log WHERE stage = 'silver_load'")[-1][0] == 0
+
+
+def test_edited_description_updates_the_row_in_place(pipeline):
+    pipeline.run()
+    before = pipeline.silver()
+    edited = list(ACCIDENTS)
+    edited[0] = edited[0][:4] + ('Skier caught & fully buried', '2')
+    pipeline.page = accident_page(edited)
+    pipeline.geocoded.clear()
+
+    assert pipeline.run()
+    after = pipeline.silver()
+    assert after['Berthoud Pass'][0] == before['Berthoud Pass'][0]
+    assert after['Berthoud Pass'][3] == 2
+    assert pipeline.invalidated[-1] == [f"accident_{before['Berthoud Pass'][0]}"]
+    # Served from the geocode cache
+    assert pipeline.geocoded == []
+
+
+def test_edited_natural_key_replaces_the_old_row(pipeline):
+    pipeline.run()
+    before = pipeline.silver()
+    edited = list(ACCIDENTS)
+    edited[3] = ('2023-2024', '3/2', 'OR', 'Mount Hood', 'Snowshoer caught', '1')
+    pipeline.page = accident_page(edited)
+
+    assert pipeline.run()
+    after = pipeline.silver()
+    assert 'Snoqualmie Pass' not in after and 'Mount Hood' in after
+    assert pipeline.query("SELECT COUNT(*) FROM accidents_bronze")[0][0] == len(ACCIDENTS)
+    # Washington's only accident moved, so its rollup goes
+    assert pipeline.query("SELECT state, accident_count FROM accidents_summary_state ORDER BY state") == [
+        ('Colorado', 2), ('Oregon', 1), ('Utah', 1),
+    ]
+    assert sorted(pipeline.invalidated[-1]) == sorted([f"accident_{after['Mount Hood'][0]}", f"accident_{before['Snoqualmie Pass'][0]}"])
+
+
+def test_geocoder_gets_the_original_location_text(pipeline):
+    pipeline.run()
+    # Not the lowercased cache key
+    assert sorted(pipeline.geocoded) == [
+        'Berthoud Pass, Colorado', 'Little Cottonwood Canyon, Utah', 'Loveland Pass, Colorado', 'Snoqualmie Pass, Washington',
+    ]
+
+
+def test_dry_run_writes_nothing(pipeline):
+    assert pipeline.run(dry_run=True)
+    assert pipeline.query("SELECT COUNT(*) FROM accidents_silver")[0][0] == 0
+    assert pipeline.query("SELECT COUNT(*) FROM log")[0][0] == 0
+    assert pipeline.invalidated == [] and pipeline.geocoded == []
+    assert not os.path.exists(pipeline.checkpoint_dir)
+    tables = {row[0] for row in pipeline.query("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert tables == {'accidents_bronze', 'accidents_silver', 'log'}
+
+
+def test_resume_from_a_checkpoint(pipeline):
+    pipeline.run()
+    pipeline.invalidated.clear()
+    # Resuming at invalidate reuses the silver_load checkpoint's keys
+    assert pipeline.run(from_stage='invalidate')
+    assert len(pipeline.invalidated[0]) == len(ACCIDENTS)
+
+
+@pytest.mark.parametrize('profile_memory', [False, True])
+def test_stage_memory_is_logged_and_tracing_is_opt_in(pipeline, monkeypatch, profile_memory):
+    traced = []
+    monkeypatch.setattr(elt.tracemalloc, 'start', lambda: traced.append('start'))
+    monkeypatch.setattr(elt.tracemalloc, 'stop', lambda: traced.append('stop'))
+    monkeypatch.setattr(elt.tracemalloc, 'reset_peak', lambda: None)
+    monkeypatch.setattr(elt.tracemalloc, 'get_traced_memory', lambda: (0, 2048 * 1024))
+
+    assert pipeline.run(profile_memory=profile_memory)
+    assert traced == (['start', 'stop'] if profile_memory else [])
+    peaks = [row[0] for row in pipeline.query("SELECT peak_memory_kb FROM log WHERE stage IS NOT NULL")]
+    assert len(peaks) == len(elt.STAGES)
+    if profile_memory:
+        assert set(peaks) == {2048}
+    else:
+        # Maximum RSS only grows from stage to stage
+        assert peaks == sorted(peaks) and peaks[0] > 0
+
+
+def test_profile_memory_flag():
+    assert not elt.parse_args([]).profile_memory
+    assert elt.parse_args(['--profile-memory']).profile_memory
@@ -0,0 +1,73 @@
+import csv
+import io
+
+import pytest
+
+from conftest import ACCIDENT_ROWS, API_KEY, invalidate
+from synthetic import generate_accidents
+
+ACCIDENTS = generate_accidents(ACCIDENT_ROWS)
+HEADERS = {'access_token': API_KEY}
+
+
+async def export(client, **params):
+    response = await client.get('/api/export/accidents', params=params, headers=HEADERS)
+    assert response.status_code == 200
+    return response
+
+
+def test_csv_with_selected_columns_and_filters(run, client):
+    state = ACCIDENTS[0]['state']
+
+    async def scenario():
+        response = await export(client, format='csv', columns='state, id', state=state)
+        assert response.headers['content-type'].startswith('text/csv')
+        rows = list(csv.reader(io.StringIO(response.text)))
+        # Table order, not the order asked for
+        assert rows[0] == ['id', 'state']
+        assert rows[1:] == [[str(accident['id']), state] for accident in ACCIDENTS if accident['state'] == state]
+
+    run(scenario())
+
+
+@pytest.mark.parametrize('export_format', ['parquet', 'arrow'])
+def test_columnar_formats(run, client, export_format):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    async def scenario():
+        response = await export(client, format=export_format, columns='id,fatalities,date', min_fatalities=2)
+        assert 'content-encoding' not in response.headers
+        source = pyarrow.BufferReader(response.content)
+        table = pyarrow.parquet.read_table(source) if export_format == 'parquet' else pyarrow.ipc.open_file(source).read_all()
+        assert table.column_names == ['id', 'date', 'fatalities']
+        expected = [accident for accident in ACCIDENTS if accident['fatalities'] >= 2]
+        assert table.column('id').to_pylist() == [accident['id'] for accident in expected]
+        assert table.column('fatalities').to_pylist() == [accident['fatalities'] for accident in expected]
+
+    run(scenario())
+
+
+def test_revalidation_follows_the_dataset_version(run, client):
+    async def scenario():
+        etag = (await export(client, format='csv')).headers['etag']
+        cached = await client.get('/api/export/accidents', params={'format': 'csv'}, headers={**HEADERS, 'If-None-Match': etag})
+        assert cached.status_code == 304
+
+        await invalidate(client, [])
+        changed = await client.get('/api/export/accidents', params={'format': 'csv'}, headers={**HEADERS, 'If-None-Match': etag})
+        assert changed.status_code == 200
+
+    run(scenario())
+
+
+def test_bad_requests(run, client):
+    async def scenario():
+        unknown = await client.get('/api/export/accidents', params={'columns': 'id,password'}, headers=HEADERS)
+        assert unknown.status_code == 422
+        assert 'password' in unknown.text
+        assert (await client.get('/api/export/accidents', params={'format': 'xlsx'}, headers=HEADERS)).status_code == 422
+        assert (await client.get('/api/export/accidents')).status_code in (401, 403)
+
+    run(scenario())
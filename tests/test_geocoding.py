@@ -0,0 +1,49 @@
+from geocoding import RateLimiter, geocode_many, normalize_location
+
+
+class DictCache:
+    # GeocodeCache's get_many/put_many over a dict
+
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+
+    def get_many(self, location_keys):
+        return {key: self.entries[key] for key in location_keys if key in self.entries}
+
+    def put_many(self, results):
+        self.entries.update(results)
+
+
+def test_each_spelling_of_a_place_is_looked_up_once():
+    calls = []
+
+    def geocoder(location):
+        calls.append(location)
+        return 40.0, -105.0
+
+    cache = DictCache()
+    coordinates = geocode_many(['Berthoud Pass', 'berthoud  pass', 'Loveland Pass', None], geocoder, cache, requests_per_second=0)
+    assert sorted(calls) == ['Berthoud Pass', 'Loveland Pass']
+    assert coordinates == {'Berthoud Pass': (40.0, -105.0), 'berthoud  pass': (40.0, -105.0), 'Loveland Pass': (40.0, -105.0)}
+    assert set(cache.entries) == {'berthoud pass', 'loveland pass'}
+
+
+def test_cache_hits_skip_the_provider_and_failures_are_not_cached():
+    def geocoder(location):
+        raise RuntimeError("quota exceeded")
+
+    cache = DictCache({normalize_location('Berthoud Pass'): (39.8, -105.8)})
+    coordinates = geocode_many(['Berthoud Pass', 'Loveland Pass'], geocoder, cache, requests_per_second=0)
+    assert coordinates == {'Berthoud Pass': (39.8, -105.8), 'Loveland Pass': (None, None)}
+    assert 'loveland pass' not in cache.entries
+
+
+def test_rate_limiter_spaces_out_calls(monkeypatch):
+    now = [0.0]
+    slept = []
+    monkeypatch.setattr('geocoding.time.monotonic', lambda: now[0])
+    monkeypatch.setattr('geocoding.time.sleep', slept.append)
+    limiter = RateLimiter(4)
+    for _ in range(3):
+        limiter.wait()
+    assert slept == [0.25, 0.5]
@@ -0,0 +1,73 @@
+import pytest
+
+import cache
+import dataset
+import routers
+from conftest import invalidate
+from dataset import versioned_key
+from http_cache import variant_key
+from metrics import db_rows_loaded
+
+
+def test_matching_etag_gets_304(run, client):
+    async def scenario():
+        first = await client.get('/api/accidents/')
+        etag = first.headers['etag']
+        assert first.headers['vary'] == 'Accept-Encoding'
+
+        revalidated = await client.get('/api/accidents/', headers={'If-None-Match': etag})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b''
+        assert revalidated.headers['etag'] == etag
+
+        single = await client.get('/api/accidents/1', headers={'If-None-Match': etag})
+        assert single.status_code == 304
+
+    run(scenario())
+
+
+def test_etag_changes_with_the_dataset_version(run, client):
+    async def scenario():
+        etag = (await client.get('/api/accidents/')).headers['etag']
+        await invalidate(client, [])
+
+        response = await client.get('/api/accidents/', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['etag'] != etag
+
+    run(scenario())
+
+
+def test_gzip_variant_matches_the_json_body(run, client):
+    async def scenario():
+        plain = await client.get('/api/accidents/', headers={'Accept-Encoding': 'identity'})
+        compressed = await client.get('/api/accidents/', headers={'Accept-Encoding': 'gzip'})
+        assert 'content-encoding' not in plain.headers
+        assert compressed.headers['content-encoding'] == 'gzip'
+        # httpx has already decompressed it
+        assert compressed.content == plain.content
+        assert compressed.headers['etag'] == plain.headers['etag']
+
+    run(scenario())
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'identity'])
+def test_prewarmed_bodies_are_fresh_under_a_soft_ttl(run, client, monkeypatch, encoding):
+    monkeypatch.setattr(routers, 'ACCIDENTS_SOFT_TTL', 30)
+
+    async def scenario():
+        await invalidate(client, [])
+        version = await dataset.get_dataset_version()
+        key = versioned_key('all_accidents', version)
+        assert await cache.redis_bytes_client.get(f"{key}:fresh") is not None
+        assert await cache.redis_bytes_client.get(f"{variant_key(key, 'gzip')}:fresh") is not None
+
+        # Served as prewarmed, neither reloaded nor refreshed in the background
+        cache.local_cache.clear()
+        before = db_rows_loaded._values.get(('all_accidents',), 0)
+        response = await client.get('/api/accidents/', headers={'Accept-Encoding': encoding})
+        assert response.status_code == 200
+        assert not cache._inflight
+        assert db_rows_loaded._values.get(('all_accidents',), 0) == before
+
+    run(scenario())
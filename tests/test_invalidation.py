@@ -0,0 +1,75 @@
+import cache
+import dataset
+from conftest import execute_sql, invalidate
+from dataset import versioned_key
+
+
+def by_id(accidents):
+    return {accident['id']: accident for accident in accidents}
+
+
+def test_full_list_is_served_from_cache_until_invalidated(run, client):
+    async def scenario():
+        first = await client.get('/api/accidents/')
+        assert first.status_code == 200
+        execute_sql("UPDATE accidents_silver SET location = 'Renamed' WHERE id = 1")
+
+        cached = await client.get('/api/accidents/')
+        assert cached.content == first.content
+
+        await invalidate(client, ['accident_1'])
+        fresh = await client.get('/api/accidents/')
+        assert by_id(fresh.json())[1]['location'] == 'Renamed'
+
+    run(scenario())
+
+
+def test_invalidation_without_prewarm_rebuilds_on_first_read(run, client):
+    async def scenario():
+        states = (await client.get('/api/stats/states')).json()
+        execute_sql("UPDATE accidents_summary_state SET accident_count = 999 WHERE state = :state", {'state': states[0]['state']})
+
+        await invalidate(client, [], prewarm=False)
+        assert (await client.get('/api/stats/states')).json()[0]['accident_count'] == 999
+
+    run(scenario())
+
+
+def test_prewarm_stores_the_new_version_before_switching(run, client):
+    async def scenario():
+        await invalidate(client, [])
+        version = await dataset.get_dataset_version()
+        for key in ('all_accidents', 'stats_seasons', 'stats_states', 'stats_months'):
+            assert await cache.redis_bytes_client.get(versioned_key(key, version)) is not None
+
+    run(scenario())
+
+
+def test_targeted_invalidation_only_unlinks_the_named_keys(run, client):
+    async def scenario():
+        assert (await client.post('/api/accidents/batch', json={'ids': [1, 2]})).status_code == 200
+        await invalidate(client, ['accident_1'])
+        assert await cache.redis_bytes_client.get('accident_1') is None
+        assert await cache.redis_bytes_client.get('accident_2') is not None
+
+    run(scenario())
+
+
+def test_full_reload_drops_accident_keys_and_keeps_the_rest(run, client):
+    async def scenario():
+        assert (await client.post('/api/accidents/batch', json={'ids': [1, 2]})).status_code == 200
+        # Stand-ins for a rate-limit window and a loader lock
+        await cache.redis_client.set('ratelimit:127.0.0.1:/api/accidents/', '1')
+        await cache.redis_client.set('lock:all_accidents', 'token')
+
+        await invalidate(client, [])
+        assert await cache.redis_bytes_client.get('accident_1') is None
+        assert await cache.redis_bytes_client.get('accident_2') is None
+        assert await cache.redis_client.get('ratelimit:127.0.0.1:/api/accidents/') == '1'
+        assert await cache.redis_client.get('lock:all_accidents') == 'token'
+
+        execute_sql("UPDATE accidents_silver SET fatalities = 42 WHERE id = 1")
+        await invalidate(client, [])
+        assert (await client.get('/api/accidents/1')).json()['fatalities'] == 42
+
+    run(scenario())
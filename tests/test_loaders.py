@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from loaders import copy_dataframe, upsert_dataframe
+
+COLUMNS = ['natural_key', 'location', 'fatalities']
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'loaders.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE accidents (id INTEGER PRIMARY KEY, natural_key TEXT UNIQUE, location TEXT, fatalities INTEGER)"))
+    yield engine
+    engine.dispose()
+
+
+def rows(engine):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT id, natural_key, location, fatalities FROM accidents ORDER BY id")).all()
+
+
+def test_copy_in_chunks_keeps_nulls_and_empty_strings(engine):
+    df = pd.DataFrame({'natural_key': ['a', 'b', 'c'], 'location': ['Berthoud Pass', '', None], 'fatalities': [1, None, 3]})
+    with engine.begin() as connection:
+        copy_dataframe(df, 'accidents', COLUMNS, connection, chunk_rows=2)
+    assert rows(engine) == [(1, 'a', 'Berthoud Pass', 1), (2, 'b', '', None), (3, 'c', None, 3)]
+
+
+def test_upsert_updates_in_place_and_inserts_new_keys(engine):
+    with engine.begin() as connection:
+        copy_dataframe(pd.DataFrame({'natural_key': ['a', 'b'], 'location': ['Old', 'Kept'], 'fatalities': [1, 2]}), 'accidents', COLUMNS, connection)
+    with engine.begin() as connection:
+        upsert_dataframe(pd.DataFrame({'natural_key': ['a', 'c'], 'location': ['New', 'Added'], 'fatalities': [2, 1]}), 'accidents', COLUMNS, connection, chunk_rows=1)
+        # The staging table is dropped, a second load in the same transaction works
+        upsert_dataframe(pd.DataFrame({'natural_key': ['c'], 'location': ['Added again'], 'fatalities': [1]}), 'accidents', COLUMNS, connection)
+    assert rows(engine) == [(1, 'a', 'New', 2), (2, 'b', 'Kept', 2), (3, 'c', 'Added again', 1)]
+
+
+def test_empty_frames_are_a_no_op(engine):
+    with engine.begin() as connection:
+        copy_dataframe(pd.DataFrame(columns=COLUMNS), 'accidents', COLUMNS, connection)
+        upsert_dataframe(pd.DataFrame(columns=COLUMNS), 'accidents', COLUMNS, connection)
+    assert rows(engine) == []
@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import cache
+from cache import LocalCache
+
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    local = LocalCache(max_entries=10, ttl=5)
+    local.set('a', b'1')
+    local.set('b', b'2', expiration=1)
+    now[0] += 2
+    assert local.get('a') == b'1' and local.get('b') is None
+    now[0] += 4
+    assert local.get('a') is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    local = LocalCache(max_entries=2, ttl=60)
+    local.set('a', b'1')
+    local.set('b', b'2')
+    local.get('a')
+    local.set('c', b'3')
+    assert local.get('b') is None
+    assert local.get('a') == b'1' and local.get('c') == b'3'
+
+
+def test_redis_hits_fill_the_local_tier(run, client):
+    async def scenario():
+        await cache.redis_bytes_client.set('body', b'{"a":1}')
+        assert await cache.get_cached_body('body') == b'{"a":1}'
+        # Served locally from now on, even with the Redis copy gone
+        await cache.redis_bytes_client.delete('body')
+        assert await cache.get_cached_body('body') == b'{"a":1}'
+
+    run(scenario())
+
+
+def test_invalidation_broadcast_evicts_in_every_worker(run, client):
+    async def scenario():
+        listener = asyncio.ensure_future(cache.listen_for_invalidations())
+        try:
+            await asyncio.sleep(0.1)
+            cache.local_cache.set('accident_1', b'old')
+            cache.local_cache.set('accident_2', b'kept')
+            # As published by another worker
+            await cache.redis_client.publish(cache.INVALIDATION_CHANNEL, json.dumps({'keys': ['accident_1']}))
+            for _ in range(50):
+                if cache.local_cache.get('accident_1') is None:
+                    break
+                await asyncio.sleep(0.02)
+            assert cache.local_cache.get('accident_1') is None
+            assert cache.local_cache.get('accident_2') == b'kept'
+        finally:
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+
+    run(scenario())
@@ -0,0 +1,58 @@
+import re
+
+from conftest import API_KEY
+from metrics import Counter, Histogram
+
+
+def sample(text, series):
+    # Value of one exposition line, given its name and labels exactly as rendered
+    match = re.search(rf'^{re.escape(series)} (\S+)$', text, re.MULTILINE)
+    assert match, f"{series} not in the scrape"
+    return float(match.group(1))
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, ('/a',))
+    text = '\n'.join(histogram.render())
+    assert sample(text, 'latency_seconds_bucket{route="/a",le="0.1"}') == 2
+    assert sample(text, 'latency_seconds_bucket{route="/a",le="1.0"}') == 3
+    assert sample(text, 'latency_seconds_bucket{route="/a",le="+Inf"}') == 4
+    assert sample(text, 'latency_seconds_count{route="/a"}') == 4
+    assert sample(text, 'latency_seconds_sum{route="/a"}') == 3.65
+
+
+def test_label_values_are_escaped():
+    counter = Counter('events_total', 'Events.', ('name',))
+    counter.inc(('say "hi"\n',), 2)
+    assert counter.render()[-1] == 'events_total{name="say \\"hi\\"\\n"} 2'
+
+
+def test_scrape_has_route_templates_cache_and_database_series(run, client):
+    async def scenario():
+        for accident_id in (1, 2, 2):
+            assert (await client.get(f'/api/accidents/{accident_id}')).status_code == 200
+        # The second full list is a local hit
+        for _ in range(2):
+            assert (await client.get('/api/accidents/')).status_code == 200
+        response = await client.get('/api/metrics', headers={'access_token': API_KEY})
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+        text = response.text
+
+        # One series per route template, not per id
+        assert sample(text, 'http_request_duration_seconds_count{method="GET",route="/api/accidents/{accident_id}",status="200"}') >= 3
+        assert '/api/accidents/1"' not in text
+        assert sample(text, 'cache_operations_total{tier="local",outcome="hits"}') >= 1
+        assert sample(text, 'db_query_duration_seconds_count{database="primary"}') >= 1
+        assert 'circuit_breaker_state{dependency="database"} 0' in text
+
+    run(scenario())
+
+
+def test_metrics_need_the_api_key(run, client):
+    async def scenario():
+        assert (await client.get('/api/metrics')).status_code in (401, 403)
+
+    run(scenario())
@@ -0,0 +1,96 @@
+import pytest
+from limits import parse
+from redis.exceptions import RedisError
+
+import rate_limit
+import utils
+from custom_exceptions import RateLimitError
+from rate_limit import RedisRateLimiter
+
+LIMIT = parse('4/minute')
+
+
+def worker():
+    # A limiter as another worker process would hold it, sharing only Redis
+    return RedisRateLimiter(key_func=None, enabled=True)
+
+
+def at(monkeypatch, seconds):
+    monkeypatch.setattr(rate_limit.time, 'time', lambda: seconds)
+
+
+async def allowed(limiter, calls, client='10.0.0.1'):
+    count = 0
+    for _ in range(calls):
+        try:
+            await limiter.check('routers.read_accident', LIMIT, client)
+            count += 1
+        except RateLimitError:
+            pass
+    return count
+
+
+def test_limit_is_shared_across_workers(run, client, monkeypatch):
+    at(monkeypatch, 6000.0)
+
+    async def scenario():
+        first, second = worker(), worker()
+        assert await allowed(first, 3) == 3
+        # Each worker's own bucket still has room, the Redis window does not
+        assert await allowed(second, 3) == 1
+        assert await allowed(second, 1, client='10.0.0.2') == 1
+
+    run(scenario())
+
+
+def test_previous_window_is_weighted_by_its_overlap(run, client, monkeypatch):
+    at(monkeypatch, 6000.0)
+
+    async def scenario():
+        assert await allowed(worker(), 4) == 4
+        # Halfway into the next minute the previous 4 count as 2
+        at(monkeypatch, 6090.0)
+        assert await allowed(worker(), 4) == 2
+
+    run(scenario())
+
+
+def test_local_bucket_rejects_before_redis(run, client, monkeypatch):
+    at(monkeypatch, 6000.0)
+
+    async def scenario():
+        limiter = worker()
+        before = dict(rate_limit.rate_limit_stats)
+        assert await allowed(limiter, 6) == 4
+        assert rate_limit.rate_limit_stats['local_rejections'] - before['local_rejections'] == 2
+        assert rate_limit.rate_limit_stats['redis_rejections'] == before['redis_rejections']
+
+    run(scenario())
+
+
+def test_redis_errors_fail_open(run, client):
+    async def unavailable(keys, args):
+        raise RedisError("connection refused")
+
+    async def scenario():
+        limiter = worker()
+        limiter._sliding_window = unavailable
+        assert await allowed(limiter, 4) == 4
+
+    run(scenario())
+
+
+def test_route_answers_429(run, client, monkeypatch):
+    monkeypatch.setattr(utils.limiter, 'enabled', True)
+    monkeypatch.setattr(utils.limiter, '_buckets', type(utils.limiter._buckets)())
+
+    async def scenario():
+        statuses = [(await client.get('/api/accidents/1')).status_code for _ in range(21)]
+        assert statuses == [200] * 20 + [429]
+
+    run(scenario())
+
+
+def test_decorated_routes_need_a_request_parameter():
+    with pytest.raises(ValueError):
+        worker().limit('1/minute')(lambda: None)
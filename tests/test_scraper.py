@@ -0,0 +1,65 @@
+import hashlib
+import os
+
+import pytest
+
+import scraper
+from conftest import REPO_DIR
+from scraper import fetch_page, iter_accident_rows, iter_accident_rows_bs4
+
+FIXTURE = os.path.join(REPO_DIR, 'benchmarks', 'fixtures', 'acc_us_sample.html')
+
+
+@pytest.fixture(scope='module')
+def page():
+    with open(FIXTURE, 'rb') as fixture:
+        return fixture.read()
+
+
+def test_lxml_parser_matches_beautifulsoup(page):
+    pytest.importorskip('lxml')
+    rows = list(iter_accident_rows(page))
+    assert len(rows) > 1000
+    assert rows == list(iter_accident_rows_bs4(page))
+
+
+class Response:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+def stub_get(monkeypatch, response):
+    sent = {}
+
+    def get(url, headers, timeout):
+        sent.update(headers)
+        return response
+
+    monkeypatch.setattr(scraper.requests, 'get', get)
+    return sent
+
+
+def test_validators_are_sent_and_304_skips_the_page(monkeypatch):
+    previous = {'etag': '"v1"', 'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT', 'body_hash': 'abc'}
+    sent = stub_get(monkeypatch, Response(304))
+    assert fetch_page('http://caic.test', previous) == (None, previous)
+    assert sent['If-None-Match'] == '"v1"' and sent['If-Modified-Since'] == previous['last_modified']
+
+
+def test_identical_body_without_validators_is_skipped(monkeypatch):
+    body = b'<html></html>'
+    stub_get(monkeypatch, Response(200, body))
+    content, state = fetch_page('http://caic.test', {})
+    assert content == body and state['body_hash'] == hashlib.sha256(body).hexdigest()
+
+    sent = stub_get(monkeypatch, Response(200, body))
+    assert fetch_page('http://caic.test', state) == (None, state)
+    assert 'If-None-Match' not in sent
+
+
+def test_error_status_raises(monkeypatch):
+    stub_get(monkeypatch, Response(503))
+    with pytest.raises(scraper.requests.HTTPError):
+        fetch_page('http://caic.test', {})
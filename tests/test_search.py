@@ -0,0 +1,62 @@
+from conftest import ACCIDENT_ROWS, execute_sql, invalidate
+from search import InvertedIndex, build_search_index, tokenize
+from synthetic import generate_accidents
+
+ACCIDENTS = generate_accidents(ACCIDENT_ROWS)
+
+
+def test_tokenize_drops_stop_words_and_punctuation():
+    assert tokenize("Skier caught & buried in the Trees") == ['skier', 'caught', 'buried', 'trees']
+    assert tokenize(None) == []
+
+
+def test_location_match_outranks_a_description_match():
+    index = InvertedIndex([
+        ((("Skier caught on Berthoud Pass", 1), ("Loveland Pass", 2)), b'1'),
+        ((("Skier caught", 1), ("Berthoud Pass", 2)), b'2'),
+        ((("Snowmobiler caught", 1), ("Red Mountain Pass", 2)), b'3'),
+    ])
+    total, matches = index.search("berthoud", limit=10)
+    assert total == 2
+    assert [doc_index for _, doc_index in matches] == [1, 0]
+
+
+def test_pages_cover_every_match_once():
+    index = build_search_index(ACCIDENTS)
+    total, everything = index.search("caught", limit=ACCIDENT_ROWS)
+    pages = [index.search("caught", limit=7, offset=offset)[1] for offset in range(0, total, 7)]
+    assert [match for page in pages for match in page] == everything
+    assert [score for score, _ in everything] == sorted((score for score, _ in everything), reverse=True)
+
+
+def test_route_pages_with_next_offset(run, client):
+    query = ACCIDENTS[0]['location']
+
+    async def scenario():
+        first = (await client.get('/api/accidents/search', params={'q': query, 'limit': 2})).json()
+        assert first['total'] > 2 and first['next_offset'] == 2
+        assert first['items'][0]['accident']['location'] == query
+        last = (await client.get('/api/accidents/search', params={'q': query, 'limit': 2, 'offset': first['total'] - 1})).json()
+        assert len(last['items']) == 1 and last['next_offset'] is None
+
+    run(scenario())
+
+
+def test_index_follows_the_dataset_version(run, client):
+    async def scenario():
+        assert (await client.get('/api/accidents/search', params={'q': 'xyzzy'})).json()['total'] == 0
+        execute_sql("UPDATE accidents_silver SET description = 'Xyzzy caught' WHERE id = 3")
+        await invalidate(client, ['accident_3'])
+        body = (await client.get('/api/accidents/search', params={'q': 'xyzzy'})).json()
+        assert [item['accident']['id'] for item in body['items']] == [3]
+
+    run(scenario())
+
+
+def test_query_bounds(run, client):
+    async def scenario():
+        assert (await client.get('/api/accidents/search', params={'q': ''})).status_code == 422
+        assert (await client.get('/api/accidents/search')).status_code == 422
+        assert (await client.get('/api/accidents/search', params={'q': 'skier', 'limit': 0})).status_code == 422
+
+    run(scenario())
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+import cache
+import routers
+from conftest import execute_sql
+
+
+def by_id(accidents):
+    return {accident['id']: accident for accident in accidents}
+
+
+async def wait_for_refreshes():
+    # Background soft-TTL refreshes run as tasks on the test's event loop
+    for _ in range(100):
+        if not cache._inflight:
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"refresh still running for {list(cache._inflight)}")
+
+
+def test_concurrent_misses_share_one_load(run, client):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return b'[1]'
+
+    async def scenario():
+        bodies = await asyncio.gather(*(cache.get_or_load_body('shared', loader) for _ in range(20)))
+        assert bodies == [b'[1]'] * 20
+        assert len(calls) == 1
+        assert await cache.get_or_load_body('shared', loader) == b'[1]' and len(calls) == 1
+
+    run(scenario())
+
+
+def test_a_failed_load_reaches_every_waiter_and_is_retried(run, client):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        if len(calls) == 1:
+            raise RuntimeError("database down")
+        return b'[2]'
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.get_or_load_body('flaky', loader) for _ in range(5)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert await cache.get_or_load_body('flaky', loader) == b'[2]'
+        assert len(calls) == 2
+
+    run(scenario())
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'identity'])
+def test_stale_body_is_served_while_it_refreshes(run, client, monkeypatch, encoding):
+    monkeypatch.setattr(routers, 'ACCIDENTS_SOFT_TTL', 1)
+    monkeypatch.setattr(cache.local_cache, 'ttl', 0.1)
+
+    async def fetch():
+        response = await client.get('/api/accidents/', headers={'Accept-Encoding': encoding})
+        assert response.status_code == 200
+        return response
+
+    async def scenario():
+        first = await fetch()
+        assert first.headers.get('content-encoding') == (None if encoding == 'identity' else encoding)
+        original = by_id(first.json())[1]['location']
+        execute_sql("UPDATE accidents_silver SET location = 'Renamed' WHERE id = 1")
+
+        # Past the soft TTL: the stale body comes back at once and one refresh starts,
+        # which runs on its own database session after this response has finished
+        await asyncio.sleep(1.2)
+        stale = await fetch()
+        assert by_id(stale.json())[1]['location'] == original
+
+        await wait_for_refreshes()
+        refreshed = await fetch()
+        assert refreshed.headers.get('content-encoding') == first.headers.get('content-encoding')
+        assert by_id(refreshed.json())[1]['location'] == 'Renamed'
+
+    run(scenario())
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+import cache
+import dataset
+from conftest import execute_sql, invalidate
+from snapshot import COLUMNS, open_snapshot, write_snapshot
+
+# id, season, date, state, location, description, fatalities, latitude, longitude
+ROWS = [
+    (1, '2020-2021', '2021-01-10', 'Colorado', 'Berthoud Pass', 'Skier caught', 1, 39.8, -105.8),
+    (2, '2020-2021', '2021-02-03', 'Utah', 'Alta', 'Snowboarder caught', 2, 40.6, -111.6),
+    (3, None, '2021-03-15', None, 'Unknown place', None, None, None, None),
+    (4, '2021-2022', None, 'Colorado', 'Loveland Pass', 'Climber caught', 3, 39.7, -105.9),
+    (5, '2021-2022', '2022-01-20', 'Ünïcode', 'Somewhere', 'Hiker caught', 1, 45.0, -110.0),
+]
+
+
+@pytest.fixture
+def accident_snapshot(tmp_path):
+    path = str(tmp_path / '1')
+    write_snapshot(path, ROWS)
+    return open_snapshot(path, '1')
+
+
+def ids(snapshot, filters):
+    base = {'state': None, 'season': None, 'date_from': None, 'date_to': None, 'min_fatalities': None}
+    return [int(snapshot.ids[position]) for position in snapshot.filter({**base, **filters})]
+
+
+def test_rows_round_trip_with_nulls(accident_snapshot):
+    assert len(accident_snapshot) == len(ROWS)
+    for position, row in enumerate(ROWS):
+        assert accident_snapshot.row(position) == dict(zip((column.name for column in COLUMNS), row))
+
+
+def test_position_of(accident_snapshot):
+    assert accident_snapshot.position_of(4) == 3
+    assert accident_snapshot.position_of(6) is None
+
+
+def test_equality_filters(accident_snapshot):
+    assert ids(accident_snapshot, {'state': 'Colorado'}) == [1, 4]
+    assert ids(accident_snapshot, {'state': 'Ünïcode'}) == [5]
+    assert ids(accident_snapshot, {'season': '2021-2022', 'state': 'Colorado'}) == [4]
+
+
+def test_unknown_values_match_nothing_not_nulls(accident_snapshot):
+    # Like SQL =, neither a value no row has nor any other value matches the NULL rows
+    assert ids(accident_snapshot, {'state': 'Atlantis'}) == []
+    assert ids(accident_snapshot, {'season': '1900-1901'}) == []
+    assert 3 not in ids(accident_snapshot, {'state': 'Utah'})
+
+
+def test_range_filters_skip_nulls(accident_snapshot):
+    assert ids(accident_snapshot, {'date_from': '2021-02-01'}) == [2, 3, 5]
+    assert ids(accident_snapshot, {'date_from': '2021-01-01', 'date_to': '2021-02-28'}) == [1, 2]
+    assert ids(accident_snapshot, {'min_fatalities': 2}) == [2, 4]
+    assert ids(accident_snapshot, {'min_fatalities': 0}) == [1, 2, 4, 5]
+
+
+def test_worker_behind_a_switch_does_not_recache_its_snapshot_rows(run, client, monkeypatch):
+    async def scenario():
+        assert (await client.get('/api/accidents/1')).status_code == 200
+        old_version = await dataset.get_dataset_version()
+        execute_sql("UPDATE accidents_silver SET fatalities = 42 WHERE id = 1")
+        await invalidate(client, ['accident_1'])
+
+        # Another worker that has not re-read the version yet still answers from its old snapshot
+        monkeypatch.setattr(dataset, '_current_version', old_version)
+        monkeypatch.setattr(dataset, '_version_checked_at', time.monotonic())
+        assert (await client.get('/api/accidents/1')).json()['fatalities'] != 42
+        assert await cache.redis_bytes_client.get('accident_1') is None
+
+        # so the first worker on the new version does not find that row in Redis
+        monkeypatch.setattr(dataset, '_version_checked_at', 0.0)
+        assert (await client.get('/api/accidents/1')).json()['fatalities'] == 42
+
+    run(scenario())
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from conftest import ACCIDENT_ROWS
+from spatial import GridIndex, build_spatial_index, haversine_km
+from synthetic import generate_accidents
+
+ACCIDENTS = generate_accidents(ACCIDENT_ROWS)
+
+rng = random.Random(0)
+POINTS = [(rng.uniform(-60, 70), rng.uniform(-180, 180), index) for index in range(500)]
+# Either side of the antimeridian
+POINTS += [(51.5, 179.9, 500), (51.6, -179.9, 501)]
+
+
+@pytest.fixture(scope='module')
+def grid():
+    return GridIndex(POINTS, cell_size=2.0)
+
+
+def brute_force_radius(lat, lon, radius_km):
+    distances = [(haversine_km(lat, lon, point_lat, point_lon), index) for point_lat, point_lon, index in POINTS]
+    return sorted((distance, index) for distance, index in distances if distance <= radius_km)
+
+
+def test_bbox_matches_a_scan(grid):
+    expected = [index for lat, lon, index in POINTS if 10 <= lat <= 40 and -120 <= lon <= -60]
+    assert sorted(grid.within_bbox(10, -120, 40, -60)) == expected
+
+
+def test_bbox_across_the_antimeridian(grid):
+    assert sorted(grid.payloads[index] for index in grid.within_bbox(51, 179, 52, -179)) == [500, 501]
+
+
+@pytest.mark.parametrize('lat, lon, radius_km', [(40, -105, 800), (51.5, 180, 50), (-20, 30, 3000)])
+def test_radius_matches_a_scan(grid, lat, lon, radius_km):
+    matches = [(distance, grid.payloads[index]) for distance, index in grid.within_radius(lat, lon, radius_km)]
+    assert matches == pytest.approx(brute_force_radius(lat, lon, radius_km))
+
+
+@pytest.mark.parametrize('lat, lon, k', [(40, -105, 5), (51.5, -180, 3), (-59, 0, 20), (0, 0, 600)])
+def test_nearest_matches_a_scan(grid, lat, lon, k):
+    expected = brute_force_radius(lat, lon, float('inf'))[:k]
+    assert [(distance, grid.payloads[index]) for distance, index in grid.nearest(lat, lon, k)] == pytest.approx(expected)
+
+
+def test_rows_without_coordinates_are_not_indexed():
+    rows = [dict(ACCIDENTS[0]), {**ACCIDENTS[1], 'latitude': None}]
+    assert len(build_spatial_index(rows)) == 1
+
+
+def test_routes(run, client):
+    async def scenario():
+        bbox = await client.get('/api/accidents/within-bbox', params={'min_lat': 38, 'min_lon': -112, 'max_lat': 41, 'max_lon': -105})
+        assert sorted(accident['id'] for accident in bbox.json()) == [
+            accident['id'] for accident in ACCIDENTS
+            if 38 <= accident['latitude'] <= 41 and -112 <= accident['longitude'] <= -105
+        ]
+
+        nearest = (await client.get('/api/accidents/nearest', params={'lat': 40, 'lon': -105, 'k': 3})).json()
+        expected = sorted(ACCIDENTS, key=lambda accident: haversine_km(40, -105, accident['latitude'], accident['longitude']))[:3]
+        assert [item['accident']['id'] for item in nearest] == [accident['id'] for accident in expected]
+
+        radius = (await client.get('/api/accidents/within-radius', params={'lat': 40, 'lon': -105, 'radius_km': 150})).json()
+        distances = [item['distance_km'] for item in radius]
+        assert distances == sorted(distances) and all(distance <= 150 for distance in distances)
+
+        inverted = await client.get('/api/accidents/within-bbox', params={'min_lat': 41, 'min_lon': -112, 'max_lat': 38, 'max_lon': -105})
+        assert inverted.status_code == 422
+
+    run(scenario())
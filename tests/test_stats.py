@@ -0,0 +1,29 @@
+import pytest
+
+from conftest import ACCIDENT_ROWS, execute_sql, invalidate
+from synthetic import generate_accidents, summary_rows
+
+SUMMARIES = summary_rows(generate_accidents(ACCIDENT_ROWS))
+
+
+@pytest.mark.parametrize('route,key', [('seasons', 'season'), ('states', 'state'), ('months', 'month')])
+def test_rollups_are_served_from_the_summary_tables(run, client, route, key):
+    async def scenario():
+        response = await client.get(f'/api/stats/{route}')
+        assert response.status_code == 200
+        assert [(row[key], row['accident_count'], row['fatalities']) for row in response.json()] == SUMMARIES[key]
+
+    run(scenario())
+
+
+def test_rollups_follow_the_dataset_version(run, client):
+    async def scenario():
+        first = (await client.get('/api/stats/states')).json()
+        execute_sql("UPDATE accidents_summary_state SET accident_count = accident_count + 1 WHERE state = :state", {'state': first[0]['state']})
+        assert (await client.get('/api/stats/states')).json() == first
+
+        await invalidate(client, [])
+        updated = (await client.get('/api/stats/states')).json()
+        assert updated[0]['accident_count'] == first[0]['accident_count'] + 1
+
+    run(scenario())
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+import routers
+from conftest import ACCIDENT_ROWS
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Several server-side cursor round trips for the seeded table
+    monkeypatch.setattr(routers, 'STREAM_CHUNK_SIZE', 7)
+
+
+def test_json_array(run, client):
+    async def scenario():
+        response = await client.get('/api/accidents/stream')
+        assert response.headers['content-type'].startswith('application/json')
+        accidents = response.json()
+        assert [accident['id'] for accident in accidents] == list(range(1, ACCIDENT_ROWS + 1))
+
+    run(scenario())
+
+
+def test_ndjson_lines(run, client):
+    async def scenario():
+        async with client.stream('GET', '/api/accidents/stream', params={'format': 'ndjson'}) as response:
+            assert response.headers['content-type'].startswith('application/x-ndjson')
+            lines = [line async for line in response.aiter_lines() if line]
+        assert [json.loads(line)['id'] for line in lines] == list(range(1, ACCIDENT_ROWS + 1))
+
+    run(scenario())
+
+
+def test_streamed_rows_match_the_cached_list(run, client):
+    async def scenario():
+        streamed = (await client.get('/api/accidents/stream')).json()
+        listed = sorted((await client.get('/api/accidents/')).json(), key=lambda accident: accident['id'])
+        assert streamed == listed
+
+    run(scenario())
+
+
+def test_unknown_format_is_rejected(run, client):
+    async def scenario():
+        assert (await client.get('/api/accidents/stream', params={'format': 'xml'})).status_code == 422
+
+    run(scenario())
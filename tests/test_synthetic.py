@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from synthetic import generate_accidents, summary_rows
+
+
+def test_rows_are_reproducible_from_the_seed():
+    assert generate_accidents(50) == generate_accidents(50)
+    assert generate_accidents(50, seed=1) != generate_accidents(50)
+    assert [accident['id'] for accident in generate_accidents(50)] == list(range(1, 51))
+
+
+def test_dates_fall_in_their_season():
+    for accident in generate_accidents(500):
+        start_year, end_year = map(int, accident['season'].split('-'))
+        year, month = int(accident['date'][:4]), int(accident['date'][5:7])
+        assert year == (start_year if month > 6 else end_year)
+
+
+def test_rollups_match_the_elt_summary_tables(tmp_path):
+    pytest.importorskip('googlemaps')
+    import elt
+
+    accidents = generate_accidents(300)
+    engine = create_engine(f"sqlite:///{tmp_path / 'silver.db'}")
+    pd.DataFrame(accidents).to_sql('accidents_silver', engine, index=False)
+    elt.ensure_summary_tables(engine)
+    # Empty tables are filled from every group of accidents_silver
+    elt.refresh_summary_tables(pd.DataFrame(columns=['season', 'date', 'state']), engine)
+
+    expected = summary_rows(accidents)
+    with engine.connect() as connection:
+        for table_name, (key_column, _) in elt.SUMMARY_TABLES.items():
+            rows = connection.execute(text(f"SELECT {key_column}, accident_count, fatalities FROM {table_name} ORDER BY {key_column}")).all()
+            assert [tuple(row) for row in rows] == expected[key_column]
+    engine.dispose()
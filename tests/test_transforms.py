@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from bench_transforms import synthetic_bronze
+from transforms import ERROR_COLUMN, transform_silver, transform_silver_rowwise
+
+
+def rowwise_values(series):
+    # The row-wise version reports failures as (None, message) tuples in the cell
+    return [None if isinstance(value, tuple) else value for value in series]
+
+
+def test_vectorized_matches_rowwise_on_synthetic_rows():
+    bronze = synthetic_bronze(2000)
+    vectorized = transform_silver(bronze)
+    rowwise = transform_silver_rowwise(bronze)
+    for column in ('date', 'state', 'refined_location'):
+        assert vectorized[column].tolist() == rowwise_values(rowwise[column])
+    assert vectorized[ERROR_COLUMN].isna().all()
+
+
+@pytest.mark.parametrize('date', ['1.5/3', '1/3.0', '2/30', '13/1', '0/5', '1/0', '1/3/4', '1-3', '', 'a/b', ' 1/3'])
+def test_invalid_dates_agree_with_rowwise(date):
+    bronze = pd.DataFrame({
+        'season': ['2021-2022'], 'date': [date], 'state': ['CO'], 'location': ['Berthoud Pass'],
+        'description': ['Skier caught'], 'fatalities': ['1'],
+    })
+    vectorized = transform_silver(bronze)
+    assert vectorized['date'].tolist() == rowwise_values(transform_silver_rowwise(bronze)['date'])
+    assert (vectorized['date'][0] is None) == (vectorized[ERROR_COLUMN][0] == 'invalid date for season')
+
+
+def test_dagger_and_season_year():
+    bronze = pd.DataFrame({
+        'season': ['2021-2022', '2021-2022'], 'date': ['12/31†', '2/28'], 'state': ['UT', 'XX'],
+        'location': ['Cardiff Fork, 2 mi N of Alta', None], 'description': ['', ''], 'fatalities': ['1', '1'],
+    })
+    silver = transform_silver(bronze)
+    assert silver['date'].tolist() == ['2021-12-31', '2022-02-28']
+    assert silver['state'].tolist() == ['Utah', 'XX']
+    assert silver['refined_location'].tolist() == ['Alta, Utah', None]
+    assert silver[ERROR_COLUMN].tolist()[1] == 'location is not text'
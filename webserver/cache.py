@@ -1,27 +1,454 @@
 from redis.asyncio import Redis
-from redis.exceptions import RedisError  
+from redis.asyncio.client import Pipeline
+from redis.exceptions import RedisError, ConnectionError as RedisConnectionFailure, TimeoutError as RedisTimeoutError
 from custom_exceptions import RedisConnectionError
+from circuit_breaker import CircuitBreaker, register_breaker
+from collections import OrderedDict
+import asyncio
 import json
+import logging
 import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# "fake" swaps Redis for an in-process fakeredis server, for local runs and benchmarks only
+REDIS_BACKEND = os.environ.get('REDIS_BACKEND', 'redis')
+
+# Both clients of a fake backend share one server
+_fake_redis_server = None
+
+# Bounded waits on Redis (seconds), a slow Redis costs a request at most this before it falls back
+REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', 0.25))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 0.5))
+
+
+class RedisCircuitOpenError(RedisError):
+    # A RedisError, so every existing Redis fallback also covers an open breaker
+    pass
+
+
+redis_breaker = register_breaker(CircuitBreaker("redis", (RedisConnectionFailure, RedisTimeoutError), RedisCircuitOpenError))
+
+
+class GuardedPipeline(Pipeline):
+
+    async def execute(self, raise_on_error=True):
+        async with redis_breaker.guard():
+            return await super().execute(raise_on_error)
+
+
+class GuardedRedisMixin:
+    # Every command, script call and pipeline of the client goes through the Redis circuit breaker
+
+    async def execute_command(self, *args, **options):
+        async with redis_breaker.guard():
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return GuardedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class GuardedRedis(GuardedRedisMixin, Redis):
+    pass
+
+
+def create_redis_client(**options):
+    if REDIS_BACKEND == "fake":
+        # Development-only dependency (pip install fakeredis, plus lupa for the Lua scripts)
+        import fakeredis.aioredis
+        global _fake_redis_server
+        if _fake_redis_server is None:
+            _fake_redis_server = fakeredis.FakeServer()
+        guarded_class = type("GuardedFakeRedis", (GuardedRedisMixin, fakeredis.aioredis.FakeRedis), {})
+        return guarded_class(server=_fake_redis_server, **options)
+    options = {"socket_connect_timeout": REDIS_CONNECT_TIMEOUT, "socket_timeout": REDIS_SOCKET_TIMEOUT, **options}
+    return GuardedRedis(
+        host=os.environ.get('REDIS_HOST'),
+        port=os.environ.get('REDIS_PORT'),
+        password=os.environ.get('REDIS_PASSWORD'),
+        **options
+    )
+
 
 # Initialize the Redis client asynchronously
-redis_client = Redis(
-    host=os.environ.get('REDIS_HOST'),
-    port=os.environ.get('REDIS_PORT'),
-    password=os.environ.get('REDIS_PASSWORD'),
-    encoding="utf-8",
-    decode_responses=True
-)
+redis_client = create_redis_client(encoding="utf-8", decode_responses=True)
+
+# Second client for pre-serialized response bodies, returns raw bytes so a hit
+# can be written to the socket without decoding
+redis_bytes_client = create_redis_client(decode_responses=False)
+
+# Subscriber connection, it blocks on reads between messages so has no socket timeout
+pubsub_client = create_redis_client(encoding="utf-8", decode_responses=True, socket_timeout=None)
+
+# Local tier settings, entries live far shorter than in Redis since they are per worker
+LOCAL_CACHE_TTL = float(os.environ.get('LOCAL_CACHE_TTL', 60))
+LOCAL_CACHE_MAX_ENTRIES = int(os.environ.get('LOCAL_CACHE_MAX_ENTRIES', 256))
+
+# Pub/sub channel used to drop local entries in every worker at once
+INVALIDATION_CHANNEL = "cache_invalidation"
+
+# Cross-worker loader lock, held at most this long if its holder dies mid-load (seconds)
+SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_LOCK_TIMEOUT', 30))
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+# Only delete the lock if this worker still owns it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Keys per UNLINK command, so a large invalidation is a few commands in one round trip
+UNLINK_BATCH_SIZE = 1000
+
+# Per-accident bodies, the only cached data not scoped to a dataset version
+ACCIDENT_KEY_PATTERN = "accident_*"
+
+# Per-tier hit/miss counters
+cache_stats = {
+    "local": {"hits": 0, "misses": 0, "evictions": 0},
+    "redis": {"hits": 0, "misses": 0, "errors": 0},
+}
+
+
+class LocalCache:
+    # Bounded in-process LRU with a per-entry TTL
+
+    def __init__(self, max_entries=LOCAL_CACHE_MAX_ENTRIES, ttl=LOCAL_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, expiration=None):
+        ttl = self.ttl if expiration is None else min(self.ttl, expiration)
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            cache_stats["local"]["evictions"] += 1
+
+    def evict(self, keys):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_cache = LocalCache()
+
+# Callbacks run in every worker when an invalidation message arrives
+invalidation_listeners = []
+
+
+def _local_hit(key):
+    value = local_cache.get(key)
+    if value is None:
+        cache_stats["local"]["misses"] += 1
+    else:
+        cache_stats["local"]["hits"] += 1
+    return value
+
+
+def _count_redis_result(value):
+    if value is None:
+        cache_stats["redis"]["misses"] += 1
+    else:
+        cache_stats["redis"]["hits"] += 1
+
 
 async def get_cached_data(key):
+    value = _local_hit(key)
+    if value is not None:
+        return value
     try:
         cached_data = await redis_client.get(key)
-        return json.loads(cached_data) if cached_data else None
-    except RedisError as e:  
+    except RedisError as e:
+        cache_stats["redis"]["errors"] += 1
         raise RedisConnectionError(detail=f"Redis error: {e}")
+    _count_redis_result(cached_data)
+    if not cached_data:
+        return None
+    value = json.loads(cached_data)
+    local_cache.set(key, value)
+    return value
 
 async def set_cache_data(key, data, expiration=60*60):
+    local_cache.set(key, data, expiration)
     try:
         await redis_client.setex(key, expiration, json.dumps(data))
     except RedisError as e:
-        raise RedisConnectionError(detail=f"Redis error: {e}")
\ No newline at end of file
+        cache_stats["redis"]["errors"] += 1
+        raise RedisConnectionError(detail=f"Redis error: {e}")
+
+# Pre-serialized mode: the value is the final encoded JSON body, stored and
+# returned as-is with no json.loads/json.dumps round trip
+async def get_cached_body(key):
+    body = _local_hit(key)
+    if body is not None:
+        return body
+    try:
+        body = await redis_bytes_client.get(key)
+    except RedisError as e:
+        cache_stats["redis"]["errors"] += 1
+        raise RedisConnectionError(detail=f"Redis error: {e}")
+    _count_redis_result(body)
+    if body:
+        local_cache.set(key, body)
+    return body
+
+async def set_cached_body(key, body, expiration=60*60):
+    local_cache.set(key, body, expiration)
+    try:
+        await redis_bytes_client.setex(key, expiration, body)
+    except RedisError as e:
+        cache_stats["redis"]["errors"] += 1
+        raise RedisConnectionError(detail=f"Redis error: {e}")
+
+
+# Batch variants: one MGET for every key the local tier misses, one pipelined write back
+async def get_cached_bodies(keys):
+    bodies = {}
+    remote_keys = []
+    for key in keys:
+        body = _local_hit(key)
+        if body is None:
+            remote_keys.append(key)
+        else:
+            bodies[key] = body
+    if not remote_keys:
+        return bodies
+    try:
+        values = await redis_bytes_client.mget(remote_keys)
+    except RedisError as e:
+        cache_stats["redis"]["errors"] += 1
+        raise RedisConnectionError(detail=f"Redis error: {e}")
+    for key, body in zip(remote_keys, values):
+        _count_redis_result(body)
+        if body:
+            local_cache.set(key, body)
+            bodies[key] = body
+    return bodies
+
+async def set_cached_bodies(bodies, expiration=60*60):
+    try:
+        async with redis_bytes_client.pipeline(transaction=False) as pipe:
+            for key, body in bodies.items():
+                local_cache.set(key, body, expiration)
+                pipe.setex(key, expiration, body)
+            await pipe.execute()
+    except RedisError as e:
+        cache_stats["redis"]["errors"] += 1
+        raise RedisConnectionError(detail=f"Redis error: {e}")
+
+
+def queue_unlink(pipe, keys):
+    # UNLINK frees the values in the background instead of blocking Redis like DEL
+    keys = list(keys)
+    for start in range(0, len(keys), UNLINK_BATCH_SIZE):
+        pipe.unlink(*keys[start:start + UNLINK_BATCH_SIZE])
+
+
+async def scan_keys(pattern):
+    # SCAN walks the keyspace in batches instead of blocking Redis like KEYS
+    return [key async for key in redis_client.scan_iter(match=pattern, count=UNLINK_BATCH_SIZE)]
+
+
+release_lock = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+
+# In-flight loaders in this process, keyed by cache key
+_inflight = {}
+
+
+def _single_flight(key, load):
+    # Every caller for a key shares the first caller's task and its result or exception
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(load())
+        _inflight[key] = future
+
+        def forget(done):
+            if _inflight.get(key) is done:
+                del _inflight[key]
+            # Retrieve the exception so an unawaited background refresh does not warn
+            if not done.cancelled() and done.exception() is not None:
+                logger.debug(f"Loader for {key} failed: {done.exception()}")
+
+        future.add_done_callback(forget)
+    return future
+
+
+async def _store_loaded_body(key, loader, expiration, soft_ttl):
+    body = await loader()
+    try:
+        await set_cached_body(key, body, expiration)
+        if soft_ttl:
+            await redis_bytes_client.setex(f"{key}:fresh", int(soft_ttl), b"1")
+    except (RedisConnectionError, RedisError) as e:
+        logger.warning(f"Could not cache {key}: {e}")
+    return body
+
+
+async def _load_through_lock(key, loader, expiration, soft_ttl, wait=True):
+    lock_key = f"lock:{key}"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + SINGLE_FLIGHT_LOCK_TIMEOUT
+
+    while time.monotonic() < deadline:
+        try:
+            acquired = await redis_client.set(lock_key, token, nx=True, px=int(SINGLE_FLIGHT_LOCK_TIMEOUT * 1000))
+        except RedisError as e:
+            # Without Redis only the in-process coalescing applies
+            logger.warning(f"Could not take loader lock for {key}: {e}")
+            return await _store_loaded_body(key, loader, expiration, soft_ttl)
+
+        if acquired:
+            try:
+                return await _store_loaded_body(key, loader, expiration, soft_ttl)
+            finally:
+                try:
+                    await release_lock(keys=[lock_key], args=[token])
+                except RedisError as e:
+                    logger.warning(f"Could not release loader lock for {key}: {e}")
+
+        if not wait:
+            return None
+
+        # Another worker is loading, wait for it to store the body
+        while time.monotonic() < deadline:
+            await asyncio.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+            try:
+                body, holder = await redis_bytes_client.mget(key, lock_key)
+            except RedisError as e:
+                logger.warning(f"Could not poll loader lock for {key}: {e}")
+                return await _store_loaded_body(key, loader, expiration, soft_ttl)
+            if body:
+                local_cache.set(key, body)
+                return body
+            if holder is None:
+                # Holder finished without storing a body (e.g. it failed), try to take over
+                break
+
+    # The holder is stuck past the lock timeout, load without it
+    return await _store_loaded_body(key, loader, expiration, soft_ttl)
+
+
+async def _get_body_with_freshness(key):
+    body = _local_hit(key)
+    if body is not None:
+        return body, True
+    try:
+        body, fresh = await redis_bytes_client.mget(key, f"{key}:fresh")
+    except RedisError as e:
+        cache_stats["redis"]["errors"] += 1
+        raise RedisConnectionError(detail=f"Redis error: {e}")
+    _count_redis_result(body)
+    if body and fresh:
+        local_cache.set(key, body)
+    return body, fresh is not None
+
+
+async def peek_body(key, soft_ttl=None):
+    # (body, fresh) without loading anything; without soft_ttl every cached body is fresh.
+    # A Redis error is logged and read as a miss.
+    try:
+        if soft_ttl:
+            return await _get_body_with_freshness(key)
+        return await get_cached_body(key), True
+    except RedisConnectionError as e:
+        logger.exception(f"Redis connection error: {e}")
+        return None, True
+
+
+def refresh_in_background(key, loader, expiration=60*60, soft_ttl=None):
+    # One refresh per key at a time, callers keep serving the stale body meanwhile
+    if key not in _inflight:
+        _single_flight(key, lambda: _load_through_lock(key, loader, expiration, soft_ttl, wait=False))
+
+
+async def get_or_load_body(key, loader, expiration=60*60, soft_ttl=None):
+    # Returns the cached body for key, running loader() at most once per key across
+    # concurrent callers in this process and, through a Redis lock, across workers.
+    # With soft_ttl, a body older than soft_ttl is still served while one task refreshes it.
+    # loader() may still be running after its caller returns, so it must not use request-scoped resources.
+    body, fresh = await peek_body(key, soft_ttl)
+    if body:
+        if not fresh:
+            refresh_in_background(key, loader, expiration, soft_ttl)
+        return body
+
+    future = _single_flight(key, lambda: _load_through_lock(key, loader, expiration, soft_ttl))
+    body = await asyncio.shield(future)
+    if body is None:
+        # Joined a background refresh that found another worker already refreshing
+        return await get_or_load_body(key, loader, expiration, soft_ttl)
+    return body
+
+
+async def load_fresh_body(key, loader, expiration=60*60, soft_ttl=None):
+    # The cached body while it is still fresh, otherwise loader() stored with a new freshness marker.
+    # For bodies derived from key, so they are never rebuilt from a stale copy.
+    body, fresh = await peek_body(key, soft_ttl)
+    if body and fresh:
+        return body
+    return await _store_loaded_body(key, loader, expiration, soft_ttl)
+
+
+def apply_invalidation(keys):
+    # An empty or missing key list means every per-accident key went, start the local tier over
+    if keys:
+        local_cache.evict(keys)
+    else:
+        local_cache.clear()
+    for listener in invalidation_listeners:
+        listener(keys)
+
+
+async def publish_invalidation(keys=None):
+    apply_invalidation(keys)
+    await redis_client.publish(INVALIDATION_CHANNEL, json.dumps({"keys": keys or []}))
+
+
+async def listen_for_invalidations(retry_delay=1.0):
+    # Long-running task per worker, started with the application
+    while True:
+        pubsub = pubsub_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Messages may have been missed while disconnected, start from an empty local tier
+            apply_invalidation(None)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    keys = json.loads(message["data"]).get("keys")
+                except (ValueError, AttributeError):
+                    keys = None
+                apply_invalidation(keys)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Cache invalidation subscriber error, retrying in {retry_delay}s: {e}")
+            await asyncio.sleep(retry_delay)
+        finally:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
@@ -0,0 +1,87 @@
+from contextlib import asynccontextmanager
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failures that open a breaker, and how long it stays open before letting one trial call through
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get('CIRCUIT_RESET_TIMEOUT', 10))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    # Per-dependency breaker, per worker. Only failures_on exceptions (connection errors and timeouts)
+    # count; while open, calls fail at once with open_error instead of waiting on a dead dependency.
+
+    def __init__(self, name, failures_on, open_error, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failures_on = failures_on
+        self.open_error = open_error
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.stats = {"failures": 0, "rejections": 0, "opened": 0}
+
+    def _allow(self):
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        # Half open: a single trial call decides whether to close again
+        if self.state == HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def _record_success(self):
+        if self.state != CLOSED:
+            logger.info(f"Circuit breaker for {self.name} closed")
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def _record_failure(self):
+        self.stats["failures"] += 1
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.stats["opened"] += 1
+                logger.warning(f"Circuit breaker for {self.name} opened after {self.failures} failures")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    @asynccontextmanager
+    async def guard(self):
+        if not self._allow():
+            self.stats["rejections"] += 1
+            raise self.open_error(f"{self.name} circuit breaker is open")
+        try:
+            yield
+        except self.failures_on:
+            self._record_failure()
+            raise
+        except BaseException:
+            # Errors that say nothing about the dependency's health (bad query, cancellation)
+            if self.state == HALF_OPEN:
+                self._trial_in_flight = False
+            raise
+        else:
+            self._record_success()
+
+
+# Every breaker in this worker, reported by /metrics
+breakers = []
+
+
+def register_breaker(breaker):
+    breakers.append(breaker)
+    return breaker
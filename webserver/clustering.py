@@ -0,0 +1,84 @@
+from dataset import VersionedIndex
+from spatial import GridIndex
+from utils import encode_json_body
+import math
+import os
+
+# Zoom levels follow the 256px web map tiles used by the frontend (maplibre)
+MIN_CLUSTER_ZOOM = 0
+MAX_CLUSTER_ZOOM = int(os.environ.get('MAX_CLUSTER_ZOOM', 16))
+TILE_SIZE = 256
+
+# Points within the same square of this many screen pixels are merged into one cluster
+CLUSTER_RADIUS_PX = int(os.environ.get('CLUSTER_RADIUS_PX', 60))
+
+# Web Mercator is undefined at the poles
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def project(lat, lon, zoom):
+    # Longitude/latitude to Web Mercator pixel coordinates at the given zoom
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    scale = TILE_SIZE * (1 << zoom)
+    sin_lat = math.sin(math.radians(lat))
+    x = (lon + 180.0) / 360.0 * scale
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return x, y
+
+
+def merge_cells(cells):
+    # Cells are a fixed number of pixels, so halving the zoom halves the cell coordinates
+    merged = {}
+    for (cell_x, cell_y), (count, lat_sum, lon_sum, fatalities, accident_id) in cells.items():
+        key = (cell_x >> 1, cell_y >> 1)
+        current = merged.get(key)
+        if current is None:
+            merged[key] = (count, lat_sum, lon_sum, fatalities, accident_id)
+        else:
+            merged[key] = (current[0] + count, current[1] + lat_sum, current[2] + lon_sum, current[3] + fatalities, None)
+    return merged
+
+
+def build_zoom_index(cells):
+    clusters = []
+    for count, lat_sum, lon_sum, fatalities, accident_id in cells.values():
+        cluster = {
+            "latitude": lat_sum / count,
+            "longitude": lon_sum / count,
+            "count": count,
+            "fatalities": fatalities,
+            # Single accidents keep their id so the map can open the detail popup
+            "accident_id": accident_id,
+        }
+        clusters.append((cluster["latitude"], cluster["longitude"], encode_json_body(cluster)))
+    return GridIndex(clusters)
+
+
+def build_clusters(rows):
+    # Assign every geocoded accident to its cell at the finest zoom, then merge upwards
+    cells = {}
+    for row in rows:
+        if row["latitude"] is None or row["longitude"] is None:
+            continue
+        x, y = project(row["latitude"], row["longitude"], MAX_CLUSTER_ZOOM)
+        key = (int(x // CLUSTER_RADIUS_PX), int(y // CLUSTER_RADIUS_PX))
+        fatalities = row["fatalities"] or 0
+        current = cells.get(key)
+        if current is None:
+            cells[key] = (1, row["latitude"], row["longitude"], fatalities, row["id"])
+        else:
+            cells[key] = (current[0] + 1, current[1] + row["latitude"], current[2] + row["longitude"], current[3] + fatalities, None)
+
+    zoom_indexes = {}
+    for zoom in range(MAX_CLUSTER_ZOOM, MIN_CLUSTER_ZOOM - 1, -1):
+        zoom_indexes[zoom] = build_zoom_index(cells)
+        cells = merge_cells(cells)
+    return zoom_indexes
+
+
+cluster_index = VersionedIndex(build_clusters)
+
+
+def clusters_for_zoom(zoom_indexes, zoom):
+    # Beyond the finest precomputed level clusters no longer change meaningfully
+    return zoom_indexes[max(MIN_CLUSTER_ZOOM, min(MAX_CLUSTER_ZOOM, zoom))]
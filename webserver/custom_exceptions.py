@@ -1,4 +1,5 @@
 from fastapi import HTTPException
+from slowapi.errors import RateLimitExceeded
 
 
 class DatabaseConnectionError(HTTPException):
@@ -27,4 +28,13 @@ class InvalidAPIKeyError(HTTPException):
 
 class CacheInvalidationError(HTTPException):
     def __init__(self, detail: str = "Failed to invalidate cache"):
-        super().__init__(status_code=500, detail=detail)
\ No newline at end of file
+        super().__init__(status_code=500, detail=detail)
+
+class ExportFormatUnavailableError(HTTPException):
+    def __init__(self, detail: str = "Export format not available"):
+        super().__init__(status_code=501, detail=detail)
+
+class RateLimitError(RateLimitExceeded):
+    # Subclass so the existing RateLimitExceeded handler answers it; skips slowapi's Limit wrapper
+    def __init__(self, detail: str = "Rate limit exceeded"):
+        super(RateLimitExceeded, self).__init__(status_code=429, detail=detail)
\ No newline at end of file
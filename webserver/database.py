@@ -1,22 +1,153 @@
 from sqlalchemy.ext.declarative import declarative_base
+import asyncio
 import os
+import time
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError, OperationalError, InterfaceError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from circuit_breaker import CircuitBreaker, register_breaker
 
 
 
 ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')
 
+# Optional read replica for the uncached /accidents/stream route, the primary serves it when unset.
+# Every other route caches what it reads, and a lagging replica would cache stale rows.
+ASYNC_READ_DATABASE_URL = os.environ.get('ASYNC_READ_DATABASE_URL')
+
+# Pool settings, applied per engine in every worker process
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+# Prepared statements cached per asyncpg connection, 0 disables them (needed behind PgBouncer in transaction mode)
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 100))
+
+# Bounded waits on Postgres (seconds): establishing a connection, and any single statement
+DB_CONNECT_TIMEOUT = float(os.environ.get('DB_CONNECT_TIMEOUT', 3))
+DB_COMMAND_TIMEOUT = float(os.environ.get('DB_COMMAND_TIMEOUT', 15))
+
+# Statement logging is off by default, it is far too chatty for the hot path
+DB_ECHO = os.environ.get('DB_ECHO', 'false').lower() == 'true'
+
 Base = declarative_base()
 
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    # Queue pool recording how long checkouts wait for a free connection and how many time out.
+    # Only the wait on the pool's queue counts, not opening a new connection while the pool grows.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = {"checkouts": 0, "timeouts": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+        queue_get = self._pool.get
+
+        def timed_get(block=True, timeout=None):
+            started = time.perf_counter()
+            try:
+                return queue_get(block, timeout)
+            finally:
+                waited = time.perf_counter() - started
+                self.stats["wait_seconds_total"] += waited
+                self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+
+        self._pool.get = timed_get
+
+    def _do_get(self):
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        finally:
+            self.stats["checkouts"] += 1
+
+
+def create_engine_from_url(url):
+    options = {"echo": DB_ECHO}
+    database_url = make_url(url)
+    # SQLite (local runs, benchmarks) keeps SQLAlchemy's own pool choice
+    if database_url.get_backend_name() != "sqlite":
+        options.update(
+            poolclass=InstrumentedPool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    if database_url.get_driver_name() == "asyncpg":
+        # SQLAlchemy's adapter cache and asyncpg's own statement cache
+        options["connect_args"] = {
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "timeout": DB_CONNECT_TIMEOUT,
+            "command_timeout": DB_COMMAND_TIMEOUT,
+        }
+    return create_async_engine(url, **options)
+
+
+class DatabaseCircuitOpenError(Exception):
+    pass
+
+
+# Connection failures and timeouts open a breaker; query errors such as a missing table do not
+DATABASE_FAILURES = (OperationalError, InterfaceError, PoolTimeoutError, OSError, asyncio.TimeoutError)
+
+
+class GuardedSession(AsyncSession):
+    # Statements run through the circuit breaker of the session's engine, kept in session.info
+
+    async def execute(self, *args, **kwargs):
+        async with self.info["breaker"].guard():
+            return await super().execute(*args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        async with self.info["breaker"].guard():
+            return await super().scalar(*args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        async with self.info["breaker"].guard():
+            return await super().get(*args, **kwargs)
+
+    async def stream(self, *args, **kwargs):
+        async with self.info["breaker"].guard():
+            return await super().stream(*args, **kwargs)
+
+
 # Create an asynchronous engine instance
-engine = create_async_engine(ASYNC_DATABASE_URL, echo=True)
+engine = create_engine_from_url(ASYNC_DATABASE_URL)
+read_engine = create_engine_from_url(ASYNC_READ_DATABASE_URL) if ASYNC_READ_DATABASE_URL else engine
+
+database_breaker = register_breaker(CircuitBreaker("database", DATABASE_FAILURES, DatabaseCircuitOpenError))
+read_database_breaker = (
+    register_breaker(CircuitBreaker("read_database", DATABASE_FAILURES, DatabaseCircuitOpenError))
+    if read_engine is not engine else database_breaker
+)
 
 # Create a sessionmaker, binding the async engine
-# The class_ parameter is set to AsyncSession to enable async session operations
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+# The class_ parameter is set to GuardedSession, an AsyncSession behind the engine's circuit breaker
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=GuardedSession, info={"breaker": database_breaker})
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine, class_=GuardedSession, info={"breaker": read_database_breaker})
 
 # Example usage of the async session in FastAPI endpoint
 async def get_db():
     async with SessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+def pool_status(engine):
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, InstrumentedPool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            **pool.stats,
+        )
+    return status
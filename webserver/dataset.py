@@ -0,0 +1,143 @@
+from redis.exceptions import RedisError
+from sqlalchemy.future import select
+from cache import redis_client, redis_bytes_client, invalidation_listeners, local_cache, queue_unlink
+from models import Accident
+from metrics import db_rows_loaded
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Redis key holding the current dataset version, bumped whenever the cache is invalidated after an ELT run
+DATASET_VERSION_KEY = "dataset_version"
+
+# How often a worker re-reads the version from Redis (seconds)
+VERSION_CHECK_INTERVAL = float(os.environ.get('DATASET_VERSION_CHECK_INTERVAL', 30))
+
+_current_version = None
+_version_checked_at = 0.0
+
+
+def new_version_token():
+    # Nanosecond timestamps keep versions unique and ordered across restarts
+    return str(time.time_ns())
+
+
+async def get_dataset_version():
+    global _current_version, _version_checked_at
+
+    now = time.monotonic()
+    if _current_version is not None and now - _version_checked_at < VERSION_CHECK_INTERVAL:
+        return _current_version
+
+    try:
+        version = await redis_client.get(DATASET_VERSION_KEY)
+        if version is None:
+            # First reader after a flush seeds a version, NX so all workers agree on it
+            await redis_client.set(DATASET_VERSION_KEY, new_version_token(), nx=True)
+            version = await redis_client.get(DATASET_VERSION_KEY)
+        _current_version = version
+    except RedisError as e:
+        # Keep serving the last known version while Redis is unavailable
+        logger.warning(f"Could not read dataset version from Redis: {e}")
+        if _current_version is None:
+            _current_version = new_version_token()
+
+    _version_checked_at = now
+    return _current_version
+
+
+def expire_version_check(keys):
+    # Invalidation broadcast from another worker, re-read the version on next use
+    global _version_checked_at
+    _version_checked_at = 0.0
+
+
+invalidation_listeners.append(expire_version_check)
+
+
+def versioned_key(key, version):
+    # Keys scoped to a dataset version go stale the moment the version moves on, no delete needed
+    return f"{key}:{version}"
+
+
+async def switch_dataset_version(version, bodies=None, stale_keys=(), expiration=60*60, soft_ttl=None):
+    # Stores bodies already built for version, points DATASET_VERSION_KEY at it and unlinks
+    # stale_keys in one MULTI/EXEC, so readers see either the old version or the new one fully warmed.
+    # With soft_ttl the bodies are also marked fresh, as a load would, so the first read does not reload them.
+    global _current_version, _version_checked_at
+
+    async with redis_bytes_client.pipeline(transaction=True) as pipe:
+        for key, body in (bodies or {}).items():
+            pipe.setex(key, expiration, body)
+            if soft_ttl:
+                pipe.setex(f"{key}:fresh", int(soft_ttl), b"1")
+        pipe.set(DATASET_VERSION_KEY, version)
+        queue_unlink(pipe, stale_keys)
+        await pipe.execute()
+
+    for key, body in (bodies or {}).items():
+        local_cache.set(key, body, expiration)
+    _current_version = version
+    _version_checked_at = time.monotonic()
+    return version
+
+
+async def bump_dataset_version():
+    return await switch_dataset_version(new_version_token())
+
+
+async def load_accident_rows(db):
+    async with db as session:
+        result = await session.execute(select(Accident).order_by(Accident.id))
+        rows = [accident.to_dict() for accident in result.scalars().all()]
+    db_rows_loaded.inc(("index_rows",), len(rows))
+    return rows
+
+
+_rows_lock = asyncio.Lock()
+_rows_version = None
+_rows = None
+
+
+async def get_accident_rows(db, version):
+    # Shared by every VersionedIndex so a new version loads the table once per worker
+    global _rows_version, _rows
+
+    async with _rows_lock:
+        if _rows_version != version:
+            _rows = await load_accident_rows(db)
+            _rows_version = version
+    return _rows
+
+
+class VersionedIndex:
+    # In-process structure built from the accidents table, rebuilt once per dataset version
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.version = None
+        self.value = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, db):
+        version = await get_dataset_version()
+        if self.version == version:
+            return self.value
+
+        async with self._lock:
+            # Another task may have rebuilt it while this one waited on the lock
+            if self.version != version:
+                try:
+                    rows = await get_accident_rows(db, version)
+                except Exception as e:
+                    if self.value is None:
+                        raise
+                    # Database unreachable: keep answering from the last version built, retried on the next call
+                    logger.warning(f"Could not rebuild index for dataset version {version}, serving version {self.version}: {e}")
+                    return self.value
+                self.value = self.builder(rows)
+                self.version = version
+        return self.value
@@ -0,0 +1,100 @@
+from models import Accident
+from custom_exceptions import ValidationError, ExportFormatUnavailableError
+import asyncio
+import csv
+import io
+import os
+
+# pyarrow is optional, without it only CSV exports are available
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Columns of accidents_silver that can be exported, in table order
+EXPORT_COLUMNS = tuple(column.name for column in Accident.__table__.columns)
+
+# Format -> (media type, file extension, columnar); the columnar formats are written with pyarrow
+EXPORT_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet", True),
+    "arrow": ("application/vnd.apache.arrow.file", "arrow", True),
+    "csv": ("text/csv", "csv", False),
+}
+
+# Parquet and Arrow IPC compression codec, zstd trades a little CPU for much smaller files
+EXPORT_COMPRESSION = os.environ.get('EXPORT_COMPRESSION', 'zstd')
+
+# Bytes per chunk when streaming a cached export
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 256 * 1024))
+
+
+def parse_export_columns(columns):
+    # Comma separated column names, all columns when empty; table order regardless of the order given
+    if not columns:
+        return EXPORT_COLUMNS
+    requested = {name.strip() for name in columns.split(",") if name.strip()}
+    unknown = requested.difference(EXPORT_COLUMNS)
+    if unknown:
+        raise ValidationError(detail=f"Unknown export columns: {', '.join(sorted(unknown))}")
+    return tuple(name for name in EXPORT_COLUMNS if name in requested)
+
+
+def check_export_format(export_format):
+    if EXPORT_FORMATS[export_format][2] and pyarrow is None:
+        raise ExportFormatUnavailableError(detail=f"{export_format} export needs pyarrow on the server, use csv")
+
+
+def export_cache_key(export_format, columns, filters):
+    parts = [f"{name}={value}" for name, value in filters.items() if value is not None]
+    parts.append("columns=" + ",".join(columns))
+    return f"export:{export_format}:" + ":".join(parts)
+
+
+def arrow_type(column):
+    python_type = column.type.python_type
+    if python_type is int:
+        return pyarrow.int64()
+    if python_type is float:
+        return pyarrow.float64()
+    return pyarrow.string()
+
+
+def arrow_table(columns, rows):
+    # Column-wise arrays straight from the row tuples, with types from the model rather than inferred
+    table_columns = Accident.__table__.columns
+    schema = pyarrow.schema([(name, arrow_type(table_columns[name])) for name in columns])
+    if not rows:
+        return schema.empty_table()
+    arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+    return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+
+def encode_export(export_format, columns, rows):
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+        writer.writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+
+    table = arrow_table(columns, rows)
+    sink = pyarrow.BufferOutputStream()
+    if export_format == "parquet":
+        pyarrow.parquet.write_table(table, sink, compression=EXPORT_COMPRESSION)
+    else:
+        options = pyarrow.ipc.IpcWriteOptions(compression=EXPORT_COMPRESSION)
+        with pyarrow.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+async def encode_export_in_thread(export_format, columns, rows):
+    # A full-table export takes long enough to stall the event loop
+    return await asyncio.to_thread(encode_export, export_format, columns, rows)
+
+
+async def iterate_chunks(body):
+    for start in range(0, len(body), EXPORT_CHUNK_SIZE):
+        yield body[start:start + EXPORT_CHUNK_SIZE]
@@ -0,0 +1,154 @@
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi.responses import Response
+from cache import get_or_load_body, load_fresh_body, peek_body, refresh_in_background
+from utils import json_body_response
+import asyncio
+import gzip
+import os
+
+# Brotli is optional, without it clients asking for br get gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Compression effort, paid once per dataset version and cache key rather than per request
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 9))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 11))
+
+# Bodies smaller than this are sent as they are, compression would not pay for the CPU time
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+
+# Most preferred first
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress_body(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+async def compress_body_in_thread(body, encoding):
+    # Large bodies at high levels take long enough to stall the event loop
+    return await asyncio.to_thread(compress_body, body, encoding)
+
+
+def variant_key(key, encoding):
+    return f"{key}:{encoding}"
+
+
+def negotiate_encoding(request):
+    # First of ENCODINGS the client accepts with a non-zero q value, else identity
+    accepted = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+# Validators follow the dataset version, which only moves when an ELT run changes the data
+def version_etag(version):
+    return f'W/"{version}"'
+
+
+def version_last_modified(version):
+    try:
+        return formatdate(int(version) / 1e9, usegmt=True)
+    except (TypeError, ValueError):
+        return None
+
+
+def validator_headers(version):
+    headers = {"ETag": version_etag(version), "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    last_modified = version_last_modified(version)
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    return headers
+
+
+def etag_matches(if_none_match, etag):
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def is_not_modified(request, version):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, version_etag(version))
+
+    # Only consulted without If-None-Match; Last-Modified has whole-second precision
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        return int(int(version) / 1e9) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def not_modified_response(version):
+    return Response(status_code=304, headers=validator_headers(version))
+
+
+async def load_encoded_body(key, loader, encoding, expiration=60*60, soft_ttl=None):
+    # Returns (body, encoding). A compressed variant is stored next to the JSON body under
+    # key:encoding, so each body is compressed once per cache key rather than per request.
+    # Variants keep the same soft TTL as the body and are rebuilt from a fresh body only.
+    if encoding == "identity":
+        return await get_or_load_body(key, loader, expiration, soft_ttl), "identity"
+
+    encoded_key = variant_key(key, encoding)
+
+    async def load_variant():
+        body = await load_fresh_body(key, loader, expiration, soft_ttl)
+        return await compress_body_in_thread(body, encoding)
+
+    encoded, fresh = await peek_body(encoded_key, soft_ttl)
+    if encoded:
+        # A stale variant is still served while one task rebuilds it
+        if not fresh:
+            refresh_in_background(encoded_key, load_variant, expiration, soft_ttl)
+        return encoded, encoding
+
+    body = await get_or_load_body(key, loader, expiration, soft_ttl)
+    if len(body) < COMPRESS_MIN_SIZE:
+        return body, "identity"
+    return await get_or_load_body(encoded_key, load_variant, expiration, soft_ttl), encoding
+
+
+async def conditional_body_response(request, version, key, loader, expiration=60*60, soft_ttl=None):
+    # 304 when the client already has this dataset version, otherwise the cached body in its best encoding
+    if is_not_modified(request, version):
+        return not_modified_response(version)
+
+    body, encoding = await load_encoded_body(key, loader, negotiate_encoding(request), expiration, soft_ttl)
+    response = json_body_response(body, headers=validator_headers(version))
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+async def build_body_variants(key, body):
+    # Every compressed variant of a prewarmed body, so the first compressed request is warm too
+    if len(body) < COMPRESS_MIN_SIZE:
+        return {}
+    return {variant_key(key, encoding): await compress_body_in_thread(body, encoding) for encoding in ENCODINGS}
@@ -3,12 +3,17 @@ from routers import secure_router, public_router
 from utils import limiter 
 from slowapi.errors import RateLimitExceeded
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
 import uvicorn
 from logging_config import setup_logging
 from fastapi.responses import JSONResponse
-from custom_exceptions import DatabaseConnectionError, DataNotFoundError, ValidationError, AWSCredentialsError, InvalidAPIKeyError, CacheInvalidationError
+from custom_exceptions import DatabaseConnectionError, DataNotFoundError, ValidationError, AWSCredentialsError, InvalidAPIKeyError, CacheInvalidationError, ExportFormatUnavailableError
 from security import SecurityHeadersMiddleware, api_key_auth
+from cache import listen_for_invalidations
+from database import SessionLocal
+from snapshot import get_snapshot
+from metrics import MetricsMiddleware, rate_limit_rejections, route_label
 
 
 app = FastAPI()
@@ -24,6 +29,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend read the validators it sends back in conditional requests
+    expose_headers=["ETag", "Last-Modified"],
 )
 
 app.state.limiter = limiter
@@ -31,12 +38,30 @@ app.state.limiter = limiter
 # Security headers middleware setup
 app.add_middleware(SecurityHeadersMiddleware)
 
+# Outermost, so request latency covers every other middleware
+app.add_middleware(MetricsMiddleware)
+
 setup_logging()
 logging.info('Application started')
 
+# Subscribes this worker to cache invalidation broadcasts for its local cache tier
+@app.on_event("startup")
+async def start_invalidation_listener():
+    app.state.invalidation_listener = asyncio.create_task(listen_for_invalidations())
+
+# Maps (or builds) the columnar snapshot before the first request rather than during it
+@app.on_event("startup")
+async def load_accident_snapshot():
+    await get_snapshot(SessionLocal())
+
+@app.on_event("shutdown")
+async def stop_invalidation_listener():
+    app.state.invalidation_listener.cancel()
+
 # Exception Handlers
 @app.exception_handler(RateLimitExceeded)
 async def rate_limit_exceeded_handler(request, exc):
+    rate_limit_rejections.inc((route_label(request.scope),))
     logging.warning(f"Rate limit exceeded: {request.url} - {exc.detail}")
     return JSONResponse(
         status_code=429,
@@ -98,6 +123,14 @@ async def cache_invalidation_error_handler(request: Request, exc: CacheInvalidat
         content={"message": exc.detail},
     )
 
+@app.exception_handler(ExportFormatUnavailableError)
+async def export_format_unavailable_error_handler(request: Request, exc: ExportFormatUnavailableError):
+    logging.warning(f"Export format unavailable for request {request.url}: {exc.detail}")
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"message": exc.detail},
+    )
+
 app.include_router(secure_router, prefix='/api', tags=['secure endpoints'], dependencies=[Depends(api_key_auth)])
 app.include_router(public_router, prefix='/api', tags=['public endpoints'])
 
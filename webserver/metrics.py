@@ -0,0 +1,212 @@
+from bisect import bisect_left
+from sqlalchemy import event
+from cache import cache_stats, local_cache
+from database import engine, read_engine, pool_status
+from rate_limit import rate_limit_stats
+from circuit_breaker import breakers, CLOSED, HALF_OPEN, OPEN
+import time
+
+# Prometheus text exposition of in-process counters and histograms. Each worker reports its own
+# series; updates are plain list and dict operations with no locks, as everything runs on the event loop.
+
+# Latency buckets in seconds, from cache hits to slow full-table loads
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Starlette appends the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labelnames, labels, extra=""):
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+
+    def inc(self, labels=(), amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts with a final +Inf slot, sum]; cumulated only when rendered
+        self._series = {}
+
+    def observe(self, value, labels=()):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else format_value(float(bound))
+                bucket_labels = format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    # Read from existing state when scraped, so its source pays nothing per request
+
+    def __init__(self, name, metric_type, documentation, labelnames, callback):
+        self.name = name
+        self.metric_type = metric_type
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.callback = callback
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for labels, value in self.callback():
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}")
+        return lines
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency by route template and status.", ("method", "route", "status")
+)
+db_query_duration = Histogram("db_query_duration_seconds", "Database statement execution time.", ("database",))
+db_rows_loaded = Counter("db_rows_loaded_total", "Rows loaded from the database by the routers.", ("query",))
+rate_limit_rejections = Counter("rate_limit_rejections_total", "Requests rejected by the rate limiter.", ("route",))
+
+
+def cache_samples():
+    for tier, counters in cache_stats.items():
+        for outcome, value in counters.items():
+            yield (tier, outcome), value
+
+
+def pool_samples():
+    engines = {"primary": engine}
+    if read_engine is not engine:
+        engines["replica"] = read_engine
+    for name, pool_engine in engines.items():
+        for stat, value in pool_status(pool_engine).items():
+            if stat != "pool":
+                yield (name, stat), value
+
+
+BREAKER_STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def breaker_event_samples():
+    for breaker in breakers:
+        for name, value in breaker.stats.items():
+            yield (breaker.name, name), value
+
+
+registry = [
+    request_duration,
+    db_query_duration,
+    db_rows_loaded,
+    rate_limit_rejections,
+    CallbackMetric("cache_operations_total", "counter", "Cache hits, misses, errors and evictions per tier.", ("tier", "outcome"), cache_samples),
+    CallbackMetric("rate_limiter_checks_total", "counter", "Rate limiter outcomes, rejections split by the local bucket and Redis.", ("outcome",), lambda: [((outcome,), value) for outcome, value in rate_limit_stats.items()]),
+    CallbackMetric("local_cache_entries", "gauge", "Entries in this worker's local cache tier.", (), lambda: [((), len(local_cache))]),
+    CallbackMetric("db_pool", "gauge", "Connection pool state and checkout waits per engine.", ("database", "stat"), pool_samples),
+    CallbackMetric("circuit_breaker_state", "gauge", "Circuit breaker state per dependency: 0 closed, 1 half open, 2 open.", ("dependency",), lambda: [((breaker.name,), BREAKER_STATES[breaker.state]) for breaker in breakers]),
+    CallbackMetric("circuit_breaker_events_total", "counter", "Failures counted, calls rejected while open and times opened per dependency.", ("dependency", "event"), breaker_event_samples),
+]
+
+
+def render_metrics():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Route templates by endpoint, so /accidents/{accident_id} is one series rather than one per id
+_route_paths = {}
+
+
+def route_label(scope):
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    path = _route_paths.get(endpoint)
+    if path is None:
+        path = next((route.path for route in scope["app"].routes if getattr(route, "endpoint", None) is endpoint), "unmatched")
+        _route_paths[endpoint] = path
+    return path
+
+
+class MetricsMiddleware:
+    # Pure ASGI middleware timing each request from the first byte in to the last byte out
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_duration.observe(time.perf_counter() - started, (scope["method"], route_label(scope), status))
+
+
+def instrument_engine(async_engine, name):
+    # Statement timing from the sync engine's cursor events, one timestamp per connection
+    sync_engine = async_engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_query_timer(connection, cursor, statement, parameters, context, executemany):
+        connection.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def stop_query_timer(connection, cursor, statement, parameters, context, executemany):
+        started = connection.info.pop("query_started", None)
+        if started is not None:
+            db_query_duration.observe(time.perf_counter() - started, (name,))
+
+
+instrument_engine(engine, "primary")
+if read_engine is not engine:
+    instrument_engine(read_engine, "replica")
@@ -1,9 +1,18 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Integer, String, Float, Index
 from database import Base
 
 
 class Accident(Base):
     __tablename__ = "accidents_silver"
+    # Composite indexes backing the /api/accidents/ filters. An equality on the leading column leaves
+    # the rows in id order, so the keyset cursor (id > :cursor ORDER BY id) is read straight from the index.
+    # A date range only narrows the rows, which are then sorted. min_fatalities has no index: a range on
+    # a column with a handful of values matches most rows, and the primary key walk in id order is cheaper.
+    __table_args__ = (
+        Index("ix_accidents_silver_state_id", "state", "id"),
+        Index("ix_accidents_silver_season_id", "season", "id"),
+        Index("ix_accidents_silver_date_id", "date", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     season = Column(String(50))  
@@ -19,4 +28,28 @@ class Accident(Base):
     # Serialize the model instance to a dictionary
     	return {
         	column.name: getattr(self, column.name) for column in self.__table__.columns
-    }
\ No newline at end of file
+    }
+
+# Rollup tables maintained by the ELT job (see refresh_summary_tables in ELT/elt.py)
+class SeasonSummary(Base):
+    __tablename__ = "accidents_summary_season"
+
+    season = Column(String(50), primary_key=True)
+    accident_count = Column(Integer)
+    fatalities = Column(Integer)
+
+
+class StateSummary(Base):
+    __tablename__ = "accidents_summary_state"
+
+    state = Column(String(50), primary_key=True)
+    accident_count = Column(Integer)
+    fatalities = Column(Integer)
+
+
+class MonthSummary(Base):
+    __tablename__ = "accidents_summary_month"
+
+    month = Column(String(50), primary_key=True)
+    accident_count = Column(Integer)
+    fatalities = Column(Integer)
@@ -0,0 +1,115 @@
+from redis.exceptions import RedisError
+from limits import parse
+from cache import redis_client
+from custom_exceptions import RateLimitError
+from collections import OrderedDict
+import functools
+import inspect
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Per-worker token buckets kept for at most this many route/client pairs, least recently used dropped first
+RATE_LIMIT_LOCAL_MAX_KEYS = int(os.environ.get('RATE_LIMIT_LOCAL_MAX_KEYS', 10000))
+
+RATE_LIMIT_KEY_PREFIX = "ratelimit"
+
+# Switch for local runs and benchmarks, like slowapi's enabled flag
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+
+
+# Sliding window counter: the previous fixed window's count, weighted by how much of it still
+# overlaps the sliding window, plus the current window's count. Checked and incremented atomically.
+# KEYS[1] current window counter, KEYS[2] previous window counter
+# ARGV[1] limit, ARGV[2] window length (ms), ARGV[3] time elapsed in the current window (ms)
+SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('get', KEYS[1]) or '0')
+local previous = tonumber(redis.call('get', KEYS[2]) or '0')
+local window = tonumber(ARGV[2])
+if previous * (window - tonumber(ARGV[3])) / window + current >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('incr', KEYS[1])
+if current == 0 then
+    redis.call('pexpire', KEYS[1], window * 2)
+end
+return 1
+"""
+
+rate_limit_stats = {"allowed": 0, "local_rejections": 0, "redis_rejections": 0, "redis_errors": 0}
+
+
+class RedisRateLimiter:
+    # Drop-in for slowapi's Limiter.limit decorator, enforced across all workers through Redis.
+    # A per-worker token bucket of the same rate turns away floods before the Redis round trip;
+    # a single worker over the limit means the cluster is too.
+
+    def __init__(self, key_func, max_local_keys=RATE_LIMIT_LOCAL_MAX_KEYS, enabled=RATE_LIMIT_ENABLED):
+        self.key_func = key_func
+        self.enabled = enabled
+        self.max_local_keys = max_local_keys
+        self._buckets = OrderedDict()
+        self._sliding_window = redis_client.register_script(SLIDING_WINDOW_SCRIPT)
+
+    def limit(self, limit_value):
+        item = parse(limit_value)
+
+        def decorator(func):
+            if "request" not in inspect.signature(func).parameters:
+                raise ValueError(f"{func.__name__} needs a 'request: Request' parameter to be rate limited")
+            route = f"{func.__module__}.{func.__name__}"
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if self.enabled:
+                    await self.check(route, item, self.key_func(kwargs["request"]))
+                return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _take_local_token(self, key, item):
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(item.amount), now]
+            if len(self._buckets) > self.max_local_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+
+        tokens = min(float(item.amount), bucket[0] + (now - bucket[1]) * item.amount / item.get_expiry())
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    async def check(self, route, item, client):
+        key = f"{route}:{client}"
+        if not self._take_local_token(key, item):
+            rate_limit_stats["local_rejections"] += 1
+            raise RateLimitError(detail=str(item))
+
+        window_ms = item.get_expiry() * 1000
+        now_ms = int(time.time() * 1000)
+        window = now_ms // window_ms
+        try:
+            allowed = await self._sliding_window(
+                keys=[f"{RATE_LIMIT_KEY_PREFIX}:{key}:{window}", f"{RATE_LIMIT_KEY_PREFIX}:{key}:{window - 1}"],
+                args=[item.amount, window_ms, now_ms - window * window_ms],
+            )
+        except RedisError as e:
+            # Fail open to the per-worker bucket rather than rejecting everyone while Redis is down
+            rate_limit_stats["redis_errors"] += 1
+            logger.warning(f"Rate limit check in Redis failed, using the local limit only: {e}")
+            allowed = 1
+
+        if not allowed:
+            rate_limit_stats["redis_rejections"] += 1
+            raise RateLimitError(detail=str(item))
+        rate_limit_stats["allowed"] += 1
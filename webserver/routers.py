@@ -1,91 +1,456 @@
-from fastapi import APIRouter, Depends, Request
-from typing import List
-from schemas import AccidentSchema, InvalidateCacheRequest
-from models import Accident 
+from fastapi import APIRouter, Depends, Request, Query
+from typing import List, Optional, Union
+from datetime import date
+from schemas import AccidentSchema, AccidentPageSchema, AccidentDistanceSchema, AccidentClusterSchema, AccidentBatchRequest, AccidentBatchSchema, AccidentSearchSchema, SeasonStatsSchema, StateStatsSchema, MonthStatsSchema, InvalidateCacheRequest
+from models import Accident, SeasonSummary, StateSummary, MonthSummary
 from sqlalchemy.future import select
-from utils import limiter
-from database import get_db
+from utils import limiter, encode_json_body, json_body_response, encode_cursor, decode_cursor
+from database import get_db, SessionLocal, ReadSessionLocal, engine, read_engine, pool_status
 from sqlalchemy.ext.asyncio import AsyncSession
-from custom_exceptions import DataNotFoundError, DatabaseConnectionError,  RedisConnectionError, AWSCredentialsError, CacheInvalidationError
-from cache import get_cached_data, set_cache_data, redis_client
+from custom_exceptions import DataNotFoundError, DatabaseConnectionError,  RedisConnectionError, AWSCredentialsError, CacheInvalidationError, ValidationError
+from cache import get_cached_data, set_cache_data, get_cached_body, set_cached_body, get_or_load_body, get_cached_bodies, set_cached_bodies, publish_invalidation, cache_stats, local_cache, scan_keys, ACCIDENT_KEY_PATTERN
 from redis.exceptions import RedisError
+from dataset import get_dataset_version, new_version_token, switch_dataset_version, versioned_key
+from spatial import spatial_index, encode_accident_list, encode_distance_list
+from clustering import cluster_index, clusters_for_zoom
+from search import search_index, encode_search_page
 from security import api_key_auth
-from fastapi.responses import JSONResponse
+from metrics import db_rows_loaded, render_metrics, CONTENT_TYPE
+from http_cache import conditional_body_response, is_not_modified, not_modified_response, validator_headers, build_body_variants, load_encoded_body, negotiate_encoding
+from snapshot import get_snapshot, last_known_snapshot
+from export import EXPORT_FORMATS, parse_export_columns, check_export_format, export_cache_key, encode_export_in_thread, iterate_chunks
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 import logging
 import os
-import json
 
 secure_router = APIRouter()
 public_router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
-@public_router.get("/accidents/", response_model=List[AccidentSchema])
-@limiter.limit("10/minute")
-async def read_accidents(request: Request, db: AsyncSession = Depends(get_db)):
-    cache_key = "all_accidents"
-    try:
-        cached_accidents = await get_cached_data(cache_key)
-        if cached_accidents:
-            return json.loads(cached_accidents)
-    except RedisConnectionError as e:
-        # Log the Redis error or handle it as needed
-        logger.exception(f"Redis connection error: {e}")
+# Page sizes for filtered/paginated requests to /accidents/
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Optional stale-while-revalidate window for /accidents/ bodies (seconds), disabled when unset
+ACCIDENTS_SOFT_TTL = float(os.environ['ACCIDENTS_SOFT_TTL']) if os.environ.get('ACCIDENTS_SOFT_TTL') else None
+
+# Upper bounds for the spatial queries
+MAX_RADIUS_KM = 2000
+MAX_NEAREST = 100
 
+# Page size cap for full-text search
+MAX_SEARCH_RESULTS = 100
+
+
+# Each filter combination and page gets its own cache key
+def accidents_cache_key(filters, cursor_id, page_size):
+    parts = [f"{name}={value}" for name, value in filters.items() if value is not None]
+    parts.append(f"cursor={cursor_id or 0}")
+    parts.append(f"limit={page_size}")
+    return "accidents:" + ":".join(parts)
+
+
+async def load_all_accidents_body(db):
     try:
         async with db as session:
-            query = select(Accident)
-            result = await session.execute(query)
+            result = await session.execute(select(Accident))
             accidents = result.scalars().all()
-            
-            if not accidents:
-                raise DataNotFoundError(detail="Accidents not found")
-            
-            accidents_data = [accident.to_dict() for accident in accidents]
-            
-
-            # Serialize and cache the results before returning them
-            await set_cache_data(
-    cache_key,
-    json.dumps(accidents_data),  # Assuming `to_dict` is a method on the `Accident` model
-    expiration=60*60  # Cache for 1 hour
-)
-
-            return accidents_data
+            db_rows_loaded.inc(("all_accidents",), len(accidents))
 
     except Exception as e:
         # This catches SQLAlchemy errors or any other unforeseen errors.
         raise DatabaseConnectionError(detail=str(e))
 
+    if not accidents:
+        raise DataNotFoundError(detail="Accidents not found")
+    return encode_json_body([accident.to_dict() for accident in accidents])
+
+
+# Bodies built from the columnar snapshot, for its own dataset version
+def snapshot_list_body(snapshot):
+    if not len(snapshot):
+        raise DataNotFoundError(detail="Accidents not found")
+    return encode_json_body([snapshot.row(position) for position in range(len(snapshot))])
+
+
+def snapshot_page_body(snapshot, filters, cursor_id, page_size):
+    # Filtered with array masks over the shared snapshot, rows built only for the page
+    positions = snapshot.filter(filters)
+    if cursor_id is not None:
+        positions = positions[snapshot.ids[positions] > cursor_id]
+    page = positions[:page_size]
+    next_cursor = encode_cursor(int(snapshot.ids[page[-1]])) if len(positions) > page_size else None
+    return encode_json_body({
+        "items": [snapshot.row(position) for position in page],
+        "next_cursor": next_cursor,
+    })
+
+
+def snapshot_accident_body(snapshot, accident_id):
+    position = snapshot.position_of(accident_id)
+    if position is None:
+        raise DataNotFoundError(detail="Accident not found")
+    return encode_json_body(snapshot.row(position))
+
+
+async def outage_fallback(build_body):
+    # Postgres is unreachable and nothing is cached: answer from the last known-good snapshot, which may
+    # be an older dataset version. Labelled with that version's validators and never cached.
+    snapshot = await last_known_snapshot()
+    if snapshot is None:
+        return None
+    logger.warning(f"Serving from the accident snapshot of dataset version {snapshot.version}")
+    return json_body_response(build_body(snapshot), headers=validator_headers(snapshot.version))
+
+
+def apply_accident_filters(query, filters):
+    if filters["state"] is not None:
+        query = query.where(Accident.state == filters["state"])
+    if filters["season"] is not None:
+        query = query.where(Accident.season == filters["season"])
+    # Dates are stored as ISO strings so lexical comparison matches date order
+    if filters["date_from"] is not None:
+        query = query.where(Accident.date >= filters["date_from"])
+    if filters["date_to"] is not None:
+        query = query.where(Accident.date <= filters["date_to"])
+    if filters["min_fatalities"] is not None:
+        query = query.where(Accident.fatalities >= filters["min_fatalities"])
+    return query
+
+
+@public_router.get("/accidents/", response_model=Union[List[AccidentSchema], AccidentPageSchema])
+@limiter.limit("10/minute")
+async def read_accidents(
+    request: Request,
+    state: Optional[str] = None,
+    season: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_fatalities: Optional[int] = Query(None, ge=0),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+):
+    filters = {
+        "state": state,
+        "season": season,
+        "date_from": date_from.isoformat() if date_from else None,
+        "date_to": date_to.isoformat() if date_to else None,
+        "min_fatalities": min_fatalities,
+    }
+    # Without any parameters the full dataset is returned as a plain list, otherwise a page
+    paginated = cursor is not None or limit is not None or any(value is not None for value in filters.values())
+    # Keys are scoped to the dataset version, an ELT run moves every reader to freshly built bodies.
+    # Bodies are read from the primary: a lagging replica would store old rows under the new version.
+    version = await get_dataset_version()
+    if paginated:
+        cursor_id = decode_cursor(cursor) if cursor else None
+        page_size = limit or DEFAULT_PAGE_SIZE
+        cache_key = versioned_key(accidents_cache_key(filters, cursor_id, page_size), version)
+    else:
+        cursor_id = page_size = None
+        cache_key = versioned_key("all_accidents", version)
+
+    # Loads can outlive this request (shared by concurrent misses, or a stale-while-revalidate
+    # refresh), so they open their own sessions rather than using a request-scoped one
+    async def load_accidents_body():
+        if not paginated:
+            return await load_all_accidents_body(SessionLocal())
+
+        snapshot = await get_snapshot(SessionLocal())
+        if snapshot is not None:
+            return snapshot_page_body(snapshot, filters, cursor_id, page_size)
+
+        try:
+            async with SessionLocal() as session:
+                # Keyset pagination on id, fetching one extra row to detect a next page
+                query = apply_accident_filters(select(Accident), filters)
+                if cursor_id is not None:
+                    query = query.where(Accident.id > cursor_id)
+                query = query.order_by(Accident.id).limit(page_size + 1)
+                result = await session.execute(query)
+                accidents = result.scalars().all()
+                db_rows_loaded.inc(("accidents_page",), len(accidents))
+
+                page = accidents[:page_size]
+                next_cursor = encode_cursor(page[-1].id) if len(accidents) > page_size else None
+                return encode_json_body({
+                    "items": [accident.to_dict() for accident in page],
+                    "next_cursor": next_cursor,
+                })
+
+        except Exception as e:
+            # This catches SQLAlchemy errors or any other unforeseen errors.
+            raise DatabaseConnectionError(detail=str(e))
+
+    # The cached value is the final response body (or its compressed variant), returned without decoding
+    # or validation. Concurrent misses for the same key share a single load, even across workers.
+    # Clients holding this dataset version's ETag get a 304 before any cache lookup.
+    try:
+        return await conditional_body_response(request, version, cache_key, load_accidents_body, expiration=60*60, soft_ttl=ACCIDENTS_SOFT_TTL)
+    except DatabaseConnectionError:
+        response = await outage_fallback(
+            lambda snapshot: snapshot_page_body(snapshot, filters, cursor_id, page_size) if paginated else snapshot_list_body(snapshot)
+        )
+        if response is None:
+            raise
+        return response
+
+# Rows fetched per server-side cursor round trip when streaming the full dataset
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 500))
+
+
+async def stream_accident_chunks(ndjson):
+    # Own session rather than the request's, it has to outlive the endpoint call while the body streams
+    async with ReadSessionLocal() as session:
+        query = select(Accident).order_by(Accident.id).execution_options(yield_per=STREAM_CHUNK_SIZE)
+        result = await session.stream_scalars(query)
+        first = True
+        if not ndjson:
+            yield b"["
+        async for partition in result.partitions():
+            rows = [encode_json_body(accident.to_dict()) for accident in partition]
+            db_rows_loaded.inc(("accidents_stream",), len(rows))
+            if ndjson:
+                yield b"\n".join(rows) + b"\n"
+            else:
+                yield (b"" if first else b",") + b",".join(rows)
+            first = False
+        if not ndjson:
+            yield b"]"
+
+
+@public_router.get("/accidents/stream", response_model=List[AccidentSchema])
+@limiter.limit("5/minute")
+async def stream_accidents(request: Request, format: str = Query("json", regex="^(json|ndjson)$")):
+    # Memory per request is bounded by STREAM_CHUNK_SIZE rows and the first bytes go out before the scan ends
+    ndjson = format == "ndjson"
+    media_type = "application/x-ndjson" if ndjson else "application/json"
+    return StreamingResponse(stream_accident_chunks(ndjson), media_type=media_type)
+
+async def get_spatial_index(db):
+    try:
+        return await spatial_index.get(db)
+    except Exception as e:
+        raise DatabaseConnectionError(detail=str(e))
+
+
+# Spatial routes are answered from the in-process grid index, no database round trip once built
+@public_router.get("/accidents/within-bbox", response_model=List[AccidentSchema])
+@limiter.limit("60/minute")
+async def read_accidents_within_bbox(
+    request: Request,
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    db: AsyncSession = Depends(get_db),
+):
+    if min_lat > max_lat:
+        raise ValidationError(detail="min_lat must not be greater than max_lat")
+    index = await get_spatial_index(db)
+    return json_body_response(encode_accident_list(index, index.within_bbox(min_lat, min_lon, max_lat, max_lon)))
+
+@public_router.get("/accidents/within-radius", response_model=List[AccidentDistanceSchema])
+@limiter.limit("60/minute")
+async def read_accidents_within_radius(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(..., gt=0, le=MAX_RADIUS_KM),
+    db: AsyncSession = Depends(get_db),
+):
+    index = await get_spatial_index(db)
+    return json_body_response(encode_distance_list(index, index.within_radius(lat, lon, radius_km)))
+
+@public_router.get("/accidents/nearest", response_model=List[AccidentDistanceSchema])
+@limiter.limit("60/minute")
+async def read_nearest_accidents(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=MAX_NEAREST),
+    db: AsyncSession = Depends(get_db),
+):
+    index = await get_spatial_index(db)
+    return json_body_response(encode_distance_list(index, index.nearest(lat, lon, k)))
+
+@public_router.get("/accidents/clusters", response_model=List[AccidentClusterSchema])
+@limiter.limit("60/minute")
+async def read_accident_clusters(
+    request: Request,
+    zoom: int = Query(..., ge=0, le=24),
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    db: AsyncSession = Depends(get_db),
+):
+    if min_lat > max_lat:
+        raise ValidationError(detail="min_lat must not be greater than max_lat")
+    try:
+        zoom_indexes = await cluster_index.get(db)
+    except Exception as e:
+        raise DatabaseConnectionError(detail=str(e))
+    index = clusters_for_zoom(zoom_indexes, zoom)
+    return json_body_response(encode_accident_list(index, index.within_bbox(min_lat, min_lon, max_lat, max_lon)))
+
+@public_router.post("/accidents/batch", response_model=AccidentBatchSchema)
+@limiter.limit("20/minute")
+async def read_accidents_batch(request: Request, batch: AccidentBatchRequest, db: AsyncSession = Depends(get_db)):
+    # Per-id cache keys are shared with /accidents/{accident_id}
+    accident_ids = list(dict.fromkeys(batch.ids))
+    cache_keys = {accident_id: f"accident_{accident_id}" for accident_id in accident_ids}
+
+    try:
+        cached = await get_cached_bodies(list(cache_keys.values()))
+    except RedisConnectionError as e:
+        logger.exception(f"Redis connection error: {e}")
+        cached = {}
+
+    bodies = {accident_id: cached[key] for accident_id, key in cache_keys.items() if key in cached}
+    missed_ids = [accident_id for accident_id in accident_ids if accident_id not in bodies]
+
+    if missed_ids:
+        try:
+            async with db as session:
+                # All misses are filled with a single IN query
+                result = await session.execute(select(Accident).where(Accident.id.in_(missed_ids)))
+                loaded = {accident.id: encode_json_body(accident.to_dict()) for accident in result.scalars().all()}
+                db_rows_loaded.inc(("accidents_batch",), len(loaded))
+        except Exception as e:
+            raise DatabaseConnectionError(detail=str(e))
+
+        if loaded:
+            try:
+                await set_cached_bodies({cache_keys[accident_id]: body for accident_id, body in loaded.items()}, expiration=60*60)
+            except RedisConnectionError as e:
+                logger.exception(f"Redis connection error: {e}")
+        bodies.update(loaded)
+
+    missing = [accident_id for accident_id in accident_ids if accident_id not in bodies]
+    items = b",".join(bodies[accident_id] for accident_id in accident_ids if accident_id in bodies)
+    return json_body_response(b'{"items":[' + items + b'],"missing":' + encode_json_body(missing) + b"}")
+
+@public_router.get("/accidents/search", response_model=AccidentSearchSchema)
+@limiter.limit("30/minute")
+async def search_accidents(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    offset: int = Query(0, ge=0, le=10000),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+    db: AsyncSession = Depends(get_db),
+):
+    # Ranked from the in-process inverted index over descriptions and locations
+    try:
+        index = await search_index.get(db)
+    except Exception as e:
+        raise DatabaseConnectionError(detail=str(e))
+    total, matches = index.search(q, limit, offset)
+    next_offset = offset + limit if offset + limit < total else None
+    return json_body_response(encode_search_page(index, total, matches, next_offset))
+
 @public_router.get("/accidents/{accident_id}", response_model=AccidentSchema)
 @limiter.limit("20/minute")
 async def read_accident(request: Request, accident_id: int, db: AsyncSession = Depends(get_db)):
+    # Single accidents are too small to be worth compressing, only the validators apply
+    version = await get_dataset_version()
+    if is_not_modified(request, version):
+        return not_modified_response(version)
+
     cache_key = f"accident_{accident_id}"
     try:
-        cached_accident = await get_cached_data(cache_key)
-        if cached_accident:
-            return json.loads(cached_accident)
+        cached_body = await get_cached_body(cache_key)
+        if cached_body:
+            return json_body_response(cached_body, headers=validator_headers(version))
     except RedisConnectionError as e:
         # Log the Redis error or handle it as needed
         logger.exception(f"Redis connection error: {e}")
 
+    snapshot = await get_snapshot(db)
+    if snapshot is not None:
+        # Not written to the shared per-id key: the snapshot is the version this worker last saw, and
+        # a worker still behind a switch would re-cache a row the ELT has just invalidated
+        return json_body_response(snapshot_accident_body(snapshot, accident_id), headers=validator_headers(snapshot.version))
+
     try:
         async with db as session:
             stmt = select(Accident).where(Accident.id == accident_id)
             result = await session.execute(stmt)
             accident = result.scalars().first()
-            if not accident:
-                raise DataNotFoundError(detail="Accident not found")
-
-            # Serialize and cache the result before returning it
-            await set_cache_data(cache_key, json.dumps(dict(accident)), expiration=60*60)  # Cache for 1 hour
-            return accident
 
     except Exception as e:
         # This catches SQLAlchemy errors or any other unforeseen errors.
-        raise DatabaseConnectionError(detail=str(e))
+        response = await outage_fallback(lambda snapshot: snapshot_accident_body(snapshot, accident_id))
+        if response is None:
+            raise DatabaseConnectionError(detail=str(e))
+        return response
+
+    if not accident:
+        raise DataNotFoundError(detail="Accident not found")
+    db_rows_loaded.inc(("accident",))
+    return await cache_accident_body(cache_key, encode_json_body(accident.to_dict()), version)
+
+
+async def cache_accident_body(cache_key, body, version):
+    try:
+        await set_cached_body(cache_key, body, expiration=60*60)  # Cache for 1 hour
+    except RedisConnectionError as e:
+        logger.exception(f"Redis connection error: {e}")
+
+    return json_body_response(body, headers=validator_headers(version))
     
     
+# Rollups are read from the ELT-maintained summary tables and cached as small, final bodies
+SUMMARY_VIEWS = {
+    "stats_seasons": (SeasonSummary, SeasonSummary.season),
+    "stats_states": (StateSummary, StateSummary.state),
+    "stats_months": (MonthSummary, MonthSummary.month),
+}
+
+
+async def load_summary_body(db, model, key_column):
+    try:
+        async with db as session:
+            result = await session.execute(select(model).order_by(key_column))
+            summaries = result.scalars().all()
+            db_rows_loaded.inc((model.__tablename__,), len(summaries))
+            return encode_json_body([
+                {
+                    key_column.key: getattr(summary, key_column.key),
+                    "accident_count": summary.accident_count,
+                    "fatalities": summary.fatalities,
+                }
+                for summary in summaries
+            ])
+    except Exception as e:
+        raise DatabaseConnectionError(detail=str(e))
+
+
+async def read_summary(cache_key):
+    model, key_column = SUMMARY_VIEWS[cache_key]
+    version = await get_dataset_version()
+    # Own session, the shared load may outlive the request that started it
+    body = await get_or_load_body(versioned_key(cache_key, version), lambda: load_summary_body(SessionLocal(), model, key_column), expiration=60*60)
+    return json_body_response(body)
+
+
+@public_router.get("/stats/seasons", response_model=List[SeasonStatsSchema])
+@limiter.limit("30/minute")
+async def read_season_stats(request: Request):
+    return await read_summary("stats_seasons")
+
+@public_router.get("/stats/states", response_model=List[StateStatsSchema])
+@limiter.limit("30/minute")
+async def read_state_stats(request: Request):
+    return await read_summary("stats_states")
+
+@public_router.get("/stats/months", response_model=List[MonthStatsSchema])
+@limiter.limit("30/minute")
+async def read_month_stats(request: Request):
+    return await read_summary("stats_months")
+
+
 @public_router.get("/aws-credentials/")
 @limiter.limit("10/minute")
 async def get_aws_credentials(request: Request):
@@ -123,17 +488,116 @@ async def get_aws_credentials(request: Request):
     return JSONResponse(content=aws_credentials)
 
 
+# Version-scoped bodies built ahead of the version switch, so the first readers after an ELT run hit a warm cache
+async def build_prewarm_bodies(db, version):
+    loaders = {versioned_key("all_accidents", version): lambda: load_all_accidents_body(db)}
+    for cache_key, (model, key_column) in SUMMARY_VIEWS.items():
+        loaders[versioned_key(cache_key, version)] = lambda model=model, key_column=key_column: load_summary_body(db, model, key_column)
+
+    bodies = {}
+    for cache_key, loader in loaders.items():
+        try:
+            body = await loader()
+        except (DatabaseConnectionError, DataNotFoundError) as e:
+            # Left cold and loaded on first use; the switch still goes ahead, cold beats stale
+            logger.warning(f"Could not prewarm {cache_key}: {e.detail}")
+            continue
+        bodies[cache_key] = body
+        bodies.update(await build_body_variants(cache_key, body))
+    return bodies
+
+
 @secure_router.post("/invalidate-cache/")
-async def invalidate_cache(request: InvalidateCacheRequest, api_key: str = Depends(api_key_auth)):
+async def invalidate_cache(request: InvalidateCacheRequest, api_key: str = Depends(api_key_auth), db: AsyncSession = Depends(get_db)):
+    version = new_version_token()
+    bodies = await build_prewarm_bodies(db, version) if request.prewarm else {}
+
     try:
-        if request.keys:
-            # Invalidate specific cache keys
-            for key in request.keys:
-                await redis_client.delete(key)
-        else:
-            # Clear the entire cache (use with caution)
-            await redis_client.flushdb()
+        # No keys means a full reload that replaced every id. Version-scoped bodies follow the switch,
+        # so only the per-accident keys are unlinked; rate-limit windows and loader locks are kept.
+        stale_keys = request.keys or await scan_keys(ACCIDENT_KEY_PATTERN)
+        # One transaction stores the prewarmed bodies, moves the dataset version (so version-scoped
+        # keys and in-process indexes follow) and unlinks the specific keys that changed
+        await switch_dataset_version(version, bodies, stale_keys=stale_keys, soft_ttl=ACCIDENTS_SOFT_TTL)
+        # Every worker drops the same entries from its local tier
+        await publish_invalidation(request.keys)
         return {"message": "Cache invalidated successfully."}
     except RedisError as e:
         logger.exception(f"Redis error during cache invalidation: {e}")
-        raise CacheInvalidationError()
\ No newline at end of file
+        raise CacheInvalidationError()
+
+
+@secure_router.get("/cache-stats/")
+async def read_cache_stats(api_key: str = Depends(api_key_auth)):
+    return {
+        "local": {**cache_stats["local"], "entries": len(local_cache)},
+        "redis": cache_stats["redis"],
+    }
+
+
+# Prometheus scrape target for this worker's request latency, cache, database and rate limit series
+@secure_router.get("/metrics")
+async def read_metrics(api_key: str = Depends(api_key_auth)):
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+
+# Connections in use and checkout waits per engine, the first sign of pool exhaustion under bursts
+@secure_router.get("/db-stats/")
+async def read_db_stats(api_key: str = Depends(api_key_auth)):
+    stats = {"primary": pool_status(engine)}
+    if read_engine is not engine:
+        stats["replica"] = pool_status(read_engine)
+    return stats
+
+
+# Bulk export for analysts, built once per dataset version, format, column set and filters
+@secure_router.get("/export/accidents")
+async def export_accidents(
+    request: Request,
+    format: str = Query("parquet", regex="^(parquet|arrow|csv)$"),
+    columns: Optional[str] = None,
+    state: Optional[str] = None,
+    season: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_fatalities: Optional[int] = Query(None, ge=0),
+    api_key: str = Depends(api_key_auth),
+):
+    check_export_format(format)
+    export_columns = parse_export_columns(columns)
+    filters = {
+        "state": state,
+        "season": season,
+        "date_from": date_from.isoformat() if date_from else None,
+        "date_to": date_to.isoformat() if date_to else None,
+        "min_fatalities": min_fatalities,
+    }
+    version = await get_dataset_version()
+    if is_not_modified(request, version):
+        return not_modified_response(version)
+
+    async def load_export_body():
+        try:
+            # Own session, the shared load may outlive the request that started it
+            async with SessionLocal() as session:
+                # Only the requested columns are read, as plain tuples rather than Accident instances
+                query = select(*(Accident.__table__.c[name] for name in export_columns))
+                result = await session.execute(apply_accident_filters(query, filters).order_by(Accident.id))
+                rows = result.all()
+                db_rows_loaded.inc(("accidents_export",), len(rows))
+        except Exception as e:
+            raise DatabaseConnectionError(detail=str(e))
+        return await encode_export_in_thread(format, export_columns, rows)
+
+    media_type, extension, columnar = EXPORT_FORMATS[format]
+    cache_key = versioned_key(export_cache_key(format, export_columns, filters), version)
+    # Parquet and Arrow are compressed internally, only CSV is worth a gzip or brotli copy
+    encoding = "identity" if columnar else negotiate_encoding(request)
+    body, encoding = await load_encoded_body(cache_key, load_export_body, encoding, expiration=60*60)
+
+    headers = validator_headers(version)
+    headers["Content-Length"] = str(len(body))
+    headers["Content-Disposition"] = f'attachment; filename="accidents-{version}.{extension}"'
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(iterate_chunks(body), media_type=media_type, headers=headers)
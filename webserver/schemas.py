@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist
 from typing import List, Optional
 
 class AccidentSchema(BaseModel):
@@ -15,5 +15,56 @@ class AccidentSchema(BaseModel):
     class Config:
         from_attributes = True
         
+class AccidentPageSchema(BaseModel):
+    items: List[AccidentSchema]
+    next_cursor: Optional[str] = None
+
+class AccidentDistanceSchema(BaseModel):
+    distance_km: float
+    accident: AccidentSchema
+
+class AccidentClusterSchema(BaseModel):
+    latitude: float
+    longitude: float
+    count: int
+    fatalities: int
+    accident_id: Optional[int] = None
+
+# Upper bound on ids per /accidents/batch request
+MAX_BATCH_IDS = 500
+
+class AccidentBatchRequest(BaseModel):
+    ids: conlist(int, min_items=1, max_items=MAX_BATCH_IDS)
+
+class AccidentBatchSchema(BaseModel):
+    items: List[AccidentSchema]
+    missing: List[int]
+
+class SeasonStatsSchema(BaseModel):
+    season: str
+    accident_count: int
+    fatalities: int
+
+class StateStatsSchema(BaseModel):
+    state: str
+    accident_count: int
+    fatalities: int
+
+class MonthStatsSchema(BaseModel):
+    month: str
+    accident_count: int
+    fatalities: int
+
+class AccidentSearchHitSchema(BaseModel):
+    score: float
+    accident: AccidentSchema
+
+class AccidentSearchSchema(BaseModel):
+    items: List[AccidentSearchHitSchema]
+    total: int
+    next_offset: Optional[int] = None
+
 class InvalidateCacheRequest(BaseModel):
-    keys: Optional[List[str]] = None
\ No newline at end of file
+    keys: Optional[List[str]] = None
+    # Build all_accidents and the stats bodies for the new dataset version before switching to it
+    prewarm: bool = False
\ No newline at end of file
@@ -0,0 +1,96 @@
+from collections import defaultdict
+from dataset import VersionedIndex
+from utils import encode_json_body
+import heapq
+import math
+import re
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Location terms count double, a match on the place name outranks one in the narrative
+LOCATION_WEIGHT = 2
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "the", "to", "was", "were", "with",
+})
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class InvertedIndex:
+    # Term -> postings over accident descriptions and locations, ranked with BM25
+
+    def __init__(self, documents):
+        self.payloads = []
+        doc_lengths = []
+        postings = defaultdict(list)
+
+        for text_fields, payload in documents:
+            doc_index = len(self.payloads)
+            self.payloads.append(payload)
+            term_counts = defaultdict(int)
+            length = 0
+            for text, weight in text_fields:
+                for token in tokenize(text):
+                    term_counts[token] += weight
+                    length += weight
+            doc_lengths.append(length)
+            for term, count in term_counts.items():
+                postings[term].append((doc_index, count))
+
+        document_count = len(self.payloads)
+        average_length = (sum(doc_lengths) / document_count) if document_count else 0.0
+
+        # Length normalisation and idf are fixed per version, so fold them in at build time
+        self.length_norms = [
+            BM25_K1 * (1 - BM25_B + BM25_B * length / average_length) if average_length else BM25_K1
+            for length in doc_lengths
+        ]
+        self.postings = dict(postings)
+        self.idf = {
+            term: math.log(1 + (document_count - len(entries) + 0.5) / (len(entries) + 0.5))
+            for term, entries in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def search(self, query, limit, offset=0):
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            entries = self.postings.get(term)
+            if not entries:
+                continue
+            idf = self.idf[term]
+            for doc_index, count in entries:
+                scores[doc_index] += idf * count * (BM25_K1 + 1) / (count + self.length_norms[doc_index])
+
+        ranked = heapq.nlargest(offset + limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return len(scores), [(score, doc_index) for doc_index, score in ranked[offset:]]
+
+
+def build_search_index(rows):
+    return InvertedIndex(
+        (((row["description"], 1), (row["location"], LOCATION_WEIGHT)), encode_json_body(row))
+        for row in rows
+    )
+
+
+search_index = VersionedIndex(build_search_index)
+
+
+def encode_search_page(index, total, matches, next_offset):
+    items = b",".join(
+        b'{"score":%.4f,"accident":%s}' % (score, index.payloads[doc_index])
+        for score, doc_index in matches
+    )
+    return b'{"items":[' + items + b'],"total":' + encode_json_body(total) + b',"next_offset":' + encode_json_body(next_offset) + b"}"
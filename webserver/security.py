@@ -1,17 +1,34 @@
-from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi import Security
 from custom_exceptions import InvalidAPIKeyError
 from fastapi.security.api_key import APIKeyHeader
 import os
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'DENY'
-        response.headers['Content-Security-Policy'] = "default-src 'self'"
-        response.headers['X-XSS-Protection'] = '1; mode=block'
-        return response
+SECURITY_HEADERS = {
+    'X-Content-Type-Options': 'nosniff',
+    'X-Frame-Options': 'DENY',
+    'Content-Security-Policy': "default-src 'self'",
+    'X-XSS-Protection': '1; mode=block',
+}
+
+# Encoded once, appended to each response as raw ASGI header pairs
+RAW_SECURITY_HEADERS = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in SECURITY_HEADERS.items()]
+
+class SecurityHeadersMiddleware:
+    # Pure ASGI: headers are set on the response start message, the body passes through untouched
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *RAW_SECURITY_HEADERS]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
 
 
 FAST_API_KEY = os.environ.get('PROD_FAST_API_KEY') 
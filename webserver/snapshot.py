@@ -0,0 +1,269 @@
+from sqlalchemy.future import select
+from dataset import get_dataset_version
+from models import Accident
+from metrics import db_rows_loaded
+import numpy as np
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Read-only columnar copy of accidents_silver, one directory of .npy files per dataset version.
+# Workers memory-map the files, so every process on the host shares the same page cache copy.
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', os.path.join(tempfile.gettempdir(), 'avalanche_snapshot'))
+SNAPSHOT_ENABLED = os.environ.get('SNAPSHOT_ENABLED', 'true').lower() == 'true'
+
+# Versions kept on disk, the previous one stays for workers that have not moved on yet
+SNAPSHOT_KEEP_VERSIONS = 2
+
+# Stands in for NULL in the integer columns and the string codes; ids and counts are never negative
+MISSING = -1
+
+COLUMNS = tuple(Accident.__table__.columns)
+
+
+def column_kind(column):
+    python_type = column.type.python_type
+    if python_type is int:
+        return "int"
+    if python_type is float:
+        return "float"
+    return "string"
+
+
+class StringColumn:
+    # Interned strings: one int32 code per row into a table of distinct values,
+    # stored as UTF-8 bytes back to back with their start offsets
+
+    def __init__(self, codes, offsets, data):
+        self.codes = codes
+        self.offsets = offsets
+        self.data = data
+        self._values = None
+        self._codes_by_value = None
+
+    def value(self, code):
+        if code == MISSING:
+            return None
+        return self.data[self.offsets[code]:self.offsets[code + 1]].tobytes().decode("utf-8")
+
+    def values(self):
+        # Distinct values decoded once per process, small next to the rows
+        if self._values is None:
+            self._values = [self.value(code) for code in range(len(self.offsets) - 1)]
+        return self._values
+
+    def code_of(self, value):
+        # None for a value no row has, distinct from the MISSING code of NULL rows
+        if self._codes_by_value is None:
+            self._codes_by_value = {value: code for code, value in enumerate(self.values())}
+        return self._codes_by_value.get(value)
+
+    def mask_equal(self, value):
+        # Rows equal to value; like SQL =, NULL rows never match
+        code = self.code_of(value)
+        if code is None:
+            return np.zeros(len(self.codes), dtype=bool)
+        return self.codes == code
+
+    def mask_where(self, predicate):
+        # Row mask from a predicate evaluated once per distinct value rather than per row
+        allowed = np.fromiter((predicate(value) for value in self.values()), dtype=bool, count=len(self.offsets) - 1)
+        # MISSING (-1) lands on the appended False
+        return np.append(allowed, False)[self.codes]
+
+
+class Snapshot:
+
+    def __init__(self, version, arrays, strings):
+        self.version = version
+        self.arrays = arrays
+        self.strings = strings
+        self.ids = arrays["id"]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def position_of(self, accident_id):
+        # Rows are stored in id order
+        position = int(np.searchsorted(self.ids, accident_id))
+        if position < len(self.ids) and self.ids[position] == accident_id:
+            return position
+        return None
+
+    def row(self, position):
+        row = {}
+        for column in COLUMNS:
+            if column.name in self.strings:
+                strings = self.strings[column.name]
+                row[column.name] = strings.value(int(strings.codes[position]))
+                continue
+            value = self.arrays[column.name][position].item()
+            if column_kind(column) == "int":
+                row[column.name] = None if value == MISSING else value
+            else:
+                row[column.name] = None if value != value else value
+        return row
+
+    def filter(self, filters):
+        # Positions of the rows matching the /accidents/ filters, in id order, from vectorized masks
+        mask = np.ones(len(self), dtype=bool)
+        if filters.get("state") is not None:
+            mask &= self.strings["state"].mask_equal(filters["state"])
+        if filters.get("season") is not None:
+            mask &= self.strings["season"].mask_equal(filters["season"])
+        # Dates are ISO strings, compared lexically like the SQL filters
+        date_from, date_to = filters.get("date_from"), filters.get("date_to")
+        if date_from is not None or date_to is not None:
+            mask &= self.strings["date"].mask_where(
+                lambda value: value is not None
+                and (date_from is None or value >= date_from)
+                and (date_to is None or value <= date_to)
+            )
+        if filters.get("min_fatalities") is not None:
+            fatalities = self.arrays["fatalities"]
+            mask &= (fatalities != MISSING) & (fatalities >= filters["min_fatalities"])
+        return np.flatnonzero(mask)
+
+
+def write_snapshot(path, rows):
+    # Written to a private directory and renamed into place, so readers never see a partial snapshot
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    staging = os.path.join(parent, f".{os.path.basename(path)}.{uuid.uuid4().hex}")
+    os.makedirs(staging)
+    try:
+        for index, column in enumerate(COLUMNS):
+            values = [row[index] for row in rows]
+            kind = column_kind(column)
+            if kind == "int":
+                array = np.array([MISSING if value is None else value for value in values], dtype=np.int64)
+                np.save(os.path.join(staging, f"{column.name}.npy"), array)
+            elif kind == "float":
+                array = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+                np.save(os.path.join(staging, f"{column.name}.npy"), array)
+            else:
+                save_string_column(staging, column.name, values)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    try:
+        os.rename(staging, path)
+    except OSError:
+        # Another worker renamed its copy of the same version into place first
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+
+
+def save_string_column(directory, name, values):
+    interned = {}
+    codes = np.array(
+        [MISSING if value is None else interned.setdefault(value, len(interned)) for value in values],
+        dtype=np.int32,
+    )
+    encoded = [value.encode("utf-8") for value in interned]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(os.path.join(directory, f"{name}_codes.npy"), codes)
+    np.save(os.path.join(directory, f"{name}_offsets.npy"), offsets)
+    np.save(os.path.join(directory, f"{name}_data.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+
+def open_snapshot(path, version):
+    def load(name):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+    arrays, strings = {}, {}
+    for column in COLUMNS:
+        if column_kind(column) == "string":
+            strings[column.name] = StringColumn(
+                load(f"{column.name}_codes"), load(f"{column.name}_offsets"), load(f"{column.name}_data")
+            )
+        else:
+            arrays[column.name] = load(column.name)
+    return Snapshot(version, arrays, strings)
+
+
+def prune_snapshots(directory, keep=SNAPSHOT_KEEP_VERSIONS):
+    # Deleting files another worker still maps is safe, the mapping holds on to them
+    versions = sorted((name for name in os.listdir(directory) if name.isdigit()), key=int)
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+async def load_snapshot_rows(db):
+    # Plain column tuples in id order, no Accident instances
+    async with db as session:
+        result = await session.execute(select(*COLUMNS).order_by(Accident.id))
+        rows = result.all()
+    db_rows_loaded.inc(("snapshot_rows",), len(rows))
+    return rows
+
+
+class SnapshotStore:
+    # Opens the snapshot for the current dataset version, building it first if no worker has yet
+
+    def __init__(self, directory=SNAPSHOT_DIR):
+        self.directory = directory
+        self.version = None
+        self.value = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, db):
+        version = await get_dataset_version()
+        if self.version == version:
+            return self.value
+
+        async with self._lock:
+            if self.version != version:
+                path = os.path.join(self.directory, version)
+                if not os.path.isdir(path):
+                    rows = await load_snapshot_rows(db)
+                    await asyncio.to_thread(write_snapshot, path, rows)
+                    await asyncio.to_thread(prune_snapshots, self.directory)
+                self.value = await asyncio.to_thread(open_snapshot, path, version)
+                self.version = version
+        return self.value
+
+    def last_known(self):
+        # The snapshot in use, or before one is loaded the newest left on disk, possibly by an earlier run
+        if self.value is not None:
+            return self.value
+        try:
+            versions = sorted((name for name in os.listdir(self.directory) if name.isdigit()), key=int, reverse=True)
+        except OSError:
+            return None
+        for version in versions:
+            try:
+                self.value = open_snapshot(os.path.join(self.directory, version), version)
+                return self.value
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not open accident snapshot {version}: {e}")
+        return None
+
+
+accident_snapshot = SnapshotStore()
+
+
+async def get_snapshot(db):
+    # None when disabled or unavailable, callers then read from the database as before
+    if not SNAPSHOT_ENABLED:
+        return None
+    try:
+        return await accident_snapshot.get(db)
+    except Exception as e:
+        logger.warning(f"Accident snapshot unavailable, reading from the database: {e}")
+        return None
+
+
+async def last_known_snapshot():
+    # Outage fallback: any readable snapshot, whatever its dataset version
+    if not SNAPSHOT_ENABLED:
+        return None
+    return await asyncio.to_thread(accident_snapshot.last_known)
@@ -0,0 +1,171 @@
+from collections import defaultdict
+from dataset import VersionedIndex
+from utils import encode_json_body
+import heapq
+import math
+import os
+
+# Mean earth radius used for haversine distances
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Grid cell edge in degrees, half a degree is roughly 55 km of latitude
+GRID_CELL_SIZE = float(os.environ.get('SPATIAL_GRID_CELL_SIZE', 0.5))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def split_longitude_range(min_lon, max_lon):
+    # A box crossing the antimeridian (e.g. the Aleutians) arrives with min_lon > max_lon
+    if min_lon <= max_lon:
+        return [(min_lon, max_lon)]
+    return [(min_lon, 180.0), (-180.0, max_lon)]
+
+
+class GridIndex:
+    # Uniform lat/lon grid over point coordinates, each point carrying an opaque payload
+
+    def __init__(self, points, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.lats = []
+        self.lons = []
+        self.payloads = []
+        self.cells = defaultdict(list)
+
+        for lat, lon, payload in points:
+            index = len(self.payloads)
+            self.lats.append(lat)
+            self.lons.append(lon)
+            self.payloads.append(payload)
+            self.cells[self._cell(lat, lon)].append(index)
+
+        self.cells = dict(self.cells)
+        self.max_ring = int(math.ceil(360 / cell_size))
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size))
+
+    def _cells_in_box(self, min_lat, min_lon, max_lat, max_lon):
+        low_row, low_col = self._cell(min_lat, min_lon)
+        high_row, high_col = self._cell(max_lat, max_lon)
+        box_cells = (high_row - low_row + 1) * (high_col - low_col + 1)
+
+        # Wide viewports cover more grid cells than are occupied, so scan the occupied ones instead
+        if box_cells > len(self.cells):
+            for (row, col), members in self.cells.items():
+                if low_row <= row <= high_row and low_col <= col <= high_col:
+                    yield members
+        else:
+            for row in range(low_row, high_row + 1):
+                for col in range(low_col, high_col + 1):
+                    members = self.cells.get((row, col))
+                    if members:
+                        yield members
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        matches = []
+        lats, lons = self.lats, self.lons
+        for low_lon, high_lon in split_longitude_range(min_lon, max_lon):
+            for members in self._cells_in_box(min_lat, low_lon, max_lat, high_lon):
+                for index in members:
+                    if min_lat <= lats[index] <= max_lat and low_lon <= lons[index] <= high_lon:
+                        matches.append(index)
+        return matches
+
+    def within_radius(self, lat, lon, radius_km):
+        # Prefilter with the enclosing box, then keep points inside the great-circle radius
+        d_lat = radius_km / KM_PER_DEGREE
+        cos_lat = math.cos(math.radians(min(89.0, abs(lat) + d_lat)))
+        d_lon = min(180.0, radius_km / (KM_PER_DEGREE * max(cos_lat, 1e-6)))
+
+        min_lat, max_lat = max(-90.0, lat - d_lat), min(90.0, lat + d_lat)
+        if d_lon >= 180.0:
+            min_lon, max_lon = -180.0, 180.0
+        else:
+            min_lon = (lon - d_lon + 180.0) % 360.0 - 180.0
+            max_lon = (lon + d_lon + 180.0) % 360.0 - 180.0
+
+        matches = []
+        for index in self.within_bbox(min_lat, min_lon, max_lat, max_lon):
+            distance = haversine_km(lat, lon, self.lats[index], self.lons[index])
+            if distance <= radius_km:
+                matches.append((distance, index))
+        matches.sort()
+        return matches
+
+    def nearest(self, lat, lon, k):
+        if not self.payloads:
+            return []
+
+        k = min(k, len(self.payloads))
+        center_row, center_col = self._cell(lat, lon)
+        best = []  # max-heap of (-distance, index) holding the k closest seen so far
+        seen = 0
+
+        for ring in range(self.max_ring + 1):
+            for row, col in self._ring_cells(center_row, center_col, ring):
+                for index in self.cells.get((row, col), ()):
+                    seen += 1
+                    distance = haversine_km(lat, lon, self.lats[index], self.lons[index])
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, index))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, index))
+
+            if seen == len(self.payloads):
+                break
+            # Anything outside this ring is at least ring cells away in latitude or longitude
+            if len(best) == k and -best[0][0] <= self._ring_lower_bound_km(lat, ring):
+                break
+
+        return sorted((-negative, index) for negative, index in best)
+
+    def _ring_cells(self, center_row, center_col, ring):
+        if ring == 0:
+            yield center_row, center_col
+            return
+        for col in range(center_col - ring, center_col + ring + 1):
+            yield center_row - ring, col
+            yield center_row + ring, col
+        for row in range(center_row - ring + 1, center_row + ring):
+            yield row, center_col - ring
+            yield row, center_col + ring
+
+    def _ring_lower_bound_km(self, lat, ring):
+        gap = ring * self.cell_size
+        cos_lat = math.cos(math.radians(min(90.0, abs(lat) + gap)))
+        lon_bound = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, cos_lat * math.sin(math.radians(gap) / 2)))
+        return min(gap * KM_PER_DEGREE, lon_bound)
+
+
+def build_spatial_index(rows):
+    # Rows without coordinates (failed geocoding in the ELT) are not indexed
+    return GridIndex(
+        (row["latitude"], row["longitude"], encode_json_body(row))
+        for row in rows
+        if row["latitude"] is not None and row["longitude"] is not None
+    )
+
+
+spatial_index = VersionedIndex(build_spatial_index)
+
+
+# Response bodies are assembled from the pre-encoded rows without re-serializing them
+def encode_accident_list(index, matches):
+    return b"[" + b",".join(index.payloads[match] for match in matches) + b"]"
+
+
+def encode_distance_list(index, matches):
+    return b"[" + b",".join(
+        b'{"distance_km":%.3f,"accident":%s}' % (distance, index.payloads[match])
+        for distance, match in matches
+    ) + b"]"
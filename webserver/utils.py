@@ -1,9 +1,34 @@
-from slowapi import Limiter
 from slowapi.util import get_remote_address
+from rate_limit import RedisRateLimiter
+from fastapi.responses import Response
+from custom_exceptions import ValidationError
+import base64
+import binascii
+import json
 
 
-# Initialize the rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Initialize the rate limiter, limits are shared by every worker through Redis
+limiter = RedisRateLimiter(key_func=get_remote_address)
 
 
+# Encode data into the final JSON response body, done once before caching
+def encode_json_body(data):
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
 
+
+# Wrap an already encoded JSON body, bypassing response_model validation
+def json_body_response(body, status_code=200, headers=None):
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+# Keyset cursors are opaque to clients, encoding the last id of a page
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise ValidationError(detail="Invalid cursor")